@@ -1,6 +1,9 @@
 package com.hamradio.ft8auto.parser
 
 import com.hamradio.ft8auto.model.FT8Decode
+import java.nio.BufferUnderflowException
+import java.nio.ByteBuffer
+import java.nio.ByteOrder
 
 /**
  * Parses FT8 decode messages from various formats
@@ -25,6 +28,9 @@ object FT8Parser {
         """\b([A-R]{2}[0-9]{2}(?:[A-X]{2})?)\b"""
     )
     
+    // Record type of a decode in the tracker's binary stream (?format=binary)
+    private const val RECORD_DECODE: Byte = 1
+    
     fun parse(line: String?): FT8Decode? {
         if (line.isNullOrBlank()) return null
         
@@ -63,6 +69,39 @@ object FT8Parser {
         return FT8Decode("UNKNOWN", "", 0, 0, trimmedLine)
     }
     
+    /**
+     * Parses one record of the tracker's binary stream (/decodes?format=binary),
+     * given the record body after its 2-byte length prefix. Fields are read at
+     * fixed offsets, no regexes. Returns null for gap and other records.
+     */
+    fun parseRecord(body: ByteBuffer): FT8Decode? {
+        return try {
+            body.order(ByteOrder.BIG_ENDIAN)
+            if (body.get() != RECORD_DECODE) return null
+            body.int                                        // event id
+            val timestamp = body.int.toLong() and 0xFFFFFFFFL
+            val snr = body.get().toInt()
+            body.short                                      // dt, hundredths of a second
+            val freq = body.short.toInt() and 0xFFFF
+            body.get()                                      // mode
+            body.get()                                      // band
+            body.short                                      // latitude, hundredths of a degree
+            body.short                                      // longitude, hundredths of a degree
+            val callsign = readString(body)
+            val grid = readString(body)
+            val message = readString(body)
+            FT8Decode(callsign, grid, snr, freq, message, timestamp * 1000)
+        } catch (e: BufferUnderflowException) {
+            null
+        }
+    }
+    
+    private fun readString(body: ByteBuffer): String {
+        val bytes = ByteArray(body.get().toInt() and 0xFF)
+        body.get(bytes)
+        return String(bytes, Charsets.UTF_8)
+    }
+    
     private fun extractCallsign(message: String): String {
         val words = message.split("""\s+""".toRegex())
         
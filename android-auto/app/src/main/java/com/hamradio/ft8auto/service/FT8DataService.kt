@@ -11,14 +11,20 @@ import com.hamradio.ft8auto.parser.FT8Parser
 import com.hamradio.ft8auto.util.PreferencesManager
 import kotlinx.coroutines.*
 import org.json.JSONObject
+import java.io.BufferedInputStream
 import java.io.BufferedReader
+import java.io.DataInputStream
+import java.io.EOFException
+import java.io.InputStream
 import java.io.InputStreamReader
 import java.io.OutputStreamWriter
 import java.net.HttpURLConnection
 import java.net.URL
+import java.nio.ByteBuffer
 
 /**
- * Background service that receives FT8 decode data via HTTP Server-Sent Events (SSE)
+ * Background service that receives FT8 decode data from the tracker's /decodes stream,
+ * as binary records (?format=binary) or, from trackers without them, Server-Sent Events (SSE)
  */
 class FT8DataService : Service() {
     
@@ -35,6 +41,9 @@ class FT8DataService : Service() {
         
         const val EXTRA_HOST = "host"
         const val EXTRA_PORT = "port"
+        
+        // Content type of the tracker's binary decode stream
+        private const val BINARY_CONTENT_TYPE = "application/x-ft8-decodes"
     }
     
     override fun onCreate() {
@@ -92,10 +101,11 @@ class FT8DataService : Service() {
                 // Send band information as part of connect sequence
                 sendBandInformation(host, port)
                 
-                val url = URL("http://$host:$port/decodes")
+                // Binary records carry the decode already parsed, so no regexes per decode
+                val url = URL("http://$host:$port/decodes?format=binary")
                 connection = url.openConnection() as HttpURLConnection
                 connection.requestMethod = "GET"
-                connection.setRequestProperty("Accept", "text/event-stream")
+                connection.setRequestProperty("Accept", "$BINARY_CONTENT_TYPE, text/event-stream")
                 connection.connectTimeout = 10000
                 connection.readTimeout = 0  // No timeout for streaming
                 
@@ -106,25 +116,11 @@ class FT8DataService : Service() {
                 
                 updateNotification("Connected to $host:$port")
                 
-                val reader = BufferedReader(InputStreamReader(connection.inputStream))
-                
-                while (isActive) {
-                    val line = reader.readLine() ?: break
-                    
-                    // Parse SSE format: "data: {json}"
-                    if (line.startsWith("data: ")) {
-                        try {
-                            val jsonStr = line.substring(6)
-                            val json = JSONObject(jsonStr)
-                            val decode = json.optString("decode")
-                            if (decode.isNotEmpty()) {
-                                processLine(decode)
-                            }
-                        } catch (e: Exception) {
-                            android.util.Log.e("FT8DataService", "Error parsing SSE: ${e.message}")
-                        }
-                    }
-                    // Skip keepalive and empty lines
+                // Older trackers ignore format=binary and answer with SSE
+                if (connection.contentType?.startsWith(BINARY_CONTENT_TYPE) == true) {
+                    readBinaryStream(connection.inputStream)
+                } else {
+                    readSSEStream(connection.inputStream)
                 }
             } catch (e: Exception) {
                 updateNotification("Connection failed: ${e.message}")
@@ -135,6 +131,53 @@ class FT8DataService : Service() {
         }
     }
     
+    /**
+     * Reads length-prefixed binary decode records until the stream ends;
+     * a zero length is a keepalive
+     */
+    private fun CoroutineScope.readBinaryStream(input: InputStream) {
+        val stream = DataInputStream(BufferedInputStream(input))
+        
+        while (isActive) {
+            val length = try {
+                stream.readUnsignedShort()
+            } catch (e: EOFException) {
+                break
+            }
+            if (length == 0) continue
+            
+            val body = ByteArray(length)
+            stream.readFully(body)
+            FT8Parser.parseRecord(ByteBuffer.wrap(body))?.let { decodeManager.addDecode(it) }
+        }
+    }
+    
+    /**
+     * Reads SSE "data: {json}" events until the stream ends
+     */
+    private fun CoroutineScope.readSSEStream(input: InputStream) {
+        val reader = BufferedReader(InputStreamReader(input))
+        
+        while (isActive) {
+            val line = reader.readLine() ?: break
+            
+            // Parse SSE format: "data: {json}"
+            if (line.startsWith("data: ")) {
+                try {
+                    val jsonStr = line.substring(6)
+                    val json = JSONObject(jsonStr)
+                    val decode = json.optString("decode")
+                    if (decode.isNotEmpty()) {
+                        processLine(decode)
+                    }
+                } catch (e: Exception) {
+                    android.util.Log.e("FT8DataService", "Error parsing SSE: ${e.message}")
+                }
+            }
+            // Skip keepalive and empty lines
+        }
+    }
+    
     private suspend fun sendBandInformation(host: String, port: Int) {
         try {
             val band = PreferencesManager.getCurrentBand()
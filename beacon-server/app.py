@@ -5,6 +5,8 @@ This Flask application receives FT8 decode data from mobile tracking stations,
 stores it in PostgreSQL, and provides APIs for querying the data.
 """
 import os
+import json
+import zlib
 import hashlib
 from datetime import datetime, timedelta
 from flask import Flask, request, jsonify
@@ -28,6 +30,7 @@ app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv(
 )
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['MAX_CONTENT_LENGTH'] = 1 * 1024 * 1024  # 1MB max upload
+MAX_DECODED_LENGTH = 8 * 1024 * 1024  # Limit for a gzip upload once decompressed
 
 # Initialize database
 db.init_app(app)
@@ -82,6 +85,29 @@ def require_auth(f):
     return decorated_function
 
 
+def read_upload_body():
+    """Parse the JSON request body, decompressing Content-Encoding: gzip.
+    
+    Returns (data, error_response); other encodings get 415 so clients can
+    fall back to an uncompressed body.
+    """
+    encoding = request.headers.get('Content-Encoding', 'identity').lower()
+    if encoding == 'identity':
+        return request.get_json(), None
+    
+    if encoding != 'gzip':
+        return None, (jsonify({'error': f'Unsupported Content-Encoding: {encoding}'}), 415)
+    
+    try:
+        decompressor = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        body = decompressor.decompress(request.get_data(), MAX_DECODED_LENGTH)
+        if decompressor.unconsumed_tail:
+            return None, (jsonify({'error': 'Decompressed upload too large'}), 413)
+        return json.loads(body), None
+    except (zlib.error, ValueError):
+        return None, (jsonify({'error': 'Invalid compressed JSON body'}), 400)
+
+
 @app.route('/api/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
@@ -122,7 +148,9 @@ def upload_decodes(station):
         ]
     }
     """
-    data = request.get_json()
+    data, error = read_upload_body()
+    if error:
+        return error
     
     if not data:
         return jsonify({'error': 'No data provided'}), 400
@@ -0,0 +1,372 @@
+#!/usr/bin/env python3
+"""
+Database benchmark suite
+Builds tracker databases from synthetic decodes and GPS tracks at realistic
+scale and measures the operations the tracker runs in production:
+
+- bulk and single-row insert throughput
+- get_stats, get_recent_decodes and read latency during heavy ingest
+- get_unuploaded_decodes + mark_uploaded (one uploader cycle)
+- cleanup_old_records (retention delete)
+
+Results are written as JSON so runs can be compared for regressions.
+
+Usage:
+    python3 bench-database.py                                   # 100k and 1M rows
+    python3 bench-database.py --scales 100000,1000000,10000000
+    python3 bench-database.py --output results.json --baseline previous.json
+"""
+
+import sys
+import os
+import json
+import shutil
+import time
+import random
+import sqlite3
+import argparse
+import platform
+import tempfile
+import threading
+import statistics
+import logging
+from datetime import datetime
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from database import Database, DEFAULT_BULK_CHUNK_SIZE
+
+CALL_PREFIXES = ['K', 'W', 'N', 'AA', 'KD', 'VE', 'JA', 'DL', 'G', 'VK']
+GRIDS = ['FN42', 'CN87', 'EM73', 'DM79', 'EN91', 'FM09', 'JO62', 'IO91', 'PM95', 'QF56']
+
+# Synthetic history covers this many days, so retention has old rows to delete
+HISTORY_DAYS = 60
+# Rows newer than this are left pending upload
+PENDING_DAYS = 7
+# Retention window passed to cleanup_old_records
+RETENTION_DAYS = 30
+
+# Relative slowdown (per latency metric) or slowdown in throughput that counts as a regression
+REGRESSION_THRESHOLD = 0.25
+
+
+def synthetic_decodes(count: int, start_ts: int, span: int, seed: int = 1):
+    """Generate (decode, gps) pairs spread evenly over span seconds in 15 s slots"""
+    rng = random.Random(seed)
+    lat, lon = 47.6062, -122.3321
+    step = span / max(count, 1)
+    
+    for i in range(count):
+        ts = start_ts + int(i * step) // 15 * 15
+        lat += rng.uniform(-0.0005, 0.0005)
+        lon += rng.uniform(-0.0005, 0.0005)
+        callsign = f"{rng.choice(CALL_PREFIXES)}{rng.randint(0, 9)}{rng.choice('ABCDEFGHXYZ')}{rng.choice('ABCDEFGHXYZ')}"
+        grid = rng.choice(GRIDS)
+        
+        decode = {
+            'timestamp': ts,
+            'time_str': time.strftime('%H%M%S', time.gmtime(ts)),
+            'callsign': callsign,
+            'grid': grid,
+            'snr': rng.randint(-24, 10),
+            'dt': round(rng.uniform(-0.5, 1.0), 1),
+            'frequency': rng.randint(200, 3000),
+            'message': f"CQ {callsign} {grid}"
+        }
+        gps = {
+            'latitude': lat,
+            'longitude': lon,
+            'altitude': 150.0,
+            'speed': 65.0,
+            'heading': 90.0
+        }
+        yield decode, gps
+
+
+def synthetic_track(count: int, start_ts: int, span: int, seed: int = 2):
+    """Generate a GPS track spread evenly over span seconds"""
+    rng = random.Random(seed)
+    lat, lon = 47.6062, -122.3321
+    step = span / max(count, 1)
+    
+    for i in range(count):
+        lat += rng.uniform(-0.0002, 0.0002)
+        lon += rng.uniform(-0.0002, 0.0002)
+        yield {
+            'timestamp': start_ts + int(i * step),
+            'latitude': lat,
+            'longitude': lon,
+            'altitude': 150.0,
+            'speed': 65.0,
+            'heading': 90.0,
+            'accuracy': 5.0
+        }
+
+
+def latency_summary(samples):
+    """Summarize latency samples (seconds) as milliseconds"""
+    samples = sorted(samples)
+    return {
+        'runs': len(samples),
+        'p50_ms': round(statistics.median(samples) * 1000, 3),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000, 3),
+        'max_ms': round(samples[-1] * 1000, 3)
+    }
+
+
+def time_calls(func, runs: int):
+    """Call func runs times and summarize its latency"""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    return latency_summary(samples)
+
+
+def build_database(db_path: str, rows: int, chunk_size: int) -> dict:
+    """Build a tracker database with rows decodes and rows GPS fixes, timing the inserts"""
+    db = Database(db_path)
+    now = int(time.time())
+    span = HISTORY_DAYS * 86400
+    start_ts = now - span
+    
+    start = time.perf_counter()
+    db.insert_decodes_bulk(synthetic_decodes(rows, start_ts, span), chunk_size=chunk_size)
+    decode_elapsed = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    db.insert_gps_positions_bulk(synthetic_track(rows, start_ts, span), chunk_size=chunk_size)
+    gps_elapsed = time.perf_counter() - start
+    
+    # Everything older than PENDING_DAYS has already been uploaded
+    with db.get_connection() as conn:
+        conn.execute('UPDATE decodes SET uploaded = 1, upload_timestamp = ? WHERE timestamp < ?',
+                     (now, now - PENDING_DAYS * 86400))
+        conn.commit()
+    
+    db.close()
+    
+    return {
+        'bulk_decode_rows_per_s': round(rows / decode_elapsed),
+        'bulk_gps_rows_per_s': round(rows / gps_elapsed),
+        'build_seconds': round(decode_elapsed + gps_elapsed, 2)
+    }
+
+
+def bench_single_insert(db: Database, runs: int) -> dict:
+    """Time insert_decode one row at a time against a populated database"""
+    samples = []
+    for decode, gps in synthetic_decodes(runs, int(time.time()), runs, seed=3):
+        start = time.perf_counter()
+        db.insert_decode(decode, gps)
+        samples.append(time.perf_counter() - start)
+    
+    result = latency_summary(samples)
+    result['rows_per_s'] = round(runs / sum(samples))
+    return result
+
+
+def bench_read_during_ingest(db: Database, rows: int) -> dict:
+    """Time get_recent_decodes while another thread bulk inserts"""
+    def ingest():
+        db.insert_decodes_bulk(synthetic_decodes(rows, int(time.time()), rows, seed=4))
+    
+    writer = threading.Thread(target=ingest)
+    writer.start()
+    
+    samples = []
+    while writer.is_alive():
+        start = time.perf_counter()
+        db.get_recent_decodes(10)
+        samples.append(time.perf_counter() - start)
+        time.sleep(0.005)
+    writer.join()
+    
+    return latency_summary(samples or [0.0])
+
+
+def bench_upload_cycle(db: Database, runs: int, batch_size: int = 100) -> dict:
+    """Time get_unuploaded_decodes followed by mark_uploaded, as the uploader does"""
+    fetch_samples = []
+    mark_samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        decodes = db.get_unuploaded_decodes(batch_size)
+        fetch_samples.append(time.perf_counter() - start)
+        
+        start = time.perf_counter()
+        db.mark_uploaded([d['id'] for d in decodes])
+        mark_samples.append(time.perf_counter() - start)
+    
+    return {
+        'get_unuploaded_decodes': latency_summary(fetch_samples),
+        'mark_uploaded': latency_summary(mark_samples)
+    }
+
+
+def bench_scale(db_dir: str, rows: int, args) -> dict:
+    """Build (or reuse) a database of the given size and run every benchmark on it"""
+    db_path = os.path.join(db_dir, f"tracker-{rows}.db")
+    run_path = os.path.join(db_dir, f"tracker-{rows}-run.db")
+    result = {'rows': rows}
+    
+    if os.path.exists(db_path):
+        print(f"[{rows:,}] Reusing {db_path}")
+    else:
+        print(f"[{rows:,}] Building database...")
+        result['insert'] = build_database(db_path, rows, args.chunk_size)
+    
+    # The benchmarks insert, mark uploaded and delete, so run them on a copy
+    # and leave the built database untouched for --keep
+    shutil.copyfile(db_path, run_path)
+    
+    logging.getLogger('database').setLevel(logging.WARNING)
+    db = Database(run_path)
+    try:
+        print(f"[{rows:,}] Measuring queries...")
+        result['get_stats'] = time_calls(db.get_stats, args.runs)
+        result['get_stats_since_1h'] = time_calls(lambda: db.get_stats(int(time.time()) - 3600), args.runs)
+        result['get_recent_decodes'] = time_calls(lambda: db.get_recent_decodes(100), args.runs)
+        result.update(bench_upload_cycle(db, args.runs))
+        
+        result['insert_decode'] = bench_single_insert(db, args.single_rows)
+        result['read_during_ingest'] = bench_read_during_ingest(db, args.ingest_rows)
+        
+        # Retention delete is destructive, run it last and only once
+        print(f"[{rows:,}] Measuring cleanup...")
+        start = time.perf_counter()
+        deleted = db.cleanup_old_records(RETENTION_DAYS)
+        result['cleanup_old_records'] = {
+            'deleted': deleted,
+            'seconds': round(time.perf_counter() - start, 3)
+        }
+    finally:
+        db.close()
+    
+    paths = [run_path] if args.keep else [run_path, db_path]
+    for path in paths:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.unlink(path + suffix)
+    
+    return result
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float) -> list:
+    """Compare results with a baseline run, returning human-readable regressions"""
+    regressions = []
+    baseline_scales = {scale['rows']: scale for scale in baseline.get('scales', [])}
+    
+    for scale in results['scales']:
+        base = baseline_scales.get(scale['rows'])
+        if not base:
+            continue
+        
+        for name, metric in scale.items():
+            base_metric = base.get(name)
+            if not isinstance(metric, dict) or not isinstance(base_metric, dict):
+                continue
+            
+            # Latencies regress upwards, throughputs downwards
+            if 'p50_ms' in metric and base_metric.get('p50_ms'):
+                ratio = metric['p50_ms'] / base_metric['p50_ms']
+                if ratio > 1 + threshold:
+                    regressions.append(f"{scale['rows']:,} rows {name} p50: "
+                                       f"{base_metric['p50_ms']} ms -> {metric['p50_ms']} ms")
+            if 'seconds' in metric and base_metric.get('seconds'):
+                ratio = metric['seconds'] / base_metric['seconds']
+                if ratio > 1 + threshold:
+                    regressions.append(f"{scale['rows']:,} rows {name}: "
+                                       f"{base_metric['seconds']} s -> {metric['seconds']} s")
+            for key, value in metric.items():
+                if key.endswith('rows_per_s') and base_metric.get(key):
+                    if value < base_metric[key] * (1 - threshold):
+                        regressions.append(f"{scale['rows']:,} rows {name} {key}: "
+                                           f"{base_metric[key]:,} -> {value:,}")
+    
+    return regressions
+
+
+def print_summary(results: dict):
+    """Print a human-readable table of the key numbers"""
+    print()
+    for scale in results['scales']:
+        print(f"=== {scale['rows']:,} rows ===")
+        if 'insert' in scale:
+            print(f"  bulk decode insert      {scale['insert']['bulk_decode_rows_per_s']:>12,} rows/s")
+            print(f"  bulk GPS insert         {scale['insert']['bulk_gps_rows_per_s']:>12,} rows/s")
+        print(f"  insert_decode           {scale['insert_decode']['rows_per_s']:>12,} rows/s")
+        for name in ('get_stats', 'get_stats_since_1h', 'get_recent_decodes',
+                     'get_unuploaded_decodes', 'mark_uploaded', 'read_during_ingest'):
+            metric = scale[name]
+            print(f"  {name:<22}  p50 {metric['p50_ms']:>9.3f} ms  p95 {metric['p95_ms']:>9.3f} ms")
+        cleanup = scale['cleanup_old_records']
+        print(f"  cleanup_old_records     {cleanup['seconds']:>9.3f} s ({cleanup['deleted']:,} rows)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='FT8 tracker database benchmark suite')
+    parser.add_argument('--scales', default='100000,1000000',
+                        help='Comma-separated database sizes in decodes (e.g. 100000,1000000,10000000)')
+    parser.add_argument('--runs', type=int, default=20,
+                        help='Repetitions per query benchmark')
+    parser.add_argument('--single-rows', type=int, default=500,
+                        help='Decodes inserted one at a time with insert_decode')
+    parser.add_argument('--ingest-rows', type=int, default=100000,
+                        help='Decodes bulk inserted while measuring read latency')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_BULK_CHUNK_SIZE,
+                        help='Rows per transaction for bulk inserts')
+    parser.add_argument('--db-dir', default=None,
+                        help='Directory for benchmark databases (default: temporary directory)')
+    parser.add_argument('--keep', action='store_true',
+                        help='Keep databases in --db-dir so later runs skip the build')
+    parser.add_argument('--output', default='bench_results.json',
+                        help='Write JSON results to this file')
+    parser.add_argument('--baseline', default=None,
+                        help='Compare with a previous JSON results file and fail on regressions')
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.WARNING)
+    
+    scales = [int(scale) for scale in args.scales.split(',')]
+    results = {
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'machine': platform.machine(),
+        'scales': []
+    }
+    
+    if args.db_dir:
+        os.makedirs(args.db_dir, exist_ok=True)
+        for rows in scales:
+            results['scales'].append(bench_scale(args.db_dir, rows, args))
+    else:
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for rows in scales:
+                results['scales'].append(bench_scale(tmpdir, rows, args))
+    
+    print_summary(results)
+    
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = find_regressions(results, baseline, REGRESSION_THRESHOLD)
+        if regressions:
+            print(f"\n{len(regressions)} regressions against {args.baseline}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print(f"\nNo regressions against {args.baseline}")
+    
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Local feed benchmark
+Compares the CPU a co-located consumer costs on each path to the decode
+stream: the asyncio server's /decodes over localhost HTTP, the Unix
+SOCK_SEQPACKET socket and the mmap ring file. The same decodes are published
+in FT8-like bursts to a few consumer processes; the table reports server and
+consumer CPU per decode delivered.
+
+Usage:
+    python3 bench-local-feed.py                       # 3 consumers, 20000 decodes
+    python3 bench-local-feed.py --consumers 5 --decodes 50000 --modes socket,ring
+"""
+
+import sys
+import os
+import time
+import json
+import socket
+import argparse
+import tempfile
+import subprocess
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from binary_stream import read_records
+from local_feed import LocalFeed, RingReader
+
+MODES = ('http', 'socket', 'ring')
+# Decodes published per burst, and seconds between bursts
+BURST = 25
+BURST_INTERVAL = 0.005
+# How often a ring consumer looks at the header
+RING_POLL_INTERVAL = 0.01
+
+
+def consume(mode: str, target: str, decodes: int):
+    """Consumer process: read decodes until all have arrived, then print its CPU time"""
+    received = 0
+    started = None
+    if mode == 'ring':
+        reader = RingReader(target)
+        print("ready", flush=True)
+        while received < decodes:
+            records, skipped = reader.poll()
+            if records and started is None:
+                started = time.process_time()
+            for record in records:
+                received += len(read_records(record)[0])
+            received += skipped
+            time.sleep(RING_POLL_INTERVAL)
+    elif mode == 'socket':
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+        sock.connect(target)
+        print("ready", flush=True)
+        while received < decodes:
+            message = sock.recv(4096)
+            if started is None:
+                started = time.process_time()
+            received += len(read_records(message)[0])
+    else:
+        sock = socket.create_connection(('127.0.0.1', int(target)))
+        sock.sendall(b"GET /decodes HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n")
+        print("ready", flush=True)
+        buffer = b''
+        while received < decodes:
+            data = sock.recv(65536)
+            if started is None:
+                started = time.process_time()
+            buffer += data
+            *frames, buffer = buffer.split(b"\n\n")
+            for frame in frames:
+                for line in frame.split(b"\n"):
+                    if line.startswith(b"data: "):
+                        json.loads(line[6:])
+                        received += 1
+    print(time.process_time() - started, flush=True)
+
+
+def run(mode: str, consumers: int, decodes: int) -> dict:
+    """Publish decodes to consumer processes over one path and measure CPU"""
+    directory = tempfile.mkdtemp(prefix='bench-local-feed-')
+    if mode == 'http':
+        from network_server_async import AsyncNetworkServer
+        port = 18090
+        server = AsyncNetworkServer({'server_bind': '127.0.0.1', 'server_port': port,
+                                     'server_max_streams_per_ip': '0', 'server_reconnect_rate': '0',
+                                     'sse_queue_size': '4096', 'sse_compression': 'false'})
+        server.start()
+        target = str(port)
+        publish = server.send_decode
+    else:
+        path = os.path.join(directory, 'decodes.sock' if mode == 'socket' else 'decodes.ring')
+        server = LocalFeed({'local_socket' if mode == 'socket' else 'local_ring': path,
+                            'local_ring_slots': '8192'})
+        server.start()
+        target = path
+        publish = server.publish
+
+    processes = [subprocess.Popen([sys.executable, __file__, '--consume', mode, target, str(decodes)],
+                                  stdout=subprocess.PIPE, text=True) for _ in range(consumers)]
+    for process in processes:
+        process.stdout.readline()
+    time.sleep(0.5)
+
+    started = time.process_time()
+    for n in range(decodes):
+        # The tracker hands over the already-parsed decode with each line
+        decode = {'timestamp': time.time(), 'snr': -12, 'dt': 0.3, 'frequency': 1234, 'mode': 'FT8',
+                  'band': '20m', 'callsign': 'K1ABC', 'grid': 'FN42', 'message': 'CQ K1ABC FN42'}
+        publish(f"{n % 240000:06d} -12  0.3 1234 ~ CQ K1ABC FN42", n + 1, decode)
+        if n % BURST == BURST - 1:
+            time.sleep(BURST_INTERVAL)
+    consumer_cpu = sum(float(process.communicate()[0]) for process in processes)
+    server_cpu = time.process_time() - started
+
+    server.stop()
+    deliveries = decodes * consumers
+    return {
+        'mode': mode,
+        'server_us': server_cpu / deliveries * 1e6,
+        'consumer_us': consumer_cpu / deliveries * 1e6,
+        'total_us': (server_cpu + consumer_cpu) / deliveries * 1e6
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local feed benchmark')
+    parser.add_argument('--consumers', type=int, default=3, help='Consumer processes')
+    parser.add_argument('--decodes', type=int, default=20000, help='Decodes to publish')
+    parser.add_argument('--modes', default=','.join(MODES), help='Comma-separated paths to compare')
+    parser.add_argument('--consume', nargs=3, metavar=('MODE', 'TARGET', 'DECODES'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.consume:
+        mode, target, decodes = args.consume
+        consume(mode, target, int(decodes))
+        return
+
+    print(f"Publishing {args.decodes} decodes to {args.consumers} consumers\n")
+    print(f"  {'path':7s} {'server us':>10s} {'consumer us':>12s} {'total us':>9s}   (CPU per decode delivered)")
+    for mode in args.modes.split(','):
+        result = run(mode, args.consumers, args.decodes)
+        print(f"  {mode:7s} {result['server_us']:>10.2f} {result['consumer_us']:>12.2f} {result['total_us']:>9.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+SSE broadcast benchmark
+Measures the CPU cost of fanning decodes out to many SSE subscribers, comparing
+per-client JSON encoding (the old generator behaviour) with encoding each frame
+once in send_decode and sharing the bytes across client queues.
+
+Usage:
+    python3 bench-sse-broadcast.py                  # 500 clients, 2000 decodes
+    python3 bench-sse-broadcast.py --clients 2000 --decodes 500
+"""
+
+import sys
+import os
+import json
+import time
+import queue
+import argparse
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+import sse
+from sse import ThreadedSSEClient
+from network_server_flask import FlaskNetworkServer
+
+
+def sample_decodes(count: int):
+    """Generate realistic FT8 decode lines"""
+    for i in range(count):
+        yield f"{i % 240000:06d} -{i % 24:02d}  0.{i % 10} {1000 + i % 2000:4d} ~ CQ K{i % 10}ABC FN42"
+
+
+def drain(clients, per_client_encode: bool) -> int:
+    """Empty every client queue the way the old SSE generators did, returning bytes written"""
+    total = 0
+    for client_queue in clients:
+        while True:
+            try:
+                item = client_queue.get_nowait()
+            except queue.Empty:
+                break
+            if per_client_encode:
+                event_id, decode_line = item
+                item = f"id: {event_id}\ndata: {json.dumps({'decode': decode_line})}\n\n".encode('utf-8')
+            total += len(item)
+    return total
+
+
+def drain_clients(clients) -> int:
+    """Take every queued frame the way the SSE writers do, returning bytes written"""
+    return sum(len(b"".join(client.take())) for client in clients)
+
+
+def bench_per_client(decodes, client_count: int) -> dict:
+    """Old path: queue the raw line, each client encodes its own copy"""
+    clients = [queue.Queue() for _ in range(client_count)]
+    
+    start = time.process_time()
+    sent = 0
+    for event_id, decode_line in enumerate(decodes, 1):
+        for client_queue in clients:
+            client_queue.put_nowait((event_id, decode_line))
+        sent += drain(clients, per_client_encode=True)
+    elapsed = time.process_time() - start
+    
+    return {'cpu_s': elapsed, 'bytes': sent, 'encodes': len(decodes) * client_count}
+
+
+def bench_shared_frame(decodes, client_count: int) -> dict:
+    """New path: FlaskNetworkServer.send_decode encodes once and shares the frame"""
+    server = FlaskNetworkServer({'server_bind': '127.0.0.1', 'server_port': 0})
+    for _ in range(client_count):
+        server.sse_hub.add(ThreadedSSEClient())
+    
+    # Count event encodes made by send_decode
+    encodes = 0
+    encode_event = sse.encode_event
+    
+    def counting_encode(*args, **kwargs):
+        nonlocal encodes
+        encodes += 1
+        return encode_event(*args, **kwargs)
+    
+    sse.encode_event = counting_encode
+    try:
+        start = time.process_time()
+        sent = 0
+        for decode_line in decodes:
+            server.send_decode(decode_line)
+            sent += drain_clients(server.sse_hub.clients)
+        elapsed = time.process_time() - start
+    finally:
+        sse.encode_event = encode_event
+    
+    return {'cpu_s': elapsed, 'bytes': sent, 'encodes': encodes}
+
+
+def report(name: str, result: dict, decode_count: int, client_count: int):
+    """Print one benchmark result"""
+    per_decode_us = result['cpu_s'] / decode_count * 1e6
+    per_delivery_ns = result['cpu_s'] / (decode_count * client_count) * 1e9
+    print(f"  {name:14s} {result['cpu_s']:8.3f} s CPU  {per_decode_us:9.1f} us/decode  "
+          f"{per_delivery_ns:7.0f} ns/delivery  {result['encodes']:>9d} encodes")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SSE broadcast encoding benchmark')
+    parser.add_argument('--clients', type=int, default=500, help='Number of SSE client queues')
+    parser.add_argument('--decodes', type=int, default=2000, help='Number of decodes to broadcast')
+    args = parser.parse_args()
+    
+    decodes = list(sample_decodes(args.decodes))
+    
+    print(f"Broadcasting {args.decodes} decodes to {args.clients} clients")
+    
+    per_client = bench_per_client(decodes, args.clients)
+    shared = bench_shared_frame(decodes, args.clients)
+    
+    if per_client['bytes'] != shared['bytes']:
+        print("  ✗ Paths produced different output")
+        sys.exit(1)
+    
+    report('per-client', per_client, args.decodes, args.clients)
+    report('shared frame', shared, args.decodes, args.clients)
+    print(f"\n  Speedup: {per_client['cpu_s'] / shared['cpu_s']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+SSE compression benchmark
+Measures bytes per decode on the /decodes stream with no compression, deflate
+and gzip, both for one event per decode and for slot batching (?batch=slot),
+in the JSON text format and as binary records (?format=binary). Each write is
+sync-flushed exactly as the servers do, so the figures are what a phone on a
+metered link actually receives. The client parse table compares what the
+phone spends turning each format back into decode fields.
+
+Usage:
+    python3 bench-sse-compression.py                  # 40 slots of 25 decodes
+    python3 bench-sse-compression.py --slots 200 --per-slot 60 --level 9
+"""
+
+import sys
+import os
+import time
+import re
+import json
+import random
+import argparse
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from sse import SSEHub, SSEClient, SSECompressor, SSE_ENCODINGS, BATCH_SLOT, decode_payload
+from binary_stream import FORMAT_TEXT, FORMAT_BINARY, read_records
+from ft8_decoder import extract_callsign_grid
+
+# The phone's FT8Parser pattern for the Android line
+WSJTX_PATTERN = re.compile(r'(\d{6})\s+([+-]?\d+)\s+([+-]?\d+\.\d+)\s+(\d+)\s+~?\s+(.+)')
+
+
+def sample_slots(slot_count: int, per_slot: int, seed: int = 1):
+    """Generate realistic FT8 slots: CQs, grid exchanges, reports and 73s among a pool of stations"""
+    rng = random.Random(seed)
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    prefixes = ['K', 'W', 'N', 'AA', 'VE', 'JA', 'DL', 'G', 'EA', 'VK', 'PY', 'LU']
+    stations = []
+    for _ in range(300):
+        suffix = ''.join(rng.choice(letters) for _ in range(rng.randint(1, 3)))
+        call = rng.choice(prefixes) + str(rng.randint(0, 9)) + suffix
+        grid = rng.choice('CDEFIJKLN') + rng.choice('LMNOP') + f"{rng.randint(0, 99):02d}"
+        stations.append((call, grid))
+    
+    for slot in range(slot_count):
+        seconds = slot * 15
+        timestamp = f"{seconds // 3600 % 24:02d}{seconds // 60 % 60:02d}{seconds % 60:02d}"
+        lines = []
+        for _ in range(per_slot):
+            (call, grid), (other, _) = rng.sample(stations, 2)
+            message = rng.choice([
+                f"CQ {call} {grid}",
+                f"{other} {call} {grid}",
+                f"{other} {call} {rng.randint(-24, 10):+03d}",
+                f"{other} {call} R{rng.randint(-24, 10):+03d}",
+                f"{other} {call} RR73",
+                f"{other} {call} 73",
+            ])
+            snr = rng.randint(-24, 10)
+            dt = rng.uniform(-0.5, 1.5)
+            freq = rng.randint(200, 2900)
+            lines.append(f"{timestamp} {snr:3d} {dt:4.1f} {freq:4d} ~ {message}")
+        yield lines
+
+
+def run(slots, encoding, batch: bool, level: int, stream_format: str = FORMAT_TEXT) -> dict:
+    """Stream every slot to one subscriber and count the bytes it would receive"""
+    hub = SSEHub({'sse_queue_size': '100000'})
+    client = SSEClient(max_queue=100000, batch=BATCH_SLOT if batch else None, stream_format=stream_format)
+    if encoding:
+        client.compressor = SSECompressor(encoding, level)
+    hub.add(client)
+    
+    decodes = 0
+    writes = 0
+    start = time.process_time()
+    for lines in slots:
+        for line in lines:
+            hub.publish(decode_payload(line))
+            decodes += 1
+            if not batch:
+                client.encode(client.take())
+                writes += 1
+        if batch:
+            client.encode(client.take())
+            writes += 1
+    elapsed = time.process_time() - start
+    
+    return {
+        'decodes': decodes,
+        'writes': writes,
+        'bytes': client.sent_bytes,
+        'bytes_per_decode': client.sent_bytes / decodes,
+        'us_per_decode': elapsed / decodes * 1e6
+    }
+
+
+def parse_text(frames) -> int:
+    """Parse SSE frames the way the phone does: JSON, then regexes over the line"""
+    parsed = 0
+    for frame in frames:
+        for line in frame.split(b"\n"):
+            if not line.startswith(b"data: "):
+                continue
+            match = WSJTX_PATTERN.fullmatch(json.loads(line[6:])['decode'].strip())
+            int(match.group(2)), float(match.group(3)), int(match.group(4))
+            extract_callsign_grid(match.group(5))
+            parsed += 1
+    return parsed
+
+
+def parse_binary(frames) -> int:
+    """Parse binary records straight into decode fields"""
+    records, _ = read_records(b"".join(frames))
+    return len(records)
+
+
+def client_parse(slots, stream_format: str) -> float:
+    """Microseconds per decode for the client to parse one format"""
+    hub = SSEHub({'sse_queue_size': '100000'})
+    client = SSEClient(max_queue=100000, stream_format=stream_format)
+    hub.add(client)
+    frames = []
+    for lines in slots:
+        for line in lines:
+            hub.publish(decode_payload(line))
+        frames.extend(client.take())
+    
+    parse = parse_binary if stream_format == FORMAT_BINARY else parse_text
+    start = time.process_time()
+    parsed = parse(frames)
+    return (time.process_time() - start) / parsed * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SSE compression benchmark')
+    parser.add_argument('--slots', type=int, default=40, help='Number of 15 s slots')
+    parser.add_argument('--per-slot', type=int, default=25, help='Decodes per slot')
+    parser.add_argument('--level', type=int, default=6, help='zlib compression level')
+    args = parser.parse_args()
+    
+    slots = list(sample_slots(args.slots, args.per_slot))
+    print(f"Streaming {args.slots} slots of {args.per_slot} decodes (level {args.level})\n")
+    print(f"  {'format':7s} {'delivery':10s} {'encoding':9s} {'writes':>7s} {'bytes':>9s} {'B/decode':>9s} "
+          f"{'ratio':>6s} {'us/decode':>10s}")
+    
+    baseline = {}
+    for stream_format in (FORMAT_TEXT, FORMAT_BINARY):
+        for batch in (False, True):
+            for encoding in (None,) + tuple(SSE_ENCODINGS):
+                result = run(slots, encoding, batch, args.level, stream_format)
+                # Ratios are against uncompressed JSON text with the same delivery
+                baseline.setdefault(batch, result['bytes'])
+                print(f"  {stream_format:7s} {'slot' if batch else 'per-event':10s} {encoding or 'identity':9s} "
+                      f"{result['writes']:>7d} {result['bytes']:>9d} {result['bytes_per_decode']:>9.1f} "
+                      f"{baseline[batch] / result['bytes']:>5.1f}x {result['us_per_decode']:>10.1f}")
+    
+    print("\n  Client parse")
+    for stream_format in (FORMAT_TEXT, FORMAT_BINARY):
+        print(f"  {stream_format:7s} {client_parse(slots, stream_format):>8.2f} us/decode")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Stream Admission Control
+Connection budget for long-lived decode streams (/decodes, /ws and the raw
+TCP stream): a cap on concurrent streams, a cap per client address, and a
+per-address token bucket that limits how fast one address may reconnect.
+
+A refused stream gets a 503 with Retry-After before any subscriber state is
+created. Decisions take the controller's own lock for a few dict lookups, so
+they never touch the SSE hub or its broadcast lock.
+"""
+
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, NamedTuple, Tuple
+
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Defaults (0 disables a limit)
+DEFAULT_MAX_STREAMS = 256
+DEFAULT_MAX_STREAMS_PER_IP = 16
+# Reconnects per second one address earns, and how many it may make in a burst
+DEFAULT_RECONNECT_RATE = 0.5
+DEFAULT_RECONNECT_BURST = 10
+# Retry-After sent when the server or an address is at its stream cap
+DEFAULT_RETRY_AFTER = 5
+
+# Addresses whose reconnect buckets are remembered (least recently seen are forgotten)
+MAX_TRACKED_ADDRESSES = 4096
+
+# Refusal reasons
+TOO_MANY_STREAMS = 'max_streams'
+TOO_MANY_FROM_ADDRESS = 'max_streams_per_ip'
+RECONNECTING_TOO_FAST = 'reconnect_rate'
+
+REJECTIONS = REGISTRY.counter('tracker_stream_rejections_total', 'Decode streams refused by admission control',
+                              ['reason'])
+
+
+class Rejection(NamedTuple):
+    """Why a stream was refused and how many seconds the client should wait"""
+    reason: str
+    retry_after: int
+
+
+class AdmissionControl:
+    """Concurrent stream caps and per-address reconnect rate limiting"""
+    
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.max_streams = int(config.get('server_max_streams', DEFAULT_MAX_STREAMS))
+        self.max_per_ip = int(config.get('server_max_streams_per_ip', DEFAULT_MAX_STREAMS_PER_IP))
+        self.rate = float(config.get('server_reconnect_rate', DEFAULT_RECONNECT_RATE))
+        self.burst = float(config.get('server_reconnect_burst', DEFAULT_RECONNECT_BURST))
+        self.retry_after = int(config.get('server_retry_after', DEFAULT_RETRY_AFTER))
+        
+        self.lock = threading.Lock()
+        self.streams = 0
+        # Open streams per address (addresses with none are removed)
+        self.per_ip: Dict[str, int] = {}
+        # address -> [tokens, monotonic time they were counted], least recently seen first
+        self.buckets: OrderedDict = OrderedDict()
+        self.rejected = {TOO_MANY_STREAMS: 0, TOO_MANY_FROM_ADDRESS: 0, RECONNECTING_TOO_FAST: 0}
+    
+    def admit(self, remote: Optional[str]) -> Optional[Rejection]:
+        """Count a new stream from remote, or return why it is refused
+        
+        Every admitted stream must be released exactly once when it ends.
+        """
+        remote = remote or ''
+        now = time.monotonic()
+        with self.lock:
+            bucket = None
+            if self.rate > 0:
+                bucket = self.buckets.get(remote)
+                if bucket is None:
+                    bucket = self.buckets[remote] = [self.burst, now]
+                    if len(self.buckets) > MAX_TRACKED_ADDRESSES:
+                        self.buckets.popitem(last=False)
+                else:
+                    self.buckets.move_to_end(remote)
+                    bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                    bucket[1] = now
+            
+            if bucket is not None and bucket[0] < 1:
+                rejection = Rejection(RECONNECTING_TOO_FAST, math.ceil((1 - bucket[0]) / self.rate))
+            elif self.max_per_ip and self.per_ip.get(remote, 0) >= self.max_per_ip:
+                rejection = Rejection(TOO_MANY_FROM_ADDRESS, self.retry_after)
+            elif self.max_streams and self.streams >= self.max_streams:
+                rejection = Rejection(TOO_MANY_STREAMS, self.retry_after)
+            else:
+                if bucket is not None:
+                    bucket[0] -= 1
+                self.streams += 1
+                self.per_ip[remote] = self.per_ip.get(remote, 0) + 1
+                return None
+            
+            self.rejected[rejection.reason] += 1
+        
+        REJECTIONS.inc(rejection.reason)
+        logger.debug(f"Refused stream from {remote or 'unknown'}: {rejection.reason}")
+        return rejection
+    
+    def release(self, remote: Optional[str]):
+        """Forget an admitted stream that has ended"""
+        remote = remote or ''
+        with self.lock:
+            self.streams -= 1
+            count = self.per_ip.get(remote, 0) - 1
+            if count > 0:
+                self.per_ip[remote] = count
+            else:
+                self.per_ip.pop(remote, None)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Open streams and refusals by reason"""
+        with self.lock:
+            return {
+                'streams': self.streams,
+                'max_streams': self.max_streams,
+                'addresses': len(self.per_ip),
+                'rejected': dict(self.rejected)
+            }
+
+
+def rejection_response(rejection: Rejection) -> Tuple[Dict[str, Any], int, Dict[str, str]]:
+    """The 503 response for a refused stream: (response, status, headers)"""
+    return {
+        'error': 'Too many streams',
+        'reason': rejection.reason,
+        'retry_after': rejection.retry_after
+    }, 503, {'Retry-After': str(rejection.retry_after)}
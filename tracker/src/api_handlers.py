@@ -0,0 +1,516 @@
+"""
+REST API Handlers
+Framework-neutral request handling shared by the network server implementations.
+Each handler takes parsed request data and returns (response_dict, http_status).
+History queries go through cached_query, which adds ETag headers and answers
+unchanged polls from a QueryCache. register_metrics exposes a server's SSE hub
+and query cache on /metrics.
+"""
+
+import json
+import math
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Tuple, Mapping, Optional, Callable, List
+from datetime import datetime
+
+from utils import calculate_distance
+from metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Bands the Android app may select
+VALID_BANDS = ['80m', '60m', '40m', '30m', '20m', '17m', '15m', '12m', '10m', '6m']
+
+# Maximum rows returned by a single query endpoint
+MAX_QUERY_LIMIT = 1000
+
+# Query responses kept for repeated polls
+DEFAULT_QUERY_CACHE_SIZE = 32
+
+# Most fixes accepted by one /gps/batch request
+MAX_GPS_BATCH = 20000
+
+# Batch decimation: keep a fix once this many seconds or metres from the last kept one
+DEFAULT_GPS_BATCH_MIN_INTERVAL = 5.0
+DEFAULT_GPS_BATCH_MIN_DISTANCE = 25.0
+
+
+def parse_json_body(body: bytes) -> Optional[Any]:
+    """Decode a JSON request body, returning None if it is empty
+    
+    Raises ValueError if the body is not valid JSON.
+    """
+    if not body or not body.strip():
+        return None
+    return json.loads(body.decode('utf-8'))
+
+
+def handle_gps_update(server, gps_data: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], int]:
+    """Validate a GPS position update, store it on the server and run its callback"""
+    if not gps_data:
+        return {'error': 'Empty JSON'}, 400
+    
+    logger.debug(f"Received GPS update: {gps_data}")
+    
+    # Validate required fields
+    if 'latitude' not in gps_data or 'longitude' not in gps_data:
+        return {'error': 'Missing latitude or longitude'}, 400
+    
+    # Add timestamp if not present
+    if 'timestamp' not in gps_data:
+        gps_data['timestamp'] = int(datetime.now().timestamp())
+    
+    # Store GPS update
+    server.last_gps_update = gps_data
+    
+    # Call callback if registered
+    if server.gps_callback:
+        logger.debug("Calling GPS callback")
+        try:
+            server.gps_callback(gps_data)
+        except Exception as e:
+            logger.error(f"GPS callback error: {e}")
+    
+    logger.info(f"GPS position received: {gps_data.get('latitude')}, {gps_data.get('longitude')}")
+    
+    return {
+        'status': 'ok',
+        'message': 'GPS position received'
+    }, 200
+
+
+def parse_gps_batch(body: bytes, content_type: Optional[str] = None) -> List[Any]:
+    """Decode a /gps/batch body: a JSON array, {"positions": [...]} or NDJSON
+    
+    Raises ValueError if the body is not valid.
+    """
+    text = body.decode('utf-8').strip()
+    if not text:
+        return []
+    
+    if 'ndjson' in (content_type or '').lower():
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    
+    try:
+        data = json.loads(text)
+    except ValueError:
+        # Newline-delimited objects sent without the NDJSON content type
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    
+    if isinstance(data, dict):
+        data = data.get('positions')
+    if not isinstance(data, list):
+        raise ValueError('Expected an array of positions')
+    return data
+
+
+def _valid_fix(fix: Any) -> bool:
+    """Check a batch entry is an object with a plausible latitude, longitude and timestamp"""
+    if not isinstance(fix, dict):
+        return False
+    try:
+        latitude = float(fix['latitude'])
+        longitude = float(fix['longitude'])
+        # json.loads accepts NaN and Infinity
+        if 'timestamp' in fix and not math.isfinite(float(fix['timestamp'])):
+            return False
+    except (KeyError, TypeError, ValueError):
+        return False
+    return -90 <= latitude <= 90 and -180 <= longitude <= 180
+
+
+def fix_timestamp(fix: Dict[str, Any]) -> float:
+    """A stored fix's timestamp as a number (0 if missing or not numeric, as /gps stores it unchecked)"""
+    try:
+        timestamp = float(fix.get('timestamp', 0))
+    except (TypeError, ValueError):
+        return 0.0
+    return timestamp if math.isfinite(timestamp) else 0.0
+
+
+def decimate_fixes(fixes: List[Dict[str, Any]], min_interval: float,
+                   min_distance: float) -> List[Dict[str, Any]]:
+    """Thin a time-ordered burst of fixes
+    
+    A fix is kept when it is at least min_interval seconds or min_distance
+    metres from the last kept fix; the newest fix is always kept.
+    """
+    if len(fixes) < 3:
+        return list(fixes)
+    
+    kept = [fixes[0]]
+    for fix in fixes[1:-1]:
+        last = kept[-1]
+        if fix['timestamp'] - last['timestamp'] >= min_interval:
+            kept.append(fix)
+        elif calculate_distance(last['latitude'], last['longitude'],
+                                fix['latitude'], fix['longitude']) * 1000 >= min_distance:
+            kept.append(fix)
+    kept.append(fixes[-1])
+    return kept
+
+
+def handle_gps_batch(server, fixes: Optional[List[Any]]) -> Tuple[Dict[str, Any], int]:
+    """Store a burst of buffered GPS fixes with one callback and one transaction
+    
+    Invalid entries are skipped and counted; the rest are ordered, duplicate
+    timestamps collapsed and the burst decimated before the batch callback.
+    """
+    if not fixes or not isinstance(fixes, list):
+        return {'error': 'Expected a non-empty array of positions'}, 400
+    if len(fixes) > MAX_GPS_BATCH:
+        return {'error': f'Batch too large (max {MAX_GPS_BATCH} positions)'}, 413
+    
+    now = int(datetime.now().timestamp())
+    valid = {}
+    rejected = 0
+    for fix in fixes:
+        if not _valid_fix(fix):
+            rejected += 1
+            continue
+        fix = dict(fix, latitude=float(fix['latitude']), longitude=float(fix['longitude']),
+                   timestamp=int(float(fix.get('timestamp', now))))
+        # The last fix for a timestamp wins
+        valid[fix['timestamp']] = fix
+    
+    if not valid:
+        return {'error': 'No valid positions', 'rejected': rejected}, 400
+    
+    ordered = [valid[timestamp] for timestamp in sorted(valid)]
+    kept = decimate_fixes(
+        ordered,
+        float(server.config.get('gps_batch_min_interval', DEFAULT_GPS_BATCH_MIN_INTERVAL)),
+        float(server.config.get('gps_batch_min_distance', DEFAULT_GPS_BATCH_MIN_DISTANCE))
+    )
+    latest = kept[-1]
+    
+    # Only move the current position forward; an old backlog must not replace a live fix
+    current = server.last_gps_update
+    if not current or latest['timestamp'] >= fix_timestamp(current):
+        server.last_gps_update = latest
+    
+    try:
+        if server.gps_batch_callback:
+            server.gps_batch_callback(kept)
+        elif server.gps_callback:
+            server.gps_callback(latest)
+    except Exception as e:
+        logger.error(f"GPS batch callback error: {e}")
+        return {'error': 'Failed to store positions'}, 500
+    
+    logger.info(f"GPS batch received: {len(fixes)} positions, {len(kept)} stored, {rejected} rejected")
+    
+    return {
+        'status': 'ok',
+        'received': len(fixes),
+        'stored': len(kept),
+        'rejected': rejected,
+        'latest': latest
+    }, 200
+
+
+def handle_band_change(server, band_data: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], int]:
+    """Validate a band change, store it on the server and run its callback"""
+    if not band_data:
+        return {'error': 'Empty JSON'}, 400
+    
+    logger.debug(f"Received band change request: {band_data}")
+    
+    # Validate required fields
+    if 'band' not in band_data:
+        return {'error': 'Missing band field'}, 400
+    
+    band = band_data['band']
+    
+    # Validate band format
+    if band not in VALID_BANDS:
+        return {
+            'error': f'Invalid band. Must be one of: {", ".join(VALID_BANDS)}'
+        }, 400
+    
+    logger.debug(f"Band validated: {band}")
+    
+    # Store current band
+    server.current_band = band
+    logger.debug(f"Band stored in server: {band}")
+    
+    # Call callback if registered
+    if server.band_callback:
+        logger.debug(f"Calling band callback for: {band}")
+        try:
+            server.band_callback(band)
+        except Exception as e:
+            logger.error(f"Band callback error: {e}")
+    
+    logger.info(f"Band changed to: {band}")
+    
+    return {
+        'status': 'ok',
+        'message': f'Band set to {band}'
+    }, 200
+
+
+def health_status(server) -> Tuple[Dict[str, Any], int]:
+    """Report server health, including SSE drop and per-client lag metrics"""
+    sse_stats = server.get_sse_stats()
+    return {
+        'status': 'ok',
+        'current_band': server.current_band,
+        'last_gps': server.last_gps_update,
+        'sse_clients': server.get_client_count(),
+        'sse_dropped_total': sse_stats['dropped_total'],
+        'sse_evicted_total': sse_stats['evicted_total'],
+        'sse_reaped_total': sse_stats['reaped_total'],
+        'sse_client_stats': sse_stats['clients'],
+        'admission': server.admission.stats(),
+        'query_cache': server.query_cache.stats()
+    }, 200
+
+
+def register_metrics(server):
+    """Publish the server's subscriber, queue and cache counts on /metrics
+    
+    Values are read from the hub and cache when scraped, so nothing is added
+    to the broadcast path.
+    """
+    hub = server.sse_hub
+    for name, key, kind, help_text in (
+        ('tracker_sse_clients', 'clients', 'gauge', 'Live SSE and WebSocket subscribers'),
+        ('tracker_sse_queued_frames', 'queued', 'gauge', 'Events queued across all subscribers'),
+        ('tracker_sse_dropped_total', 'dropped', 'counter', 'Events dropped for slow subscribers'),
+        ('tracker_sse_evicted_total', 'evicted', 'counter', 'Subscribers evicted for lagging'),
+        ('tracker_sse_reaped_total', 'reaped', 'counter', 'Dead subscriber connections reaped'),
+        ('tracker_sse_keepalives_total', 'keepalives', 'counter', 'Keepalives sent to idle subscribers'),
+    ):
+        REGISTRY.callback(name, help_text, lambda key=key: hub.totals()[key], kind)
+    
+    cache = server.query_cache
+    REGISTRY.callback('tracker_query_cache_requests_total', 'History query cache lookups by result',
+                      lambda: {(result,): cache.stats()[result] for result in ('hits', 'misses', 'not_modified')},
+                      'counter', ['result'])
+
+
+def _int_arg(args: Mapping[str, str], name: str, default: Optional[int] = None) -> Optional[int]:
+    """Get an integer query parameter, raising ValueError if it is malformed"""
+    value = args.get(name)
+    if value is None or value == '':
+        return default
+    return int(value)
+
+
+def handle_search(database, args: Mapping[str, str]) -> Tuple[Dict[str, Any], int]:
+    """Full-text search over stored decode messages"""
+    if not database:
+        return {'error': 'Database not available'}, 503
+    
+    query = (args.get('q') or '').strip()
+    if not query:
+        return {'error': 'Missing q parameter'}, 400
+    
+    try:
+        limit, before_id, since, _ = _page_args(args)
+    except ValueError:
+        return {'error': 'Invalid limit, before_id or since'}, 400
+    
+    try:
+        decodes = database.search_decodes(query, limit=limit, before_id=before_id,
+                                          since_timestamp=since)
+    except Exception as e:
+        logger.error(f"Error searching decodes: {e}")
+        return {'error': 'Invalid search query'}, 400
+    
+    return {
+        'query': query,
+        'count': len(decodes),
+        'decodes': decodes,
+        'next_before_id': decodes[-1]['id'] if len(decodes) == limit else None
+    }, 200
+
+
+def _fields_arg(args: Mapping[str, str]) -> Optional[List[str]]:
+    """Get the comma-separated fields query parameter as column names"""
+    value = args.get('fields')
+    if not value:
+        return None
+    return [field.strip() for field in value.split(',') if field.strip()]
+
+
+def _page_args(args: Mapping[str, str]) -> Tuple[int, Optional[int], Optional[int], Optional[int]]:
+    """Parse limit, before_id, since and until, raising ValueError if one is malformed"""
+    limit = _int_arg(args, 'limit', 100)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return (min(limit, MAX_QUERY_LIMIT), _int_arg(args, 'before_id'),
+            _int_arg(args, 'since'), _int_arg(args, 'until'))
+
+
+def handle_decode_history(database, args: Mapping[str, str]) -> Tuple[Dict[str, Any], int]:
+    """Stored decodes newest first, paged with before_id"""
+    try:
+        limit, before_id, since, until = _page_args(args)
+    except ValueError:
+        return {'error': 'Invalid limit, before_id, since or until'}, 400
+    
+    try:
+        decodes = database.get_decode_history(limit=limit, before_id=before_id,
+                                              since_timestamp=since, until_timestamp=until,
+                                              callsign=args.get('callsign'), band=args.get('band'),
+                                              columns=_fields_arg(args))
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    
+    return {
+        'count': len(decodes),
+        'decodes': decodes,
+        'next_before_id': decodes[-1]['id'] if len(decodes) == limit else None
+    }, 200
+
+
+def handle_gps_track(database, args: Mapping[str, str]) -> Tuple[Dict[str, Any], int]:
+    """Stored GPS positions newest first, paged with before_id"""
+    try:
+        limit, before_id, since, until = _page_args(args)
+    except ValueError:
+        return {'error': 'Invalid limit, before_id, since or until'}, 400
+    
+    try:
+        positions = database.get_gps_track(limit=limit, before_id=before_id,
+                                           since_timestamp=since, until_timestamp=until,
+                                           source=args.get('source'), columns=_fields_arg(args))
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    
+    return {
+        'count': len(positions),
+        'positions': positions,
+        'next_before_id': positions[-1]['id'] if len(positions) == limit else None
+    }, 200
+
+
+def handle_stats(database, args: Mapping[str, str]) -> Tuple[Dict[str, Any], int]:
+    """Decode, upload and band statistics, optionally since a timestamp"""
+    try:
+        since = _int_arg(args, 'since')
+    except ValueError:
+        return {'error': 'Invalid since'}, 400
+    
+    stats = database.get_stats(since_timestamp=since)
+    stats['since'] = since
+    return stats, 200
+
+
+# Cacheable GET query endpoints
+QUERY_ROUTES = {
+    '/decodes/history': handle_decode_history,
+    '/gps/track': handle_gps_track,
+    '/stats': handle_stats,
+}
+
+
+class QueryCache:
+    """Recent query responses keyed by ETag
+    
+    An ETag covers the path, the query parameters and the database's data
+    version, so any write makes older entries unreachable and they age out of
+    the LRU without explicit invalidation.
+    """
+    
+    def __init__(self, max_entries: int = DEFAULT_QUERY_CACHE_SIZE):
+        self.max_entries = max(0, max_entries)
+        self.entries: 'OrderedDict[str, Dict[str, Any]]' = OrderedDict()
+        self.lock = threading.Lock()
+        
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+    
+    @staticmethod
+    def etag(path: str, args: Mapping[str, str], version: str) -> str:
+        """Strong ETag for a query at a data version"""
+        key = json.dumps([path, sorted(args.items()), version])
+        return '"' + hashlib.sha1(key.encode('utf-8')).hexdigest()[:20] + '"'
+    
+    def get(self, etag: str) -> Optional[Dict[str, Any]]:
+        """Get a cached response, or None"""
+        with self.lock:
+            response = self.entries.get(etag)
+            if response is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(etag)
+            self.hits += 1
+            return response
+    
+    def put(self, etag: str, response: Dict[str, Any]):
+        """Cache a response, evicting the least recently used"""
+        if not self.max_entries:
+            return
+        with self.lock:
+            self.entries[etag] = response
+            self.entries.move_to_end(etag)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Cache metrics"""
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified
+            }
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Check an If-None-Match header against an ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    for tag in if_none_match.split(','):
+        tag = tag.strip()
+        if tag == '*':
+            return True
+        if tag.startswith('W/'):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+
+def cached_query(cache: QueryCache, database, path: str, handler: Callable,
+                 args: Mapping[str, str],
+                 if_none_match: Optional[str] = None) -> Tuple[Optional[Dict[str, Any]], int, Dict[str, str]]:
+    """Run a query handler behind ETag validation and the response cache
+    
+    Returns (response_dict, http_status, headers); the response is None for
+    a 304 Not Modified.
+    """
+    if not database:
+        return {'error': 'Database not available'}, 503, {}
+    
+    # Read the version before querying: a write racing the query can only
+    # make the cached result newer than its tag, never staler
+    etag = cache.etag(path, args, database.get_data_version())
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+    
+    if etag_matches(if_none_match, etag):
+        with cache.lock:
+            cache.not_modified += 1
+        return None, 304, headers
+    
+    response = cache.get(etag)
+    if response is None:
+        try:
+            response, status = handler(database, args)
+        except Exception as e:
+            logger.error(f"Error querying {path}: {e}")
+            return {'error': 'Internal server error'}, 500, {}
+        if status != 200:
+            return response, status, {}
+        cache.put(etag, response)
+    
+    return response, 200, headers
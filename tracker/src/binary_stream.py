@@ -0,0 +1,181 @@
+"""
+Binary Decode Stream
+Compact fixed-struct records for decode streams, as an alternative to the
+padded Android text line inside JSON. A record carries the decode already
+parsed (timestamp, SNR, DT, frequency, mode, band, callsign, grid and the
+remote station's position from its grid), so clients read fields at fixed
+offsets instead of running regexes over text.
+
+Every record is a big-endian uint16 length followed by that many bytes; a
+zero length is a keepalive. The first byte of a record is its type:
+    
+    decode  type:u8 id:u32 timestamp:u32 snr:i8 dt_cs:i16 frequency:u16
+            mode:u8 band:u8 latitude_cd:i16 longitude_cd:i16
+            callsign:str grid:str message:str
+    gap     type:u8 skipped:u32
+    event   type:u8 name:str json
+
+str is a uint8 byte count followed by UTF-8. dt_cs is DT in hundredths of a
+second, frequency the audio offset in Hz, and mode and band index MODES and
+BANDS (0 = unknown). The position is the grid square's in hundredths of a
+degree (finer than any grid), or NO_POSITION when there is no valid grid.
+"""
+
+import json
+import time
+import struct
+from typing import Dict, Any, Optional, List, Tuple
+
+from decode_filter import parse_android_line
+from utils import maidenhead_to_latlon, validate_grid
+
+# Stream formats selectable per connection (/decodes?format=, /ws?format=, TCP FORMAT command)
+FORMAT_TEXT = 'text'
+FORMAT_BINARY = 'binary'
+STREAM_FORMATS = (FORMAT_TEXT, FORMAT_BINARY)
+
+# Content type of a /decodes?format=binary stream
+BINARY_CONTENT_TYPE = 'application/x-ft8-decodes'
+
+# Record types
+RECORD_DECODE = 1
+RECORD_GAP = 2
+RECORD_EVENT = 3
+
+# Mode and band codes are 1 + the index in these tuples; append only
+MODES = ('FT8', 'FT4')
+BANDS = ('160m', '80m', '60m', '40m', '30m', '20m', '17m', '15m', '12m', '10m', '6m', '2m')
+
+_LENGTH = struct.Struct('!H')
+_DECODE = struct.Struct('!BIIbhHBBhh')
+_GAP = struct.Struct('!BI')
+
+# latitude_cd/longitude_cd of a decode without a valid grid
+NO_POSITION = -32768
+
+# Sent to idle binary streams in place of an SSE comment
+KEEPALIVE_RECORD = _LENGTH.pack(0)
+
+
+def _clamp(value, low: int, high: int) -> int:
+    return max(low, min(high, int(value)))
+
+
+def _code(names: Tuple[str, ...], name: Optional[str]) -> int:
+    try:
+        return names.index(name) + 1
+    except ValueError:
+        return 0
+
+
+def _text(value: Optional[str]) -> bytes:
+    data = (value or '').encode('utf-8')[:255]
+    return bytes((len(data),)) + data
+
+
+def _record(body: bytes) -> bytes:
+    return _LENGTH.pack(len(body)) + body
+
+
+def encode_decode_record(event_id: Optional[int], decode_line: str,
+                         decode: Optional[Dict[str, Any]] = None, band: Optional[str] = None) -> bytes:
+    """Encode a decode as a binary record
+    
+    decode is the structured decode (FT8Decode.to_dict() or a decodes row);
+    without it the fields are parsed from the line. band is used when the
+    decode does not carry its own.
+    """
+    if decode is None:
+        decode = parse_android_line(decode_line)
+    
+    grid = (decode.get('grid') or '').upper()
+    latitude = longitude = NO_POSITION
+    if validate_grid(grid):
+        latitude, longitude = (round(degrees * 100) for degrees in maidenhead_to_latlon(grid))
+    
+    body = _DECODE.pack(
+        RECORD_DECODE,
+        (event_id or 0) & 0xFFFFFFFF,
+        _clamp(decode.get('timestamp') or time.time(), 0, 0xFFFFFFFF),
+        _clamp(decode.get('snr') or 0, -128, 127),
+        _clamp(round((decode.get('dt') or 0.0) * 100), -32768, 32767),
+        _clamp(decode.get('frequency') or 0, 0, 0xFFFF),
+        _code(MODES, (decode.get('mode') or 'FT8').upper()),
+        _code(BANDS, decode.get('band') or band),
+        latitude,
+        longitude
+    )
+    return _record(body + _text((decode.get('callsign') or '').upper()) + _text(grid) +
+                   _text(decode.get('message')))
+
+
+def encode_gap_record(skipped: int) -> bytes:
+    """Encode the record sent in place of decodes skipped for a client"""
+    return _record(_GAP.pack(RECORD_GAP, _clamp(skipped, 0, 0xFFFFFFFF)))
+
+
+def encode_event_record(name: Optional[str], data: bytes) -> bytes:
+    """Encode any other hub event as its name and JSON data"""
+    return _record(bytes((RECORD_EVENT,)) + _text(name) + data)
+
+
+def _read_text(body: bytes, offset: int) -> Tuple[str, int]:
+    length = body[offset]
+    end = offset + 1 + length
+    return body[offset + 1:end].decode('utf-8', 'replace'), end
+
+
+def parse_record(body: bytes) -> Dict[str, Any]:
+    """Parse one record body (without its length prefix) into a dict
+    
+    Raises ValueError if the record is truncated or of an unknown type.
+    """
+    try:
+        kind = body[0]
+        if kind == RECORD_DECODE:
+            (_, event_id, timestamp, snr, dt_cs, frequency, mode, band,
+             latitude, longitude) = _DECODE.unpack_from(body)
+            callsign, offset = _read_text(body, _DECODE.size)
+            grid, offset = _read_text(body, offset)
+            message, offset = _read_text(body, offset)
+            return {
+                'type': 'decode',
+                'id': event_id,
+                'timestamp': timestamp,
+                'snr': snr,
+                'dt': dt_cs / 100.0,
+                'frequency': frequency,
+                'mode': MODES[mode - 1] if 0 < mode <= len(MODES) else None,
+                'band': BANDS[band - 1] if 0 < band <= len(BANDS) else None,
+                'latitude': None if latitude == NO_POSITION else latitude / 100.0,
+                'longitude': None if longitude == NO_POSITION else longitude / 100.0,
+                'callsign': callsign,
+                'grid': grid,
+                'message': message
+            }
+        if kind == RECORD_GAP:
+            return {'type': 'gap', 'skipped': _GAP.unpack_from(body)[1]}
+        if kind == RECORD_EVENT:
+            name, offset = _read_text(body, 1)
+            return {'type': name or 'event', **json.loads(body[offset:].decode('utf-8'))}
+    except (IndexError, struct.error) as e:
+        raise ValueError(f"Truncated record: {e}")
+    raise ValueError(f"Unknown record type {kind}")
+
+
+def read_records(data: bytes) -> Tuple[List[Dict[str, Any]], bytes]:
+    """Parse every complete record in a stream buffer, skipping keepalives
+    
+    Returns the records and the unconsumed bytes of a partial record.
+    """
+    records = []
+    offset = 0
+    while len(data) - offset >= _LENGTH.size:
+        (length,) = _LENGTH.unpack_from(data, offset)
+        end = offset + _LENGTH.size + length
+        if end > len(data):
+            break
+        if length:
+            records.append(parse_record(data[offset + _LENGTH.size:end]))
+        offset = end
+    return records, data[offset:]
@@ -5,21 +5,137 @@ SQLite database for storing FT8 decodes with GPS positions
 
 import sqlite3
 import logging
+import re
+import queue
+import threading
+import time
+from math import cos, radians
 from pathlib import Path
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from itertools import islice
+from typing import List, Optional, Dict, Any, Iterable, Tuple, Union, Callable
 from contextlib import contextmanager
 
+from utils import maidenhead_to_latlon, calculate_distance, validate_grid
+from metrics import REGISTRY
+
 logger = logging.getLogger(__name__)
 
+# Rows per transaction for the bulk insert methods
+DEFAULT_BULK_CHUNK_SIZE = 5000
+
+# Read-only connections kept open for API and status queries
+DEFAULT_READ_POOL_SIZE = 4
+
+# Most ids bound in one IN (...) list (SQLite before 3.32 allows 999 variables)
+MAX_SQL_VARIABLES = 900
+
+# A bulk decode item is either a decode dict or a (decode, gps) pair
+DecodeItem = Union[Dict[str, Any], Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]
+
+# R-tree tables indexing each decode by receiver (our GPS) or remote (grid) position
+SPATIAL_INDEXES = {
+    'receiver': 'decodes_rx_rtree',
+    'remote': 'decodes_tx_rtree',
+}
+
+# Kilometres per degree of latitude
+KM_PER_DEGREE = 111.32
+
+# Characters the FTS5 unicode61 tokenizer keeps inside a token
+FTS_TOKEN_PATTERN = re.compile(r'[A-Za-z0-9]+')
+
+# Columns the history queries may select
+DECODE_COLUMNS = (
+    'id', 'timestamp', 'time_str', 'callsign', 'grid', 'snr', 'dt', 'frequency', 'band',
+    'message', 'latitude', 'longitude', 'altitude', 'speed', 'heading', 'uploaded',
+    'upload_timestamp', 'created_at'
+)
+GPS_COLUMNS = (
+    'id', 'timestamp', 'latitude', 'longitude', 'altitude', 'speed', 'heading', 'accuracy',
+    'source', 'created_at'
+)
+
+# Write path metrics
+DB_INSERT_SECONDS = REGISTRY.histogram(
+    'tracker_db_insert_seconds', 'Single-row insert time, including the wait for the writer', ['table']
+)
+DB_COMMIT_SECONDS = REGISTRY.histogram('tracker_db_commit_seconds', 'Write transaction commit time')
+
 
 class Database:
     """SQLite database for FT8 tracker"""
     
-    def __init__(self, db_path: str):
+    _INSERT_DECODE_SQL = '''
+        INSERT INTO decodes (
+            timestamp, time_str, callsign, grid, snr, dt, frequency, band,
+            message, latitude, longitude, altitude, speed, heading
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    
+    _INSERT_GPS_SQL = '''
+        INSERT INTO gps_positions (
+            timestamp, latitude, longitude, altitude, speed, heading, accuracy, source
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    '''
+    
+    def __init__(self, db_path: str, read_pool_size: int = DEFAULT_READ_POOL_SIZE,
+                 read_only: bool = False):
         self.db_path = Path(db_path)
-        self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        self._init_database()
+        # read_only opens just the read pool on a database another process has
+        # already created; the schema is left alone and writes raise
+        self.read_only = read_only
+        
+        # One writer connection shared by all insert/update paths. WAL lets the
+        # read-only pool keep querying while the writer holds a transaction.
+        self._writer: Optional[sqlite3.Connection] = None
+        if not read_only:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._writer = self._connect(str(self.db_path))
+            self._writer.execute('PRAGMA journal_mode=WAL')
+            self._writer.execute('PRAGMA synchronous=NORMAL')
+        self._write_lock = threading.Lock()
+        
+        # Bumped after every write transaction; with the open time it tags
+        # query results so unchanged data can be answered from cache
+        self._opened_at = int(time.time())
+        self._write_version = 0
+        # Set in server workers to the version of the process that owns writes
+        self.writer_version: Optional[str] = None
+        
+        # Connection wait statistics
+        self._stats_lock = threading.Lock()
+        self._wait_stats = {
+            'read': {'acquires': 0, 'waited': 0, 'total_wait': 0.0, 'max_wait': 0.0},
+            'write': {'acquires': 0, 'waited': 0, 'total_wait': 0.0, 'max_wait': 0.0},
+        }
+        
+        if not read_only:
+            self._init_database()
+        
+        # Read-only connection pool for API and status queries
+        self.read_pool_size = max(1, int(read_pool_size))
+        self._read_pool = queue.Queue()
+        read_uri = self.db_path.resolve().as_uri() + '?mode=ro'
+        for _ in range(self.read_pool_size):
+            self._read_pool.put(self._connect(read_uri, uri=True))
+        
+    def _connect(self, database: str, uri: bool = False) -> sqlite3.Connection:
+        """Open a connection usable from any thread (callers serialize access)"""
+        conn = sqlite3.connect(database, uri=uri, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+        
+    def close(self):
+        """Close the writer and all pooled read connections"""
+        with self._write_lock:
+            if self._writer:
+                self._writer.close()
+        while True:
+            try:
+                self._read_pool.get_nowait().close()
+            except queue.Empty:
+                break
         
     def _init_database(self):
         """Initialize database schema"""
@@ -119,62 +235,473 @@ class Database:
                 ON band_changes(band)
             ''')
             
+            # Create R-tree spatial indices over receiver and remote station positions
+            cursor.execute('''
+                SELECT name FROM sqlite_master 
+                WHERE name IN ('decodes_rx_rtree', 'decodes_tx_rtree')
+            ''')
+            spatial_index_exists = len(cursor.fetchall()) == 2
+            
+            for table in SPATIAL_INDEXES.values():
+                cursor.execute(f'''
+                    CREATE VIRTUAL TABLE IF NOT EXISTS {table} 
+                    USING rtree(id, min_lat, max_lat, min_lon, max_lon)
+                ''')
+            
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS decodes_rtree_delete 
+                AFTER DELETE ON decodes 
+                BEGIN
+                    DELETE FROM decodes_rx_rtree WHERE id = OLD.id;
+                    DELETE FROM decodes_tx_rtree WHERE id = OLD.id;
+                END
+            ''')
+            
+            if not spatial_index_exists:
+                self._backfill_spatial_index(cursor)
+            
+            # Create FTS5 full-text index over decode messages, kept in sync by triggers
+            cursor.execute("SELECT name FROM sqlite_master WHERE name = 'decodes_fts'")
+            fts_exists = cursor.fetchone() is not None
+            
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS decodes_fts 
+                USING fts5(message, content='decodes', content_rowid='id', prefix='2 3')
+            ''')
+            
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS decodes_fts_insert 
+                AFTER INSERT ON decodes 
+                BEGIN
+                    INSERT INTO decodes_fts(rowid, message) VALUES (NEW.id, NEW.message);
+                END
+            ''')
+            
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS decodes_fts_delete 
+                AFTER DELETE ON decodes 
+                BEGIN
+                    INSERT INTO decodes_fts(decodes_fts, rowid, message) 
+                    VALUES ('delete', OLD.id, OLD.message);
+                END
+            ''')
+            
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS decodes_fts_update 
+                AFTER UPDATE OF message ON decodes 
+                BEGIN
+                    INSERT INTO decodes_fts(decodes_fts, rowid, message) 
+                    VALUES ('delete', OLD.id, OLD.message);
+                    INSERT INTO decodes_fts(rowid, message) VALUES (NEW.id, NEW.message);
+                END
+            ''')
+            
+            if not fts_exists:
+                cursor.execute("INSERT INTO decodes_fts(decodes_fts) VALUES ('rebuild')")
+            
             conn.commit()
             
         logger.info(f"Database initialized: {self.db_path}")
         
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections"""
-        conn = sqlite3.connect(str(self.db_path))
-        conn.row_factory = sqlite3.Row
+        """Context manager for the writer connection (one caller at a time)"""
+        if self._writer is None:
+            raise sqlite3.OperationalError(f"{self.db_path} is open read-only")
+        start = time.perf_counter()
+        if self._write_lock.acquire(blocking=False):
+            self._record_wait('write', 0.0)
+        else:
+            self._write_lock.acquire()
+            self._record_wait('write', time.perf_counter() - start)
+        try:
+            yield self._writer
+            self._write_version += 1
+        except Exception:
+            self._writer.rollback()
+            raise
+        finally:
+            self._write_lock.release()
+            
+    @contextmanager
+    def get_read_connection(self):
+        """Context manager for a pooled read-only connection"""
+        start = time.perf_counter()
+        try:
+            conn = self._read_pool.get_nowait()
+            self._record_wait('read', 0.0)
+        except queue.Empty:
+            conn = self._read_pool.get()
+            self._record_wait('read', time.perf_counter() - start)
         try:
             yield conn
         finally:
-            conn.close()
+            self._read_pool.put(conn)
+            
+    def _record_wait(self, kind: str, wait: float):
+        """Record how long a caller waited for a connection"""
+        with self._stats_lock:
+            stats = self._wait_stats[kind]
+            stats['acquires'] += 1
+            if wait > 0:
+                stats['waited'] += 1
+                stats['total_wait'] += wait
+                stats['max_wait'] = max(stats['max_wait'], wait)
+                
+    def _commit(self, conn: sqlite3.Connection):
+        """Commit the writer's transaction, recording how long it took"""
+        with DB_COMMIT_SECONDS.time():
+            conn.commit()
+    
+    def get_data_version(self) -> str:
+        """Token that changes after every write made through this Database
+        
+        In a server worker this is the writer process's token, as last published.
+        """
+        if self.writer_version is not None:
+            return self.writer_version
+        return f"{self._opened_at}-{self._write_version}"
+    
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Get connection wait statistics for the writer and read pool"""
+        with self._stats_lock:
+            result = {'read_pool_size': self.read_pool_size,
+                      'read_pool_idle': self._read_pool.qsize()}
+            for kind, stats in self._wait_stats.items():
+                result[f'{kind}_acquires'] = stats['acquires']
+                result[f'{kind}_waited'] = stats['waited']
+                result[f'{kind}_wait_total_ms'] = round(stats['total_wait'] * 1000, 3)
+                result[f'{kind}_wait_max_ms'] = round(stats['max_wait'] * 1000, 3)
+            return result
             
     def insert_decode(self, decode_data: Dict[str, Any], gps_data: Optional[Dict[str, Any]] = None) -> int:
         """Insert a decode record"""
+        start = time.perf_counter()
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            row = self._decode_row(decode_data, gps_data)
+            cursor.execute(self._INSERT_DECODE_SQL, row)
+            decode_id = cursor.lastrowid
+            self._index_decode_positions(cursor, decode_id, [row])
+            
+            self._commit(conn)
+        DB_INSERT_SECONDS.observe(time.perf_counter() - start, 'decodes')
+            
+        logger.debug(f"Inserted decode {decode_id}: {decode_data.get('callsign', 'UNKNOWN')}")
+        return decode_id
+    
+    def _decode_row(self, decode_data: Dict[str, Any], gps_data: Optional[Dict[str, Any]]) -> tuple:
+        """Build the decodes table row for a decode and optional GPS fix"""
+        return (
+            decode_data['timestamp'],
+            decode_data.get('time_str', ''),
+            decode_data.get('callsign', ''),
+            decode_data.get('grid', ''),
+            decode_data.get('snr', 0),
+            decode_data.get('dt', 0.0),
+            decode_data.get('frequency', 0),
+            # Band reported by the app, else determine it from frequency
+            decode_data.get('band') or self._frequency_to_band(decode_data.get('frequency', 0)),
+            decode_data.get('message', ''),
+            gps_data['latitude'] if gps_data else None,
+            gps_data['longitude'] if gps_data else None,
+            gps_data.get('altitude') if gps_data else None,
+            gps_data.get('speed') if gps_data else None,
+            gps_data.get('heading') if gps_data else None
+        )
+    
+    def _gps_row(self, gps_data: Dict[str, Any], source: str) -> tuple:
+        """Build the gps_positions table row for a GPS fix"""
+        return (
+            gps_data.get('timestamp', int(datetime.now().timestamp())),
+            gps_data['latitude'],
+            gps_data['longitude'],
+            gps_data.get('altitude'),
+            gps_data.get('speed'),
+            gps_data.get('heading'),
+            gps_data.get('accuracy'),
+            source
+        )
+    
+    def _bulk_insert(self, sql: str, rows: Iterable[tuple], chunk_size: int,
+                     after_chunk: Optional[Callable] = None) -> List[Tuple[int, int]]:
+        """Insert rows with executemany, committing one transaction per chunk
+        
+        Returns the (first_id, last_id) range of each committed chunk. Ids within a
+        chunk are contiguous because AUTOINCREMENT tables allocate them in order and
+        the chunk is written in a single transaction. after_chunk(cursor, first_id, chunk)
+        runs inside that transaction before it commits.
+        """
+        rows = iter(rows)
+        id_ranges = []
+        
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+                
+            # Take the writer per chunk so other inserts interleave with long backfills
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.executemany(sql, chunk)
+                last_id = cursor.execute('SELECT last_insert_rowid()').fetchone()[0]
+                first_id = last_id - len(chunk) + 1
+                if after_chunk:
+                    after_chunk(cursor, first_id, chunk)
+                self._commit(conn)
+                
+            id_ranges.append((first_id, last_id))
+                
+        return id_ranges
+    
+    def insert_decodes_bulk(self, decodes: Iterable[DecodeItem],
+                            chunk_size: int = DEFAULT_BULK_CHUNK_SIZE) -> List[Tuple[int, int]]:
+        """Insert many decode records in chunked transactions
+        
+        Each item is either a decode dict or a (decode_data, gps_data) pair. The
+        iterable is consumed lazily, so generators over large backfills are fine.
+        Returns the inclusive (first_id, last_id) range of each chunk.
+        """
+        def rows():
+            for item in decodes:
+                if isinstance(item, tuple):
+                    yield self._decode_row(item[0], item[1])
+                else:
+                    yield self._decode_row(item, None)
+                    
+        id_ranges = self._bulk_insert(self._INSERT_DECODE_SQL, rows(), chunk_size,
+                                      after_chunk=self._index_decode_positions)
+        
+        logger.info(f"Bulk inserted {_count_ids(id_ranges)} decodes in {len(id_ranges)} chunks")
+        return id_ranges
+        
+    def _remote_position(self, grid: Optional[str]) -> Optional[Tuple[float, float]]:
+        """Get the (lat, lon) of a remote station from its grid square"""
+        # RR73 looks like a grid square but is a sign-off
+        if not grid or grid.upper() == 'RR73' or not validate_grid(grid):
+            return None
+        return maidenhead_to_latlon(grid)
+    
+    def _index_decode_positions(self, cursor, first_id: int, rows: List[tuple]):
+        """Add decode rows with consecutive ids starting at first_id to the R-tree indices"""
+        rx_entries = []
+        tx_entries = []
+        
+        for decode_id, row in enumerate(rows, first_id):
+            latitude, longitude = row[9], row[10]
+            if latitude is not None and longitude is not None:
+                rx_entries.append((decode_id, latitude, latitude, longitude, longitude))
+                
+            remote = self._remote_position(row[3])
+            if remote:
+                tx_entries.append((decode_id, remote[0], remote[0], remote[1], remote[1]))
+                
+        if rx_entries:
+            cursor.executemany('INSERT INTO decodes_rx_rtree VALUES (?, ?, ?, ?, ?)', rx_entries)
+        if tx_entries:
+            cursor.executemany('INSERT INTO decodes_tx_rtree VALUES (?, ?, ?, ?, ?)', tx_entries)
+    
+    def _backfill_spatial_index(self, cursor):
+        """Index decodes stored before the R-tree tables existed"""
+        cursor.execute('''
+            INSERT INTO decodes_rx_rtree 
+            SELECT id, latitude, latitude, longitude, longitude 
+            FROM decodes 
+            WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+        ''')
+        indexed = cursor.rowcount
+        
+        cursor.execute("SELECT id, grid FROM decodes WHERE grid != ''")
+        tx_entries = []
+        for decode_id, grid in cursor.fetchall():
+            remote = self._remote_position(grid)
+            if remote:
+                tx_entries.append((decode_id, remote[0], remote[0], remote[1], remote[1]))
+        cursor.executemany('INSERT INTO decodes_tx_rtree VALUES (?, ?, ?, ?, ?)', tx_entries)
+        
+        if indexed or tx_entries:
+            logger.info(f"Spatial index backfilled: {indexed} receiver, {len(tx_entries)} remote positions")
+    
+    def _spatial_table(self, position: str) -> str:
+        """Get the R-tree table for a position kind ('receiver' or 'remote')"""
+        if position not in SPATIAL_INDEXES:
+            raise ValueError(f"Unknown position: {position}. Must be one of: {', '.join(SPATIAL_INDEXES)}")
+        return SPATIAL_INDEXES[position]
+    
+    def _query_spatial(self, table: str, boxes: List[Tuple[float, float, float, float]],
+                       since_timestamp: Optional[int], limit: Optional[int]) -> List[Dict[str, Any]]:
+        """Get decodes whose indexed position lies in any (min_lat, min_lon, max_lat, max_lon) box"""
+        box_clause = ' OR '.join(
+            '(r.min_lat <= ? AND r.max_lat >= ? AND r.min_lon <= ? AND r.max_lon >= ?)' for _ in boxes
+        )
+        params = []
+        for min_lat, min_lon, max_lat, max_lon in boxes:
+            params.extend([max_lat, min_lat, max_lon, min_lon])
             
-            # Prepare data
-            latitude = gps_data['latitude'] if gps_data else None
-            longitude = gps_data['longitude'] if gps_data else None
-            altitude = gps_data.get('altitude') if gps_data else None
-            speed = gps_data.get('speed') if gps_data else None
-            heading = gps_data.get('heading') if gps_data else None
+        where_clause = f"WHERE ({box_clause})"
+        if since_timestamp:
+            where_clause += " AND d.timestamp >= ?"
+            params.append(since_timestamp)
             
-            # Determine band from frequency
-            band = self._frequency_to_band(decode_data.get('frequency', 0))
+        limit_clause = ""
+        if limit:
+            limit_clause = "LIMIT ?"
+            params.append(limit)
             
-            cursor.execute('''
-                INSERT INTO decodes (
-                    timestamp, time_str, callsign, grid, snr, dt, frequency, band,
-                    message, latitude, longitude, altitude, speed, heading
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                decode_data['timestamp'],
-                decode_data.get('time_str', ''),
-                decode_data.get('callsign', ''),
-                decode_data.get('grid', ''),
-                decode_data.get('snr', 0),
-                decode_data.get('dt', 0.0),
-                decode_data.get('frequency', 0),
-                band,
-                decode_data.get('message', ''),
-                latitude,
-                longitude,
-                altitude,
-                speed,
-                heading
-            ))
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT d.*, r.min_lat AS indexed_latitude, r.min_lon AS indexed_longitude 
+                FROM {table} r 
+                JOIN decodes d ON d.id = r.id 
+                {where_clause} 
+                ORDER BY d.timestamp DESC 
+                {limit_clause}
+            ''', params)
             
-            conn.commit()
-            decode_id = cursor.lastrowid
+            rows = cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    def get_decodes_in_bbox(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float,
+                            position: str = 'receiver', since_timestamp: Optional[int] = None,
+                            limit: int = 1000) -> List[Dict[str, Any]]:
+        """Get decodes whose receiver or remote station position lies in a bounding box
+        
+        position='receiver' matches where we were when the decode was heard,
+        position='remote' matches the grid square of the station that was heard.
+        A box with min_lon > max_lon wraps across the antimeridian.
+        """
+        table = self._spatial_table(position)
+        
+        if min_lon > max_lon:
+            boxes = [(min_lat, min_lon, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon)]
+        else:
+            boxes = [(min_lat, min_lon, max_lat, max_lon)]
             
-        logger.debug(f"Inserted decode {decode_id}: {decode_data.get('callsign', 'UNKNOWN')}")
-        return decode_id
+        return self._query_spatial(table, boxes, since_timestamp, limit)
+    
+    def get_decodes_within_radius(self, latitude: float, longitude: float, radius_km: float,
+                                  position: str = 'remote', since_timestamp: Optional[int] = None,
+                                  limit: int = 1000) -> List[Dict[str, Any]]:
+        """Get decodes whose receiver or remote station position is within radius_km of a point
+        
+        The R-tree narrows candidates to the bounding box of the circle, then exact
+        great-circle distances are checked. Results are nearest first and carry a
+        distance_km field.
+        """
+        table = self._spatial_table(position)
+        
+        dlat = radius_km / KM_PER_DEGREE
+        min_lat = max(latitude - dlat, -90.0)
+        max_lat = min(latitude + dlat, 90.0)
+        
+        # Longitude degrees shrink towards the poles; widest at the box edge nearest a pole
+        edge_cos = cos(radians(max(abs(min_lat), abs(max_lat))))
+        if edge_cos <= 0 or radius_km / (KM_PER_DEGREE * edge_cos) >= 180.0:
+            boxes = [(min_lat, -180.0, max_lat, 180.0)]
+        else:
+            dlon = radius_km / (KM_PER_DEGREE * edge_cos)
+            min_lon = longitude - dlon
+            max_lon = longitude + dlon
+            if min_lon < -180.0:
+                boxes = [(min_lat, min_lon + 360.0, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon)]
+            elif max_lon > 180.0:
+                boxes = [(min_lat, min_lon, max_lat, 180.0), (min_lat, -180.0, max_lat, max_lon - 360.0)]
+            else:
+                boxes = [(min_lat, min_lon, max_lat, max_lon)]
+                
+        results = []
+        for decode in self._query_spatial(table, boxes, since_timestamp, None):
+            distance = calculate_distance(latitude, longitude,
+                                          decode['indexed_latitude'], decode['indexed_longitude'])
+            if distance <= radius_km:
+                decode['distance_km'] = distance
+                results.append(decode)
+                
+        results.sort(key=lambda decode: decode['distance_km'])
+        return results[:limit]
+        
+    def _build_fts_query(self, query: str) -> Tuple[str, List[str]]:
+        """Translate a message search into an FTS5 expression and LIKE patterns
+        
+        Each whitespace-separated term must match. 'POTA' is a token match and
+        'K1A*' a token prefix match, both answered from the index alone. Terms
+        with punctuation or a leading wildcard, like 'K1ABC/P' or '*/P', match
+        their tokens through the index and are then confirmed with LIKE.
+        """
+        phrases = []
+        like_patterns = []
+        
+        for term in query.split():
+            core = term.strip('*')
+            tokens = FTS_TOKEN_PATTERN.findall(core)
+            
+            # A leading wildcard directly against a token makes it a suffix,
+            # which the index cannot answer
+            if term.startswith('*') and tokens and core[0].isalnum():
+                tokens = tokens[1:]
+                
+            if tokens:
+                phrase = '"' + ' '.join(tokens) + '"'
+                if term.endswith('*') and core and core[-1].isalnum():
+                    phrase += '*'
+                phrases.append(phrase)
+                
+            if term.startswith('*') or not FTS_TOKEN_PATTERN.fullmatch(core or '*'):
+                escaped = core.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                like_patterns.append('%' + escaped.replace('*', '%') + '%')
+                
+        return ' AND '.join(phrases), like_patterns
+    
+    def search_decodes(self, query: str, limit: int = 100, before_id: Optional[int] = None,
+                       since_timestamp: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Search decode messages through the FTS5 index, newest first
+        
+        Supports token ('CQ POTA'), prefix ('K1A*') and wildcard ('*/P') terms.
+        Pass the smallest id of a page as before_id to fetch the next page.
+        """
+        fts_query, like_patterns = self._build_fts_query(query)
+        
+        conditions = []
+        params: List[Any] = []
+        
+        if fts_query:
+            source = "decodes_fts f JOIN decodes d ON d.id = f.rowid"
+            order_column = "f.rowid"
+            conditions.append("decodes_fts MATCH ?")
+            params.append(fts_query)
+        elif like_patterns:
+            # Nothing the index can answer, fall back to scanning messages
+            source = "decodes d"
+            order_column = "d.id"
+        else:
+            return []
+            
+        for pattern in like_patterns:
+            conditions.append("d.message LIKE ? ESCAPE '\\'")
+            params.append(pattern)
+            
+        if before_id:
+            conditions.append(f"{order_column} < ?")
+            params.append(before_id)
+            
+        if since_timestamp:
+            conditions.append("d.timestamp >= ?")
+            params.append(since_timestamp)
+            
+        params.append(limit)
+        
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT d.* FROM {source} 
+                WHERE {' AND '.join(conditions)} 
+                ORDER BY {order_column} DESC 
+                LIMIT ?
+            ''', params)
+            
+            rows = cursor.fetchall()
+            return [dict(row) for row in rows]
         
     def _frequency_to_band(self, frequency: int) -> str:
         """Convert frequency to band name"""
@@ -186,7 +713,7 @@ class Database:
         
     def get_recent_decodes(self, limit: int = 100) -> List[Dict[str, Any]]:
         """Get recent decodes"""
-        with self.get_connection() as conn:
+        with self.get_read_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT * FROM decodes 
@@ -196,10 +723,137 @@ class Database:
             
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
+    
+    def get_last_decode_id(self) -> int:
+        """Get the id of the newest decode (0 if there are none)"""
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT MAX(id) FROM decodes')
+            return cursor.fetchone()[0] or 0
+    
+    def get_decodes_between_ids(self, after_id: int, before_id: Optional[int] = None,
+                                limit: int = 1000) -> List[Dict[str, Any]]:
+        """Get the newest decodes with after_id < id < before_id, oldest first"""
+        conditions = ["id > ?"]
+        params: List[Any] = [after_id]
+        
+        if before_id is not None:
+            conditions.append("id < ?")
+            params.append(before_id)
+        
+        params.append(limit)
+        
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT * FROM decodes 
+                WHERE {' AND '.join(conditions)} 
+                ORDER BY id DESC 
+                LIMIT ?
+            ''', params)
+            
+            rows = cursor.fetchall()
+            return [dict(row) for row in reversed(rows)]
+    
+    def _select_columns(self, columns: Optional[List[str]], allowed: Tuple[str, ...]) -> str:
+        """Build a SELECT column list from requested columns (id is always included)
+        
+        Raises ValueError for a column that is not in allowed.
+        """
+        if not columns:
+            return '*'
+        
+        unknown = [column for column in columns if column not in allowed]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        
+        return ', '.join(['id'] + [column for column in dict.fromkeys(columns) if column != 'id'])
+    
+    def _query_page(self, table: str, select: str, conditions: List[str], params: List[Any],
+                    limit: int, before_id: Optional[int]) -> List[Dict[str, Any]]:
+        """Fetch one newest-first page of a table, continuing below before_id"""
+        conditions = list(conditions)
+        params = list(params)
+        
+        if before_id:
+            conditions.append("id < ?")
+            params.append(before_id)
+        
+        where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        params.append(limit)
+        
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT {select} FROM {table} 
+                {where_clause} 
+                ORDER BY id DESC 
+                LIMIT ?
+            ''', params)
             
+            rows = cursor.fetchall()
+            return [dict(row) for row in rows]
+    
+    def get_decode_history(self, limit: int = 100, before_id: Optional[int] = None,
+                           since_timestamp: Optional[int] = None, until_timestamp: Optional[int] = None,
+                           callsign: Optional[str] = None, band: Optional[str] = None,
+                           columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Get stored decodes newest first, one keyset page at a time
+        
+        Pass the smallest id of a page as before_id to fetch the next page.
+        Raises ValueError if columns names an unknown column.
+        """
+        select = self._select_columns(columns, DECODE_COLUMNS)
+        conditions = []
+        params: List[Any] = []
+        
+        if since_timestamp:
+            conditions.append("timestamp >= ?")
+            params.append(since_timestamp)
+        
+        if until_timestamp:
+            conditions.append("timestamp < ?")
+            params.append(until_timestamp)
+        
+        if callsign:
+            conditions.append("callsign = ?")
+            params.append(callsign.upper())
+        
+        if band:
+            conditions.append("band = ?")
+            params.append(band)
+        
+        return self._query_page('decodes', select, conditions, params, limit, before_id)
+    
+    def get_gps_track(self, limit: int = 100, before_id: Optional[int] = None,
+                      since_timestamp: Optional[int] = None, until_timestamp: Optional[int] = None,
+                      source: Optional[str] = None,
+                      columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Get stored GPS positions newest first, one keyset page at a time
+        
+        Raises ValueError if columns names an unknown column.
+        """
+        select = self._select_columns(columns, GPS_COLUMNS)
+        conditions = []
+        params: List[Any] = []
+        
+        if since_timestamp:
+            conditions.append("timestamp >= ?")
+            params.append(since_timestamp)
+        
+        if until_timestamp:
+            conditions.append("timestamp < ?")
+            params.append(until_timestamp)
+        
+        if source:
+            conditions.append("source = ?")
+            params.append(source)
+        
+        return self._query_page('gps_positions', select, conditions, params, limit, before_id)
+    
     def get_unuploaded_decodes(self, limit: int = 100) -> List[Dict[str, Any]]:
         """Get decodes that haven't been uploaded yet"""
-        with self.get_connection() as conn:
+        with self.get_read_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
                 SELECT * FROM decodes 
@@ -211,27 +865,36 @@ class Database:
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
             
+    def count_unuploaded(self) -> int:
+        """Number of decodes waiting to be uploaded"""
+        with self.get_read_connection() as conn:
+            return conn.execute('SELECT COUNT(*) FROM decodes WHERE uploaded = 0').fetchone()[0]
+    
     def mark_uploaded(self, decode_ids: List[int]):
         """Mark decodes as uploaded"""
         if not decode_ids:
             return
             
+        upload_timestamp = int(datetime.now().timestamp())
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            placeholders = ','.join('?' * len(decode_ids))
-            cursor.execute(f'''
-                UPDATE decodes 
-                SET uploaded = 1, upload_timestamp = ? 
-                WHERE id IN ({placeholders})
-            ''', [int(datetime.now().timestamp())] + decode_ids)
-            
-            conn.commit()
+            # Large backlog batches are marked in chunks that stay under SQLite's variable limit
+            for start in range(0, len(decode_ids), MAX_SQL_VARIABLES):
+                chunk = decode_ids[start:start + MAX_SQL_VARIABLES]
+                placeholders = ','.join('?' * len(chunk))
+                cursor.execute(f'''
+                    UPDATE decodes 
+                    SET uploaded = 1, upload_timestamp = ? 
+                    WHERE id IN ({placeholders})
+                ''', [upload_timestamp] + chunk)
             
+            self._commit(conn)
+        
         logger.info(f"Marked {len(decode_ids)} decodes as uploaded")
         
     def get_stats(self, since_timestamp: Optional[int] = None) -> Dict[str, Any]:
         """Get statistics"""
-        with self.get_connection() as conn:
+        with self.get_read_connection() as conn:
             cursor = conn.cursor()
             
             where_clause = ""
@@ -311,39 +974,40 @@ class Database:
             ''', (cutoff,))
             
             deleted = cursor.rowcount
-            conn.commit()
+            self._commit(conn)
             
         logger.info(f"Cleaned up {deleted} old records")
         return deleted
     
     def insert_gps_position(self, gps_data: Dict[str, Any], source: str = 'external') -> int:
         """Insert GPS position from external source (e.g., Android Auto)"""
+        start = time.perf_counter()
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.execute(self._INSERT_GPS_SQL, self._gps_row(gps_data, source))
             
-            cursor.execute('''
-                INSERT INTO gps_positions (
-                    timestamp, latitude, longitude, altitude, speed, heading, accuracy, source
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                gps_data.get('timestamp', int(datetime.now().timestamp())),
-                gps_data['latitude'],
-                gps_data['longitude'],
-                gps_data.get('altitude'),
-                gps_data.get('speed'),
-                gps_data.get('heading'),
-                gps_data.get('accuracy'),
-                source
-            ))
-            
-            conn.commit()
+            self._commit(conn)
             position_id = cursor.lastrowid
+        DB_INSERT_SECONDS.observe(time.perf_counter() - start, 'gps_positions')
             
         logger.info(f"Inserted GPS position {position_id} from {source}: {gps_data['latitude']}, {gps_data['longitude']}")
         return position_id
     
+    def insert_gps_positions_bulk(self, positions: Iterable[Dict[str, Any]], source: str = 'external',
+                                  chunk_size: int = DEFAULT_BULK_CHUNK_SIZE) -> List[Tuple[int, int]]:
+        """Insert many GPS positions in chunked transactions
+        
+        Returns the inclusive (first_id, last_id) range of each chunk.
+        """
+        rows = (self._gps_row(gps_data, source) for gps_data in positions)
+        id_ranges = self._bulk_insert(self._INSERT_GPS_SQL, rows, chunk_size)
+        
+        logger.info(f"Bulk inserted {_count_ids(id_ranges)} GPS positions from {source}")
+        return id_ranges
+    
     def insert_band_change(self, band: str, source: str = 'app') -> int:
         """Insert a band change record"""
+        start = time.perf_counter()
         with self.get_connection() as conn:
             cursor = conn.cursor()
             
@@ -357,15 +1021,32 @@ class Database:
                 ) VALUES (?, ?, ?)
             ''', (timestamp, band, source))
             
-            conn.commit()
+            self._commit(conn)
             band_change_id = cursor.lastrowid
+        DB_INSERT_SECONDS.observe(time.perf_counter() - start, 'band_changes')
             
         logger.info(f"Band change recorded in database: ID={band_change_id}, band={band}, source={source}")
         return band_change_id
     
+    def insert_band_changes_bulk(self, changes: Iterable[Tuple[int, str]], source: str = 'app',
+                                 chunk_size: int = DEFAULT_BULK_CHUNK_SIZE) -> List[Tuple[int, int]]:
+        """Insert many (timestamp, band) band change records in chunked transactions
+        
+        Returns the inclusive (first_id, last_id) range of each chunk.
+        """
+        rows = ((timestamp, band, source) for timestamp, band in changes)
+        id_ranges = self._bulk_insert('''
+            INSERT INTO band_changes (
+                timestamp, band, source
+            ) VALUES (?, ?, ?)
+        ''', rows, chunk_size)
+        
+        logger.info(f"Bulk inserted {_count_ids(id_ranges)} band changes from {source}")
+        return id_ranges
+    
     def get_band_changes(self, limit: int = 100, source: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get band change history, optionally filtered by source"""
-        with self.get_connection() as conn:
+        with self.get_read_connection() as conn:
             cursor = conn.cursor()
             
             if source:
@@ -387,7 +1068,7 @@ class Database:
     
     def get_bands_worked(self, since_timestamp: Optional[int] = None) -> List[str]:
         """Get list of bands that have been changed to since given timestamp"""
-        with self.get_connection() as conn:
+        with self.get_read_connection() as conn:
             cursor = conn.cursor()
             
             if since_timestamp:
@@ -407,7 +1088,7 @@ class Database:
     
     def get_latest_gps_position(self, source: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """Get the most recent GPS position, optionally filtered by source"""
-        with self.get_connection() as conn:
+        with self.get_read_connection() as conn:
             cursor = conn.cursor()
             
             if source:
@@ -428,6 +1109,11 @@ class Database:
             return dict(row) if row else None
 
 
+def _count_ids(id_ranges: List[Tuple[int, int]]) -> int:
+    """Count the ids covered by a list of inclusive id ranges"""
+    return sum(last - first + 1 for first, last in id_ranges)
+
+
 if __name__ == '__main__':
     # Test database
     import tempfile
@@ -474,11 +1160,30 @@ if __name__ == '__main__':
         for decode in recent:
             print(f"  {decode['callsign']} at {decode['latitude']}, {decode['longitude']}")
             
+        # Bulk insert
+        id_ranges = db.insert_decodes_bulk(
+            (dict(decode_data, callsign=f"K{i}ABC"), gps_data) for i in range(250)
+        )
+        print(f"Bulk inserted decode id ranges: {id_ranges}")
+        
+        # Spatial queries
+        nearby = db.get_decodes_in_bbox(47.0, -123.0, 48.0, -122.0, position='receiver')
+        print(f"Decodes heard around Seattle: {len(nearby)}")
+        remote = db.get_decodes_within_radius(42.5, -71.0, 500, position='remote')
+        print(f"Decodes from stations within 500 km of Boston: {len(remote)}")
+        
+        # Message search
+        matches = db.search_decodes('CQ K1A*', limit=10)
+        print(f"Search 'CQ K1A*': {len(matches)} matches")
+        
         # Get stats
         stats = db.get_stats()
         print(f"Stats: {stats}")
+        print(f"Pool stats: {db.get_pool_stats()}")
+        db.close()
         
     finally:
-        if os.path.exists(db_file):
-            os.unlink(db_file)
-            print(f"Cleaned up test database")
+        for path in (db_file, db_file + '-wal', db_file + '-shm'):
+            if os.path.exists(path):
+                os.unlink(path)
+        print(f"Cleaned up test database")
@@ -0,0 +1,278 @@
+"""
+Decode Filters
+Server-side filters for /decodes subscriptions. Query parameters compile into
+a DecodeFilter predicate, and FilterIndex files each subscriber under the
+most selective key of its filter so a broadcast only visits subscribers the
+decode can match.
+"""
+
+from typing import Dict, Any, Optional, List, Tuple, Iterable, Mapping
+
+from ft8_decoder import extract_callsign_grid
+
+# Query parameters accepted on /decodes
+FILTER_PARAMS = ('callsign', 'grid', 'min_snr', 'band', 'cq', 'watchlist')
+
+
+def parse_android_line(decode_line: str) -> Dict[str, Any]:
+    """Parse an Android decode line ('HHMMSS SNR DT FREQ ~ MESSAGE') into decode fields"""
+    head, _, message = decode_line.partition('~')
+    parts = head.split()
+    message = message.strip()
+    callsign, grid = extract_callsign_grid(message)
+    
+    try:
+        snr = int(parts[1])
+    except (IndexError, ValueError):
+        snr = None
+    
+    try:
+        dt = float(parts[2])
+        frequency = int(parts[3])
+    except (IndexError, ValueError):
+        dt = frequency = None
+    
+    return {'message': message, 'callsign': callsign, 'grid': grid, 'snr': snr,
+            'dt': dt, 'frequency': frequency}
+
+
+def decode_fields(decode_line: str, decode: Optional[Dict[str, Any]] = None,
+                  band: Optional[str] = None) -> Dict[str, Any]:
+    """Build the fields filters match against, once per decode
+    
+    decode is the structured decode (FT8Decode.to_dict() or a decodes row);
+    without it the fields are parsed from the line. band is used when the
+    decode does not carry its own.
+    """
+    if decode is None:
+        decode = parse_android_line(decode_line)
+    
+    message = (decode.get('message') or '').upper()
+    return {
+        'callsign': (decode.get('callsign') or '').upper(),
+        'grid': (decode.get('grid') or '').upper(),
+        'snr': decode.get('snr'),
+        'band': decode.get('band') or band,
+        'cq': message.startswith('CQ '),
+        'tokens': frozenset(message.split())
+    }
+
+
+def _split_list(value: Optional[str]) -> List[str]:
+    """Split a comma-separated query parameter into upper-case entries"""
+    if not value:
+        return []
+    return [entry.strip().upper() for entry in value.split(',') if entry.strip()]
+
+
+class DecodeFilter:
+    """Predicate over decode fields compiled from /decodes query parameters
+    
+    All given conditions must match:
+    - callsign: decode callsign is one of the calls, or starts with a 'PREFIX*' entry
+    - grid: decode grid starts with one of the prefixes
+    - min_snr: decode SNR is at least this many dB
+    - band: decode band is one of the bands
+    - cq: decode is a CQ call
+    - watchlist: one of the callsigns appears anywhere in the message
+    """
+    
+    def __init__(self, callsigns: Iterable[str] = (), grid_prefixes: Iterable[str] = (),
+                 min_snr: Optional[int] = None, bands: Iterable[str] = (), cq_only: bool = False,
+                 watchlist: Iterable[str] = ()):
+        callsigns = list(callsigns)
+        self.calls = frozenset(call for call in callsigns if not call.endswith('*'))
+        self.call_prefixes = tuple(call[:-1] for call in callsigns if call.endswith('*'))
+        self.grid_prefixes = tuple(grid_prefixes)
+        self.min_snr = min_snr
+        self.bands = frozenset(band.lower() for band in bands)
+        self.cq_only = cq_only
+        self.watchlist = frozenset(watchlist)
+        
+        if any(not prefix for prefix in self.call_prefixes):
+            raise ValueError("Callsign prefix must not be empty")
+        
+        self.predicates = self._compile()
+    
+    @classmethod
+    def from_args(cls, args: Mapping[str, str]) -> Optional['DecodeFilter']:
+        """Build a filter from query parameters, or None if none are given
+        
+        Raises ValueError if a parameter is invalid.
+        """
+        if not any(args.get(param) for param in FILTER_PARAMS):
+            return None
+        
+        min_snr = args.get('min_snr')
+        if min_snr:
+            try:
+                min_snr = int(min_snr)
+            except ValueError:
+                raise ValueError("Invalid min_snr")
+        else:
+            min_snr = None
+        
+        return cls(
+            callsigns=_split_list(args.get('callsign')),
+            grid_prefixes=_split_list(args.get('grid')),
+            min_snr=min_snr,
+            bands=_split_list(args.get('band')),
+            cq_only=(args.get('cq') or '').lower() in ('1', 'true', 'yes'),
+            watchlist=_split_list(args.get('watchlist'))
+        )
+    
+    def _compile(self) -> List:
+        """Build one predicate per condition, cheapest first"""
+        predicates = []
+        
+        if self.cq_only:
+            predicates.append(lambda fields: fields['cq'])
+        
+        if self.bands:
+            bands = self.bands
+            predicates.append(lambda fields: (fields['band'] or '').lower() in bands)
+        
+        if self.min_snr is not None:
+            min_snr = self.min_snr
+            predicates.append(lambda fields: fields['snr'] is not None and fields['snr'] >= min_snr)
+        
+        if self.calls or self.call_prefixes:
+            calls, prefixes = self.calls, self.call_prefixes
+            predicates.append(lambda fields: fields['callsign'] in calls
+                              or (bool(fields['callsign']) and fields['callsign'].startswith(prefixes)))
+        
+        if self.grid_prefixes:
+            grid_prefixes = self.grid_prefixes
+            predicates.append(lambda fields: bool(fields['grid']) and fields['grid'].startswith(grid_prefixes))
+        
+        if self.watchlist:
+            watchlist = self.watchlist
+            predicates.append(lambda fields: not watchlist.isdisjoint(fields['tokens']))
+        
+        return predicates
+    
+    def matches(self, fields: Dict[str, Any]) -> bool:
+        """Check whether a decode passes every condition"""
+        for predicate in self.predicates:
+            if not predicate(fields):
+                return False
+        return True
+    
+    def index_keys(self) -> List[Tuple[str, Any]]:
+        """Keys to file this filter under, from its most selective condition
+        
+        An empty list means the filter can only be checked by scanning.
+        """
+        if self.calls or self.call_prefixes:
+            return ([('call', call) for call in self.calls] +
+                    [('prefix', prefix) for prefix in self.call_prefixes])
+        if self.watchlist:
+            return [('token', call) for call in self.watchlist]
+        if self.grid_prefixes:
+            return [('grid', prefix) for prefix in self.grid_prefixes]
+        if self.bands:
+            return [('band', band) for band in self.bands]
+        if self.cq_only:
+            return [('cq', True)]
+        return []
+    
+    def describe(self) -> Dict[str, Any]:
+        """Filter conditions for /health"""
+        description = {}
+        if self.calls or self.call_prefixes:
+            description['callsign'] = sorted(self.calls) + [prefix + '*' for prefix in self.call_prefixes]
+        if self.grid_prefixes:
+            description['grid'] = list(self.grid_prefixes)
+        if self.min_snr is not None:
+            description['min_snr'] = self.min_snr
+        if self.bands:
+            description['band'] = sorted(self.bands)
+        if self.cq_only:
+            description['cq'] = True
+        if self.watchlist:
+            description['watchlist'] = sorted(self.watchlist)
+        return description
+
+
+def lookup_keys(fields: Dict[str, Any]) -> List[Tuple[str, Any]]:
+    """Every index key a decode can match"""
+    keys = []
+    
+    callsign = fields['callsign']
+    if callsign:
+        keys.append(('call', callsign))
+        keys.extend(('prefix', callsign[:length]) for length in range(1, len(callsign) + 1))
+    
+    keys.extend(('token', token) for token in fields['tokens'])
+    
+    grid = fields['grid']
+    if grid:
+        keys.extend(('grid', grid[:length]) for length in range(1, len(grid) + 1))
+    
+    if fields['band']:
+        keys.append(('band', fields['band'].lower()))
+    
+    if fields['cq']:
+        keys.append(('cq', True))
+    
+    return keys
+
+
+class FilterIndex:
+    """Subscribers indexed by filter key
+    
+    Subscribers are any objects with a decode_filter attribute. Dicts are used
+    as insertion-ordered sets.
+    """
+    
+    def __init__(self):
+        self.unfiltered: Dict[Any, None] = {}
+        self.scanned: Dict[Any, None] = {}
+        self.keyed: Dict[Tuple[str, Any], Dict[Any, None]] = {}
+    
+    def add(self, subscriber):
+        """File a subscriber under its filter's index keys"""
+        decode_filter = subscriber.decode_filter
+        if decode_filter is None:
+            self.unfiltered[subscriber] = None
+            return
+        
+        keys = decode_filter.index_keys()
+        if not keys:
+            self.scanned[subscriber] = None
+        for key in keys:
+            self.keyed.setdefault(key, {})[subscriber] = None
+    
+    def remove(self, subscriber):
+        """Remove a subscriber from every bucket it was filed under"""
+        decode_filter = subscriber.decode_filter
+        if decode_filter is None:
+            self.unfiltered.pop(subscriber, None)
+            return
+        
+        self.scanned.pop(subscriber, None)
+        for key in decode_filter.index_keys():
+            bucket = self.keyed.get(key)
+            if bucket is not None:
+                bucket.pop(subscriber, None)
+                if not bucket:
+                    del self.keyed[key]
+    
+    def matching(self, fields: Optional[Dict[str, Any]]) -> List:
+        """Subscribers that should receive a decode with these fields
+        
+        Without fields only unfiltered subscribers match.
+        """
+        subscribers = list(self.unfiltered)
+        if fields is None or not (self.keyed or self.scanned):
+            return subscribers
+        
+        candidates = dict(self.scanned)
+        for key in lookup_keys(fields):
+            bucket = self.keyed.get(key)
+            if bucket:
+                candidates.update(bucket)
+        
+        subscribers.extend(subscriber for subscriber in candidates
+                           if subscriber.decode_filter.matches(fields))
+        return subscribers
@@ -7,15 +7,59 @@ import subprocess
 import threading
 import queue
 import re
+import time
 import logging
 from pathlib import Path
 from typing import Optional, Dict, Any
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 
+from metrics import REGISTRY
+
 logger = logging.getLogger(__name__)
 
 
+# Callsign and grid square tokens in an FT8 message
+CALLSIGN_PATTERN = re.compile(r'^[A-Z0-9]{1,3}[0-9][A-Z0-9]{0,3}(?:/[A-Z0-9]+)?$')
+GRID_PATTERN = re.compile(r'^[A-R]{2}[0-9]{2}(?:[A-X]{2})?$')
+
+# Message words that can look like callsigns but never are
+NON_CALLSIGN_WORDS = ['CQ', 'DE', 'TNX', '73', 'RRR', 'RR73']
+
+# Lines that did not match the decode pattern, or matched but failed to convert
+PARSE_FAILURES = REGISTRY.counter(
+    'tracker_decode_parse_failures_total', 'Decoder lines that could not be parsed', ['reason']
+)
+
+
+def extract_callsign_grid(message: str) -> tuple:
+    """Extract the first callsign and grid square from an FT8 message"""
+    words = message.split()
+    
+    callsign = ""
+    grid = ""
+    
+    # Look for callsign pattern
+    for word in words:
+        if word not in NON_CALLSIGN_WORDS:
+            if CALLSIGN_PATTERN.match(word):
+                callsign = word
+                break
+                
+    # Look for grid square
+    for word in words:
+        if GRID_PATTERN.match(word):
+            grid = word
+            break
+            
+    return callsign, grid
+
+
+def format_android_line(time_str: str, snr: int, dt: float, frequency: int, message: str) -> str:
+    """Format decode fields as the line sent to the Android Auto app"""
+    return f"{time_str} {snr:+3d}  {dt:4.1f} {frequency:4d} ~ {message}"
+
+
 @dataclass
 class FT8Decode:
     """Represents a single FT8 decode"""
@@ -27,10 +71,12 @@ class FT8Decode:
     message: str
     callsign: str = ""
     grid: str = ""
+    # Monotonic time the decoder produced this decode, for pipeline latency
+    received_at: float = field(default_factory=time.monotonic)
     
     def to_android_format(self) -> str:
         """Format for Android Auto app"""
-        return f"{self.time_str} {self.snr:+3d}  {self.dt:4.1f} {self.frequency:4d} ~ {self.message}"
+        return format_android_line(self.time_str, self.snr, self.dt, self.frequency, self.message)
     
     def to_dict(self) -> Dict[str, Any]:
         """Convert to dictionary for database/JSON"""
@@ -121,6 +167,8 @@ class WSJTXDecoder(FT8Decoder):
         """Parse and process a log line"""
         match = self.WSJTX_PATTERN.match(line)
         if not match:
+            if line:
+                PARSE_FAILURES.inc('unmatched')
             return
             
         try:
@@ -154,31 +202,12 @@ class WSJTXDecoder(FT8Decoder):
             self._notify_decode(decode)
             
         except Exception as e:
+            PARSE_FAILURES.inc('invalid')
             logger.error(f"Error parsing line '{line}': {e}")
             
     def _extract_callsign_grid(self, message: str) -> tuple:
         """Extract callsign and grid square from message"""
-        words = message.split()
-        
-        callsign = ""
-        grid = ""
-        
-        # Look for callsign pattern
-        callsign_pattern = re.compile(r'^[A-Z0-9]{1,3}[0-9][A-Z0-9]{0,3}(?:/[A-Z0-9]+)?$')
-        for word in words:
-            if word not in ['CQ', 'DE', 'TNX', '73', 'RRR', 'RR73']:
-                if callsign_pattern.match(word):
-                    callsign = word
-                    break
-                    
-        # Look for grid square
-        grid_pattern = re.compile(r'^[A-R]{2}[0-9]{2}(?:[A-X]{2})?$')
-        for word in words:
-            if grid_pattern.match(word):
-                grid = word
-                break
-                
-        return callsign, grid
+        return extract_callsign_grid(message)
 
 
 class FT8LibDecoder(FT8Decoder):
@@ -320,6 +349,7 @@ class TestFileDecoder(FT8Decoder):
         """Parse and process a test file line"""
         match = self.DECODE_PATTERN.match(line)
         if not match:
+            PARSE_FAILURES.inc('unmatched')
             logger.debug(f"Skipping invalid line: {line}")
             return
             
@@ -355,31 +385,12 @@ class TestFileDecoder(FT8Decoder):
             self._notify_decode(decode)
             
         except Exception as e:
+            PARSE_FAILURES.inc('invalid')
             logger.error(f"Error parsing test line '{line}': {e}")
             
     def _extract_callsign_grid(self, message: str) -> tuple:
         """Extract callsign and grid square from message"""
-        words = message.split()
-        
-        callsign = ""
-        grid = ""
-        
-        # Look for callsign pattern
-        callsign_pattern = re.compile(r'^[A-Z0-9]{1,3}[0-9][A-Z0-9]{0,3}(?:/[A-Z0-9]+)?$')
-        for word in words:
-            if word not in ['CQ', 'DE', 'TNX', '73', 'RRR', 'RR73']:
-                if callsign_pattern.match(word):
-                    callsign = word
-                    break
-                    
-        # Look for grid square
-        grid_pattern = re.compile(r'^[A-R]{2}[0-9]{2}(?:[A-X]{2})?$')
-        for word in words:
-            if grid_pattern.match(word):
-                grid = word
-                break
-                
-        return callsign, grid
+        return extract_callsign_grid(message)
 
 
 def create_decoder(decoder_type: str, config: Dict[str, Any]) -> FT8Decoder:
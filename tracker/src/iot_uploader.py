@@ -1,18 +1,111 @@
 """
 IoT Uploader
 Uploads FT8 decodes to dx.jxqz.org when internet is available
+Batches go over one keep-alive session, so a cellular link pays the TCP and
+TLS handshake once rather than per batch, optionally with gzip (or zstd)
+request bodies.
+A backlog (after a day offline) is drained back-to-back in larger batches,
+several in flight at once, before returning to the periodic cadence.
 """
 
+import gzip
+import math
 import logging
 import threading
 import time
 import json
 import requests
-from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from datetime import datetime
 
+from metrics import REGISTRY
+
 logger = logging.getLogger(__name__)
 
+# Try to import zstandard (optional; gzip is used without it)
+try:
+    import zstandard
+    ZSTD_AVAILABLE = True
+except ImportError:
+    ZSTD_AVAILABLE = False
+
+# Request body encodings, and what to fall back to if the server refuses one
+ENCODING_FALLBACK = {'zstd': 'gzip', 'gzip': None}
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 9
+
+# Seconds to wait for a connection, and for the server's reply
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+
+# Backlog draining: batches grow up to this many decodes and the server's body
+# limit (measured as uncompressed JSON), with this many uploads in flight
+DEFAULT_MAX_BATCH_SIZE = 5000
+DEFAULT_MAX_UPLOAD_BYTES = 1024 * 1024
+DEFAULT_MAX_IN_FLIGHT = 3
+# Room left in each batch for the payload envelope
+ENVELOPE_BYTES = 256
+
+# Upload metrics (the backlog gauge is registered per uploader)
+UPLOAD_BATCH_SECONDS = REGISTRY.histogram('tracker_upload_batch_seconds', 'Time to upload one batch of decodes')
+UPLOAD_BATCHES = REGISTRY.counter('tracker_upload_batches_total', 'Batch uploads by result', ['result'])
+UPLOAD_BYTES = REGISTRY.counter('tracker_upload_bytes_total', 'HTTP bytes exchanged with the upload server',
+                                ['direction'])
+UPLOAD_HANDSHAKE_SECONDS = REGISTRY.histogram('tracker_upload_handshake_seconds',
+                                              'TCP and TLS setup time of new upload connections')
+UPLOAD_DRAIN_SECONDS = REGISTRY.histogram('tracker_upload_drain_seconds',
+                                          'Time to upload a backlog of more than one batch',
+                                          buckets=(10, 30, 60, 120, 300, 600, 1800, 3600, 7200))
+
+
+def compress_payload(body: bytes, encoding: Optional[str]) -> bytes:
+    """Compress a request body for a Content-Encoding (None leaves it as is)"""
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(body)
+    if encoding == 'gzip':
+        return gzip.compress(body, GZIP_LEVEL)
+    return body
+
+
+def _timed_pool(pool_class, connection_class, on_connect: Callable[[float], None]):
+    """A connection pool class whose new connections report their setup time"""
+    
+    class TimedConnection(connection_class):
+        def connect(self):
+            started = time.monotonic()
+            super().connect()
+            on_connect(time.monotonic() - started)
+    
+    return type(f"Timed{pool_class.__name__}", (pool_class,), {'ConnectionCls': TimedConnection})
+
+
+class TimedAdapter(HTTPAdapter):
+    """Keep-alive adapter that reports how long each new connection took to open
+    
+    For HTTPS that is the TCP connect plus the TLS handshake; reused
+    connections cost nothing.
+    """
+    
+    def __init__(self, on_connect: Callable[[float], None], **kwargs):
+        self.on_connect = on_connect
+        super().__init__(**kwargs)
+    
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _timed_pool(HTTPConnectionPool, HTTPConnection, self.on_connect),
+            'https': _timed_pool(HTTPSConnectionPool, HTTPSConnection, self.on_connect)
+        }
+
+
+def _message_size(headers, body: Optional[bytes]) -> int:
+    """Approximate HTTP size of a message: header lines plus body"""
+    return sum(len(name) + len(value) + 4 for name, value in headers.items()) + len(body or b'')
+
 
 class IoTUploader:
     """Uploads decodes to IoT server (dx.jxqz.org)"""
@@ -29,11 +122,42 @@ class IoTUploader:
         self.upload_interval = int(config.get('upload_interval', 300))  # 5 minutes
         self.batch_size = int(config.get('batch_size', 100))
         self.enabled = config.get('enabled', True)
+        self.encoding = self._choose_encoding(str(config.get('compression', 'none')).lower())
+        self.max_batch_size = max(self.batch_size, int(config.get('max_batch_size', DEFAULT_MAX_BATCH_SIZE)))
+        self.max_upload_bytes = int(config.get('max_upload_bytes', DEFAULT_MAX_UPLOAD_BYTES))
+        self.max_in_flight = max(1, int(config.get('max_in_flight', DEFAULT_MAX_IN_FLIGHT)))
+        
+        # One pooled keep-alive session for every request, with a connection per in-flight batch
+        self.session = requests.Session()
+        adapter = TimedAdapter(self._on_connect, pool_connections=2, pool_maxsize=self.max_in_flight + 1)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=self.max_in_flight, thread_name_prefix='iot-upload')
+        self.stopped = threading.Event()
+        
+        # New connections opened by the current thread's batch
+        self.batch_connects = threading.local()
+        self.stats_lock = threading.Lock()
         
         # Statistics
         self.total_uploaded = 0
         self.last_upload_time: Optional[datetime] = None
         self.consecutive_failures = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.connections_opened = 0
+        self.handshake_seconds = 0.0
+        self.batches_uploaded = 0
+        self.last_batch: Optional[Dict[str, Any]] = None
+        
+        # Backlog drain in progress (monotonic start, decodes and batches so far) and the last one finished
+        self.drain_started: Optional[float] = None
+        self.drain_decodes = 0
+        self.drain_batches = 0
+        self.last_drain: Optional[Dict[str, Any]] = None
+        
+        REGISTRY.callback('tracker_upload_backlog', 'Decodes waiting to be uploaded',
+                          self.database.count_unuploaded)
         
     def start(self):
         """Start the uploader thread"""
@@ -55,10 +179,35 @@ class IoTUploader:
     def stop(self):
         """Stop the uploader"""
         self.running = False
+        self.stopped.set()
         if self.upload_thread:
             self.upload_thread.join(timeout=5)
+        self.executor.shutdown(wait=False)
+        self.session.close()
         logger.info("IoT uploader stopped")
         
+    def _choose_encoding(self, compression: str) -> Optional[str]:
+        """Pick the request body encoding: auto, zstd, gzip or none"""
+        if compression == 'none':
+            return None
+        if compression in ('auto', 'zstd') and ZSTD_AVAILABLE:
+            return 'zstd'
+        if compression == 'zstd':
+            logger.warning("zstandard module not available, compressing uploads with gzip. "
+                           "Install with: pip install zstandard")
+        elif compression not in ('auto', 'gzip'):
+            logger.warning(f"Unknown upload compression '{compression}', using gzip")
+        return 'gzip'
+        
+    def _on_connect(self, seconds: float):
+        """Record a new connection to the upload server (or the connectivity check)"""
+        with self.stats_lock:
+            self.connections_opened += 1
+            self.handshake_seconds += seconds
+        self.batch_connects.count = getattr(self.batch_connects, 'count', 0) + 1
+        self.batch_connects.seconds = getattr(self.batch_connects, 'seconds', 0.0) + seconds
+        UPLOAD_HANDSHAKE_SECONDS.observe(seconds)
+        
     def _upload_loop(self):
         """Main upload loop"""
         while self.running:
@@ -69,32 +218,17 @@ class IoTUploader:
                     time.sleep(30)
                     continue
                     
-                # Get unuploaded decodes
-                decodes = self.database.get_unuploaded_decodes(self.batch_size)
-                
-                if decodes:
-                    logger.info(f"Uploading {len(decodes)} decodes to {self.server_url}")
-                    
-                    if self._upload_batch(decodes):
-                        # Mark as uploaded
-                        decode_ids = [d['id'] for d in decodes]
-                        self.database.mark_uploaded(decode_ids)
-                        
-                        self.total_uploaded += len(decodes)
-                        self.last_upload_time = datetime.now()
-                        self.consecutive_failures = 0
-                        
-                        logger.info(f"Successfully uploaded {len(decodes)} decodes")
-                    else:
-                        self.consecutive_failures += 1
-                        logger.warning(f"Upload failed (consecutive failures: {self.consecutive_failures})")
-                        
-                        # Back off on repeated failures
-                        if self.consecutive_failures > 3:
-                            time.sleep(self.upload_interval * 2)
-                            continue
+                # Upload everything pending, back-to-back while there is a backlog
+                if self.drain_backlog():
+                    self.consecutive_failures = 0
                 else:
-                    logger.debug("No decodes to upload")
+                    self.consecutive_failures += 1
+                    logger.warning(f"Upload failed (consecutive failures: {self.consecutive_failures})")
+                    
+                    # Back off on repeated failures
+                    if self.consecutive_failures > 3:
+                        time.sleep(self.upload_interval * 2)
+                        continue
                     
                 # Wait for next interval
                 time.sleep(self.upload_interval)
@@ -107,58 +241,96 @@ class IoTUploader:
         """Check if internet is available"""
         try:
             # Try to resolve DNS
-            response = requests.get('https://dns.google', timeout=5)
+            response = self.session.get('https://dns.google', timeout=5)
             return response.status_code == 200
         except:
             return False
             
     def _upload_batch(self, decodes: List[Dict[str, Any]]) -> bool:
-        """Upload a batch of decodes to the server"""
+        """Upload a batch of decodes, recording its latency and result"""
+        with UPLOAD_BATCH_SECONDS.time():
+            uploaded = self._post_batch(decodes)
+        UPLOAD_BATCHES.inc('ok' if uploaded else 'failed')
+        return uploaded
+        
+    def _decode_entry(self, decode: Dict[str, Any]) -> Dict[str, Any]:
+        """A database decode row as the server expects it"""
+        decode_entry = {
+            'timestamp': decode['timestamp'],
+            'callsign': decode['callsign'] or '',
+            'grid': decode['grid'] or '',
+            'snr': decode['snr'],
+            'frequency': decode['frequency'],
+            'band': decode['band'] or '',
+            'message': decode['message'] or '',
+        }
+        
+        # Add GPS data if available
+        if decode.get('latitude') and decode.get('longitude'):
+            decode_entry['position'] = {
+                'latitude': decode['latitude'],
+                'longitude': decode['longitude'],
+                'altitude': decode.get('altitude', 0),
+                'speed': decode.get('speed', 0),
+                'heading': decode.get('heading', 0)
+            }
+        return decode_entry
+        
+    def _post_batch(self, decodes: List[Dict[str, Any]]) -> bool:
+        """Send a batch of decodes to the server"""
         try:
             # Prepare payload
             payload = {
                 'station': self.station,
                 'timestamp': int(datetime.now().timestamp()),
-                'decodes': []
+                'decodes': [self._decode_entry(decode) for decode in decodes]
             }
             
-            for decode in decodes:
-                decode_entry = {
-                    'timestamp': decode['timestamp'],
-                    'callsign': decode['callsign'] or '',
-                    'grid': decode['grid'] or '',
-                    'snr': decode['snr'],
-                    'frequency': decode['frequency'],
-                    'band': decode['band'] or '',
-                    'message': decode['message'] or '',
+            # Send to server
+            body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+            endpoint = f"{self.server_url}/api/ft8/upload"
+            self.batch_connects.count = 0
+            self.batch_connects.seconds = 0.0
+            encoding = self.encoding
+            
+            while True:
+                headers = {
+                    'Content-Type': 'application/json',
+                    'Authorization': f'Bearer {self.api_key}'
                 }
+                if encoding:
+                    headers['Content-Encoding'] = encoding
+                data = compress_payload(body, encoding)
                 
-                # Add GPS data if available
-                if decode.get('latitude') and decode.get('longitude'):
-                    decode_entry['position'] = {
-                        'latitude': decode['latitude'],
-                        'longitude': decode['longitude'],
-                        'altitude': decode.get('altitude', 0),
-                        'speed': decode.get('speed', 0),
-                        'heading': decode.get('heading', 0)
-                    }
-                    
-                payload['decodes'].append(decode_entry)
+                response = self.session.post(
+                    endpoint,
+                    data=data,
+                    headers=headers,
+                    timeout=(CONNECT_TIMEOUT, READ_TIMEOUT)
+                )
+                self._count_bytes(response)
                 
-            # Send to server
-            headers = {
-                'Content-Type': 'application/json',
-                'Authorization': f'Bearer {self.api_key}'
-            }
-            
-            endpoint = f"{self.server_url}/api/ft8/upload"
+                # The server does not take this encoding (415, or 400 from a server that
+                # parses every body as plain JSON): step down and resend
+                if response.status_code in (400, 415) and encoding:
+                    fallback = ENCODING_FALLBACK[encoding]
+                    with self.stats_lock:
+                        if self.encoding == encoding:
+                            logger.warning(f"Server refused {encoding} uploads, using {fallback or 'no compression'}")
+                            self.encoding = fallback
+                    encoding = fallback
+                    continue
+                break
             
-            response = requests.post(
-                endpoint,
-                json=payload,
-                headers=headers,
-                timeout=30
-            )
+            self.last_batch = {
+                'decodes': len(decodes),
+                'encoding': encoding,
+                'json_bytes': len(body),
+                'body_bytes': len(data),
+                'new_connections': self.batch_connects.count,
+                'handshake_seconds': round(self.batch_connects.seconds, 4)
+            }
+            logger.debug(f"Upload batch: {self.last_batch}")
             
             if response.status_code == 200:
                 logger.info(f"Upload successful: {len(decodes)} decodes")
@@ -176,6 +348,115 @@ class IoTUploader:
         except Exception as e:
             logger.error(f"Upload error: {e}")
             return False
+        
+    def _adaptive_batch_size(self, backlog: int) -> int:
+        """Decodes per batch: batch_size normally, larger to spread a backlog over the in-flight window"""
+        return max(self.batch_size, min(self.max_batch_size, math.ceil(backlog / self.max_in_flight)))
+        
+    def _split_batches(self, decodes: List[Dict[str, Any]], size: int) -> List[List[Dict[str, Any]]]:
+        """Split decodes into batches of at most size decodes and max_upload_bytes of JSON"""
+        limit = self.max_upload_bytes - ENVELOPE_BYTES
+        batches = []
+        batch: List[Dict[str, Any]] = []
+        batch_bytes = 0
+        for decode in decodes:
+            entry_bytes = len(json.dumps(self._decode_entry(decode), separators=(',', ':'))) + 1
+            if batch and (len(batch) >= size or batch_bytes + entry_bytes > limit):
+                batches.append(batch)
+                batch, batch_bytes = [], 0
+            batch.append(decode)
+            batch_bytes += entry_bytes
+        if batch:
+            batches.append(batch)
+        return batches
+        
+    def _upload_round(self, backlog: int) -> Tuple[int, bool]:
+        """Upload one window of batches sized for the backlog
+        
+        Returns the decodes uploaded and whether every batch succeeded.
+        """
+        size = self._adaptive_batch_size(backlog)
+        decodes = self.database.get_unuploaded_decodes(size * self.max_in_flight if backlog > self.batch_size
+                                                       else self.batch_size)
+        if not decodes:
+            logger.debug("No decodes to upload")
+            return 0, True
+        
+        batches = self._split_batches(decodes, size)
+        logger.info(f"Uploading {len(decodes)} decodes to {self.server_url} in {len(batches)} batches")
+        if len(batches) > 1:
+            results = list(self.executor.map(self._upload_batch, batches))
+        else:
+            results = [self._upload_batch(batches[0])]
+        
+        uploaded = 0
+        for batch, ok in zip(batches, results):
+            if ok:
+                # Mark as uploaded
+                self.database.mark_uploaded([d['id'] for d in batch])
+                uploaded += len(batch)
+        if uploaded:
+            self.total_uploaded += uploaded
+            self.batches_uploaded += results.count(True)
+            self.last_upload_time = datetime.now()
+            logger.info(f"Successfully uploaded {uploaded} decodes")
+        
+        if self.drain_started is not None:
+            self.drain_decodes += uploaded
+            self.drain_batches += results.count(True)
+        return uploaded, all(results)
+        
+    def drain_backlog(self) -> bool:
+        """Upload pending decodes, back-to-back while more than one batch is waiting
+        
+        Once no more than batch_size decodes are left (new decodes keep arriving
+        on a busy band) the rest waits for the next interval. Returns False if a
+        batch failed; the rest waits for the next attempt. A backlog of more
+        than one batch is timed from when it was first seen until it is
+        caught up, across failed attempts in between.
+        """
+        backlog = self.database.count_unuploaded()
+        while backlog and not self.stopped.is_set():
+            if backlog > self.batch_size and self.drain_started is None:
+                logger.info(f"Draining upload backlog of {backlog} decodes")
+                self.drain_started = time.monotonic()
+                self.drain_decodes = 0
+                self.drain_batches = 0
+            
+            _, ok = self._upload_round(backlog)
+            if not ok:
+                return False
+            
+            backlog = self.database.count_unuploaded()
+            if backlog <= self.batch_size:
+                break
+        
+        if self.drain_started is not None and not self.stopped.is_set():
+            seconds = time.monotonic() - self.drain_started
+            self.last_drain = {
+                'decodes': self.drain_decodes,
+                'batches': self.drain_batches,
+                'seconds': round(seconds, 1),
+                'decodes_per_second': round(self.drain_decodes / seconds, 1) if seconds > 0 else None,
+                'finished': datetime.now().isoformat()
+            }
+            self.drain_started = None
+            UPLOAD_DRAIN_SECONDS.observe(seconds)
+            logger.info(f"Upload backlog drained: {self.drain_decodes} decodes in {self.drain_batches} batches, "
+                        f"{seconds:.1f}s")
+        return True
+        
+    def _count_bytes(self, response: requests.Response):
+        """Add a request and its response to the bytes-on-wire totals"""
+        request = response.request
+        sent = len(f"{request.method} {request.path_url} HTTP/1.1\r\n") + _message_size(request.headers, request.body)
+        received = len(f"HTTP/1.1 {response.status_code} {response.reason}\r\n") + _message_size(
+            response.headers, response.content)
+        with self.stats_lock:
+            self.bytes_sent += sent
+            self.bytes_received += received
+        UPLOAD_BYTES.inc('sent', amount=sent)
+        UPLOAD_BYTES.inc('received', amount=received)
             
     def get_stats(self) -> Dict[str, Any]:
         """Get uploader statistics"""
@@ -185,22 +466,29 @@ class IoTUploader:
             'last_upload_time': self.last_upload_time.isoformat() if self.last_upload_time else None,
             'consecutive_failures': self.consecutive_failures,
             'server_url': self.server_url,
-            'station': self.station
+            'station': self.station,
+            'encoding': self.encoding,
+            'bytes_sent': self.bytes_sent,
+            'bytes_received': self.bytes_received,
+            'connections_opened': self.connections_opened,
+            'handshake_seconds': round(self.handshake_seconds, 4),
+            'last_batch': self.last_batch,
+            'batches_uploaded': self.batches_uploaded,
+            'draining': {
+                'decodes': self.drain_decodes,
+                'batches': self.drain_batches,
+                'seconds': round(time.monotonic() - self.drain_started, 1)
+            } if self.drain_started is not None else None,
+            'last_drain': self.last_drain
         }
         
     def force_upload(self) -> bool:
-        """Force an immediate upload"""
+        """Force an immediate upload of one window of batches"""
         logger.info("Forcing immediate upload...")
-        decodes = self.database.get_unuploaded_decodes(self.batch_size)
+        uploaded, ok = self._upload_round(self.database.count_unuploaded())
         
-        if not decodes:
-            logger.info("No decodes to upload")
-            return True
-            
-        if self._upload_batch(decodes):
-            decode_ids = [d['id'] for d in decodes]
-            self.database.mark_uploaded(decode_ids)
-            logger.info(f"Force upload successful: {len(decodes)} decodes")
+        if ok:
+            logger.info(f"Force upload successful: {uploaded} decodes")
             return True
         else:
             logger.error("Force upload failed")
@@ -0,0 +1,270 @@
+"""
+Local Decode Feed
+Publishes the decode stream to consumers on the same host (a display
+script, an APRS beaconer, a logger) without going through TCP/HTTP:
+
+- A Unix domain socket (SOCK_SEQPACKET): every decode is one message holding
+  one binary record (see binary_stream), so readers get whole records from
+  each recv() with no framing or HTTP parsing.
+- An mmap ring file: the last N records in fixed-size slots behind a header
+  with the newest sequence number. Readers map the file and poll the header,
+  so waiting for decodes costs no system calls at all.
+
+Each decode is encoded once and the same bytes go to every socket and the
+ring. A consumer that stops reading loses decodes (counted) rather than
+holding up the decoder.
+
+Ring file layout (big-endian, like the records):
+    header  magic:4s "FT8R" version:u16 slot_size:u16 slots:u32 sequence:u64
+            (padded to HEADER_SIZE)
+    slot    sequence:u64 length:u16 record[length]   (slot_size bytes)
+Record n lives in slot n % slots. The writer clears a slot's sequence, writes
+the record, then sets the slot's sequence and finally the header's; a reader
+that finds the slot sequence changed after copying the record was lapped.
+"""
+
+import os
+import mmap
+import socket
+import struct
+import logging
+import threading
+from typing import Dict, Any, Optional, List, Tuple
+
+from binary_stream import encode_decode_record
+
+logger = logging.getLogger(__name__)
+
+RING_MAGIC = b'FT8R'
+RING_VERSION = 1
+_RING_HEADER = struct.Struct('!4sHHIQ')
+_SLOT = struct.Struct('!QH')
+# The header gets a cache line to itself
+HEADER_SIZE = 64
+# Offset of the header's sequence field
+_SEQUENCE_OFFSET = _RING_HEADER.size - 8
+
+# Records are well under this (a 40-character message makes about 75 bytes)
+DEFAULT_SLOT_SIZE = 256
+DEFAULT_RING_SLOTS = 4096
+
+# Seconds between checks for shutdown while waiting for consumers
+ACCEPT_TIMEOUT = 1.0
+# Kernel buffer per consumer socket: a few minutes of decodes
+SOCKET_SEND_BUFFER = 256 * 1024
+
+
+class DecodeRing:
+    """Writer side of the mmap ring file"""
+    
+    def __init__(self, path: str, slots: int = DEFAULT_RING_SLOTS, slot_size: int = DEFAULT_SLOT_SIZE):
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.sequence = 0
+        
+        # Write to a temporary file and rename, so readers never map a half-built ring
+        size = HEADER_SIZE + slots * slot_size
+        temporary = f"{path}.tmp"
+        with open(temporary, 'wb') as f:
+            f.truncate(size)
+        self.file = open(temporary, 'r+b')
+        self.map = mmap.mmap(self.file.fileno(), size)
+        _RING_HEADER.pack_into(self.map, 0, RING_MAGIC, RING_VERSION, slot_size, slots, 0)
+        os.replace(temporary, path)
+    
+    def write(self, record: bytes) -> bool:
+        """Store a record in the next slot, returning False if it is too large for one"""
+        if _SLOT.size + len(record) > self.slot_size:
+            return False
+        
+        sequence = self.sequence + 1
+        offset = HEADER_SIZE + (sequence % self.slots) * self.slot_size
+        struct.pack_into('!Q', self.map, offset, 0)
+        self.map[offset + _SLOT.size:offset + _SLOT.size + len(record)] = record
+        _SLOT.pack_into(self.map, offset, sequence, len(record))
+        struct.pack_into('!Q', self.map, _SEQUENCE_OFFSET, sequence)
+        self.sequence = sequence
+        return True
+    
+    def close(self):
+        """Unmap the ring; the file stays for readers still mapping it"""
+        self.map.close()
+        self.file.close()
+
+
+class RingReader:
+    """Reader side of the mmap ring file, for local consumers"""
+    
+    def __init__(self, path: str):
+        self.file = open(path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.slot_size, self.slots, _ = _RING_HEADER.unpack_from(self.map)
+        if magic != RING_MAGIC or version != RING_VERSION:
+            raise ValueError(f"Not a decode ring file: {path}")
+        # Start at the newest record, like a new stream subscriber
+        self.sequence = self.latest()
+    
+    def latest(self) -> int:
+        """Sequence number of the newest record written"""
+        return struct.unpack_from('!Q', self.map, _SEQUENCE_OFFSET)[0]
+    
+    def poll(self) -> Tuple[List[bytes], int]:
+        """Copy out the records written since the last poll
+        
+        Returns the records (each with its length prefix, for read_records)
+        and how many were overwritten before they could be read.
+        """
+        latest = self.latest()
+        skipped = 0
+        if latest - self.sequence > self.slots:
+            skipped = latest - self.sequence - self.slots
+            self.sequence = latest - self.slots
+        
+        records = []
+        while self.sequence < latest:
+            sequence = self.sequence + 1
+            offset = HEADER_SIZE + (sequence % self.slots) * self.slot_size
+            written, length = _SLOT.unpack_from(self.map, offset)
+            record = self.map[offset + _SLOT.size:offset + _SLOT.size + length]
+            if written != sequence or struct.unpack_from('!Q', self.map, offset)[0] != sequence:
+                # Overwritten (or being written) while we copied: the writer lapped us
+                skipped += 1
+            else:
+                records.append(record)
+            self.sequence = sequence
+        return records, skipped
+    
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+
+class LocalFeed:
+    """Decode feed for co-located consumers over a Unix socket and an mmap ring"""
+    
+    def __init__(self, config: Dict[str, Any]):
+        self.socket_path = config.get('local_socket', '')
+        self.ring_path = config.get('local_ring', '')
+        self.ring_slots = int(config.get('local_ring_slots', DEFAULT_RING_SLOTS))
+        self.running = False
+        
+        self.listener: Optional[socket.socket] = None
+        self.consumers: List[socket.socket] = []
+        self.consumers_lock = threading.Lock()
+        self.accept_thread = None
+        self.ring: Optional[DecodeRing] = None
+        
+        # Metrics
+        self.published = 0
+        self.dropped = 0
+    
+    def start(self) -> bool:
+        """Open the socket and/or the ring file"""
+        try:
+            if self.ring_path:
+                self.ring = DecodeRing(self.ring_path, self.ring_slots)
+                logger.info(f"Local decode ring: {self.ring_path} ({self.ring_slots} slots)")
+            
+            if self.socket_path:
+                if os.path.exists(self.socket_path):
+                    os.unlink(self.socket_path)
+                self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+                self.listener.bind(self.socket_path)
+                self.listener.listen(16)
+                self.listener.settimeout(ACCEPT_TIMEOUT)
+                logger.info(f"Local decode socket: {self.socket_path}")
+            
+            self.running = True
+            if self.listener:
+                self.accept_thread = threading.Thread(target=self._accept_loop, daemon=True)
+                self.accept_thread.start()
+            return True
+        
+        except Exception as e:
+            logger.error(f"Failed to start local decode feed: {e}")
+            self.stop()
+            return False
+    
+    def stop(self):
+        """Disconnect consumers and close the socket and ring"""
+        self.running = False
+        
+        if self.listener:
+            self.listener.close()
+            self.listener = None
+        if self.accept_thread:
+            self.accept_thread.join(timeout=ACCEPT_TIMEOUT * 2)
+            self.accept_thread = None
+        with self.consumers_lock:
+            consumers, self.consumers = self.consumers, []
+        for sock in consumers:
+            sock.close()
+        if self.socket_path:
+            try:
+                os.unlink(self.socket_path)
+            except OSError:
+                pass
+        
+        if self.ring:
+            self.ring.close()
+            self.ring = None
+    
+    def _accept_loop(self):
+        """Accept consumer connections"""
+        while self.running:
+            try:
+                sock, _ = self.listener.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            
+            # publish never blocks: a full consumer loses the decode instead
+            sock.setblocking(False)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_SEND_BUFFER)
+            with self.consumers_lock:
+                self.consumers.append(sock)
+            logger.debug(f"Local decode consumer connected, total: {len(self.consumers)}")
+    
+    def publish(self, decode_line: str, event_id: Optional[int] = None,
+                decode: Optional[Dict[str, Any]] = None, band: Optional[str] = None):
+        """Send a decode to every local consumer and the ring"""
+        if not self.running:
+            return
+        
+        record = encode_decode_record(event_id, decode_line, decode, band)
+        self.published += 1
+        if self.ring and not self.ring.write(record):
+            logger.debug(f"Decode record of {len(record)} bytes does not fit a ring slot")
+        
+        with self.consumers_lock:
+            consumers = list(self.consumers)
+        for sock in consumers:
+            try:
+                sock.send(record)
+            except (BlockingIOError, InterruptedError):
+                self.dropped += 1
+            except OSError:
+                self._drop(sock)
+    
+    def _drop(self, sock: socket.socket):
+        """Forget a consumer that has gone away"""
+        with self.consumers_lock:
+            if sock in self.consumers:
+                self.consumers.remove(sock)
+        sock.close()
+        logger.debug("Local decode consumer disconnected")
+    
+    def get_client_count(self) -> int:
+        """Get number of connected socket consumers"""
+        return len(self.consumers)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Consumers, decodes published and decodes dropped for full consumers"""
+        return {
+            'consumers': len(self.consumers),
+            'published': self.published,
+            'dropped': self.dropped,
+            'ring_sequence': self.ring.sequence if self.ring else None
+        }
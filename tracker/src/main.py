@@ -1,6 +1,6 @@
 """
 Main FT8 Tracker Service
-Coordinates all components: FT8 decoder, GPS, database, network server, IoT uploader
+Coordinates all components: FT8 decoder, GPS, database, network server, local feed, IoT uploader
 """
 
 import logging
@@ -9,17 +9,35 @@ import sys
 import time
 import configparser
 from pathlib import Path
-from typing import Dict, Any
+from datetime import datetime
+from typing import Dict, Any, List
 
 # Import our modules
 from ft8_decoder import create_decoder, FT8Decode
 from gps_handler import GPSHandler, DummyGPS, GPSPosition
 from database import Database
 from network_server_flask import FlaskNetworkServer
+from network_server_async import AsyncNetworkServer
+from worker_pool import WorkerPool
+from local_feed import LocalFeed
 from iot_uploader import IoTUploader
+from metrics import REGISTRY, SLOT_LATENCY_BUCKETS
 
 logger = logging.getLogger(__name__)
 
+# Decode pipeline metrics
+DECODES_TOTAL = REGISTRY.counter('tracker_decodes_total', 'FT8 decodes processed', ['band'])
+DECODE_LATENCY = REGISTRY.histogram(
+    'tracker_decode_latency_seconds', 'Time from the start of the FT8 slot to fan-out to clients',
+    buckets=SLOT_LATENCY_BUCKETS
+)
+DECODE_PIPELINE_SECONDS = REGISTRY.histogram(
+    'tracker_decode_pipeline_seconds', 'Time from the decoder reading a line to fan-out to clients'
+)
+
+# Decodes older than this (replayed logs, test files, clock skew) stay out of the latency histogram
+MAX_SLOT_LATENCY = 300
+
 
 class FT8Tracker:
     """Main FT8 Tracker service"""
@@ -34,6 +52,7 @@ class FT8Tracker:
         self.ft8_decoder = None
         self.gps_handler = None
         self.network_server = None
+        self.local_feed = None
         self.iot_uploader = None
         
         # Current state
@@ -78,8 +97,24 @@ class FT8Tracker:
             },
             'network': {
                 'server_enabled': 'true',
+                'server_mode': 'threaded',
                 'server_port': '8080',
-                'server_bind': '0.0.0.0'
+                'server_bind': '0.0.0.0',
+                'server_workers': '0',
+                'sse_queue_size': '256',
+                'sse_drop_policy': 'drop-oldest',
+                'sse_max_lag': '30',
+                'sse_replay_buffer': '1024',
+                'sse_replay_limit': '1000',
+                'sse_compression': 'true',
+                'sse_compression_level': '6',
+                'sse_keepalive_interval': '5',
+                'query_cache_size': '32',
+                'gps_batch_min_interval': '5',
+                'gps_batch_min_distance': '25',
+                'local_socket': '',
+                'local_ring': '',
+                'local_ring_slots': '4096'
             },
             'iot': {
                 'enabled': 'false',
@@ -102,7 +137,8 @@ class FT8Tracker:
         try:
             # Initialize database
             db_path = self.config['database'].get('path', './data/tracker.db')
-            self.database = Database(db_path)
+            read_pool_size = int(self.config['database'].get('read_pool_size', 4))
+            self.database = Database(db_path, read_pool_size=read_pool_size)
             logger.info(f"Database initialized: {db_path}")
             
             # Initialize GPS
@@ -127,16 +163,35 @@ class FT8Tracker:
             
             # Initialize network server
             if self.config['network'].get('server_enabled', 'true').lower() == 'true':
-                self.network_server = FlaskNetworkServer(self.config['network'])
+                server_mode = self.config['network'].get('server_mode', 'threaded').lower()
+                if int(self.config['network'].get('server_workers', 0)) > 0:
+                    # Worker processes run the asyncio server on a shared port
+                    self.network_server = WorkerPool(self.config['network'])
+                elif server_mode == 'async':
+                    self.network_server = AsyncNetworkServer(self.config['network'])
+                else:
+                    self.network_server = FlaskNetworkServer(self.config['network'])
                 # Register GPS callback to store external GPS updates
                 self.network_server.set_gps_callback(self._on_external_gps_update)
+                self.network_server.set_gps_batch_callback(self._on_external_gps_batch)
                 # Register band callback to store band changes
                 self.network_server.set_band_callback(self._on_band_change)
+                # Give the server the database for search queries
+                self.network_server.set_database(self.database)
                 if self.network_server.start():
                     logger.info("Network server started")
                 else:
                     logger.error("Network server failed to start")
                     
+            # Decode feed for consumers on this host (Unix socket and/or mmap ring file)
+            network_config = self.config['network']
+            if network_config.get('local_socket') or network_config.get('local_ring'):
+                self.local_feed = LocalFeed(network_config)
+                if self.local_feed.start():
+                    logger.info("Local decode feed started")
+                else:
+                    self.local_feed = None
+            
             # Initialize IoT uploader
             if self.config['iot'].get('enabled', 'false').lower() == 'true':
                 self.iot_uploader = IoTUploader(self.config['iot'], self.database)
@@ -165,6 +220,8 @@ class FT8Tracker:
             self.ft8_decoder.start()
             logger.info(f"FT8 decoder started: {decoder_type}")
             
+            self._register_metrics()
+            
             self.running = True
             logger.info("FT8 Tracker started successfully")
             
@@ -189,9 +246,16 @@ class FT8Tracker:
         if self.network_server:
             self.network_server.stop()
             
+        if self.local_feed:
+            self.local_feed.stop()
+        
         if self.iot_uploader:
             self.iot_uploader.stop()
             
+        if self.database:
+            self.database.close()
+            self.database = None
+        
         logger.info("FT8 Tracker stopped")
         
     def _on_decode(self, decode: FT8Decode):
@@ -215,23 +279,37 @@ class FT8Tracker:
             if current_band:
                 logger.debug(f"  Band: {current_band}")
                 
+        decode_dict = decode.to_dict()
+        # Add band if we know it
+        if current_band:
+            decode_dict['band'] = current_band
+            
         # Store in database
+        decode_id = None
         if self.database:
             try:
-                decode_dict = decode.to_dict()
-                # Add band if we know it
-                if current_band:
-                    decode_dict['band'] = current_band
-                self.database.insert_decode(decode_dict, gps_data)
+                decode_id = self.database.insert_decode(decode_dict, gps_data)
             except Exception as e:
                 logger.error(f"Database error: {e}")
                 
-        # Send to network clients
+        # Send to network clients (the decode id doubles as the SSE event id)
         if self.network_server:
             try:
-                self.network_server.send_decode(decode.to_android_format())
+                self.network_server.send_decode(decode.to_android_format(), decode_id, decode_dict)
             except Exception as e:
                 logger.error(f"Network server error: {e}")
+        
+        if self.local_feed:
+            try:
+                self.local_feed.publish(decode.to_android_format(), decode_id, decode_dict, current_band)
+            except Exception as e:
+                logger.error(f"Local feed error: {e}")
+        
+        DECODES_TOTAL.inc(current_band or 'unknown')
+        DECODE_PIPELINE_SECONDS.observe(time.monotonic() - decode.received_at)
+        slot_latency = time.time() - decode.timestamp.timestamp()
+        if 0 <= slot_latency <= MAX_SLOT_LATENCY:
+            DECODE_LATENCY.observe(slot_latency)
                 
     def _on_gps_update(self, position: GPSPosition):
         """Handle GPS position update from local GPS"""
@@ -249,7 +327,10 @@ class FT8Tracker:
             except Exception as e:
                 logger.error(f"Failed to store external GPS: {e}")
         
-        # If we don't have a local GPS fix, use external GPS as current position
+        self._use_external_position(gps_data)
+    
+    def _use_external_position(self, gps_data: Dict[str, Any]):
+        """Use an external fix as the current position when the local GPS has none"""
         if self.gps_handler and not self.gps_handler.has_fix():
             try:
                 from gps_handler import GPSPosition
@@ -268,6 +349,21 @@ class FT8Tracker:
             except Exception as e:
                 logger.error(f"Failed to create position from external GPS: {e}")
     
+    def _on_external_gps_batch(self, positions: List[Dict[str, Any]]):
+        """Handle a batch of buffered GPS positions from the Android app"""
+        logger.info(f"External GPS batch: {len(positions)} positions")
+        
+        # Store the whole batch in one transaction
+        if self.database:
+            self.database.insert_gps_positions_bulk(positions, source='android_auto',
+                                                    chunk_size=len(positions))
+        
+        # The newest fix becomes the current position unless a live one is newer
+        latest = positions[-1]
+        current = self.last_gps_position
+        if current is None or latest['timestamp'] >= current.timestamp.timestamp():
+            self._use_external_position(latest)
+    
     def _on_band_change(self, band: str):
         """Handle band change from Android app"""
         logger.info(f"Band changed to: {band}")
@@ -284,6 +380,25 @@ class FT8Tracker:
             logger.warning("Database not initialized, cannot record band change")
         # Band is stored in network_server.current_band and used in _on_decode()
         
+    def _register_metrics(self):
+        """Publish GPS and database state on /metrics, read when scraped"""
+        def gps_fix_age():
+            if self.last_gps_position is None:
+                return None
+            return max(0.0, time.time() - self.last_gps_position.timestamp.timestamp())
+        
+        def pool_stat(key):
+            return lambda: self.database.get_pool_stats()[key] if self.database else None
+        
+        REGISTRY.callback('tracker_gps_fix', 'Whether the local GPS has a fix',
+                          lambda: int(bool(self.gps_handler and self.gps_handler.has_fix())))
+        REGISTRY.callback('tracker_gps_fix_age_seconds', 'Age of the current position (local or external fix)',
+                          gps_fix_age)
+        REGISTRY.callback('tracker_db_read_pool_idle', 'Idle read-only database connections',
+                          pool_stat('read_pool_idle'))
+        REGISTRY.callback('tracker_db_write_waits_total', 'Writer acquisitions that had to wait',
+                          pool_stat('write_waited'), 'counter')
+    
     def get_status(self) -> Dict[str, Any]:
         """Get current tracker status"""
         status = {
@@ -298,7 +413,11 @@ class FT8Tracker:
             
         if self.database:
             status['database'] = self.database.get_stats()
+            status['database_pool'] = self.database.get_pool_stats()
             
+        if self.local_feed:
+            status['local_feed'] = self.local_feed.stats()
+        
         if self.iot_uploader:
             status['iot'] = self.iot_uploader.get_stats()
             
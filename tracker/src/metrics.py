@@ -0,0 +1,311 @@
+"""
+Metrics
+Prometheus text-format metrics shared by every tracker component.
+Counters and histograms keep one shard per thread, so recording a value on the
+hot path touches only the calling thread's dict and never takes a lock; shards
+are summed when /metrics is scraped. Values that already live elsewhere (client
+counts, queue depths, fix age) are read by callbacks at scrape time instead.
+"""
+
+import bisect
+import logging
+import threading
+import time
+from typing import Dict, Any, Callable, List, Tuple, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Content type of the Prometheus text exposition format
+METRICS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Default histogram buckets (seconds), from sub-millisecond commits to slow uploads
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Buckets for latencies measured from the start of an FT8 slot
+SLOT_LATENCY_BUCKETS = (1.0, 2.0, 5.0, 10.0, 12.5, 13.0, 13.5, 14.0, 14.5, 15.0, 20.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    """Escape a label value for the text format"""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value: float) -> str:
+    """Format a sample value the way Prometheus expects"""
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _labels(names: Sequence[str], values: Sequence[Any], extra: str = '') -> str:
+    """Render a label set, e.g. {band="20m",le="0.5"}"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _ShardedMetric:
+    """Base for metrics whose values are kept in per-thread shards
+    
+    Only the owning thread writes a shard. The lock is taken when a thread
+    records its first value and at scrape time, never per update.
+    """
+    
+    kind = ''
+    
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._shards: List[Tuple[threading.Thread, Dict[tuple, Any]]] = []
+        # Values from threads that have exited, folded in at scrape time
+        self._retired: Dict[tuple, Any] = {}
+    
+    def _shard(self) -> Dict[tuple, Any]:
+        """The calling thread's shard, registering it on first use"""
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = {}
+            with self._lock:
+                # Request threads come and go, so retire dead shards as new ones arrive
+                self._retire()
+                self._shards.append((threading.current_thread(), shard))
+            self._local.shard = shard
+            return shard
+    
+    def _key(self, labels: Sequence[Any]) -> tuple:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {labels}")
+        return tuple(labels)
+    
+    def _merge(self, total: Dict[tuple, Any], shard: Dict[tuple, Any]):
+        raise NotImplementedError
+    
+    def _retire(self):
+        """Fold the shards of exited threads into the retired totals (lock held)"""
+        live = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                live.append((thread, shard))
+            else:
+                self._merge(self._retired, shard)
+        self._shards = live
+    
+    def _snapshot(self) -> Dict[tuple, Any]:
+        """Sum every shard"""
+        with self._lock:
+            self._retire()
+            total = {}
+            self._merge(total, self._retired)
+            for _, shard in self._shards:
+                self._merge(total, shard)
+            return total
+
+
+class Counter(_ShardedMetric):
+    """Monotonically increasing count"""
+    
+    kind = 'counter'
+    
+    def inc(self, *labels, amount: float = 1):
+        """Add amount to the counter for these label values"""
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+    
+    def _merge(self, total: Dict[tuple, Any], shard: Dict[tuple, Any]):
+        # list() copies the items atomically even while the owner keeps writing
+        for key, value in list(shard.items()):
+            total[key] = total.get(key, 0) + value
+    
+    def value(self, *labels) -> float:
+        """Current total for these label values"""
+        return self._snapshot().get(self._key(labels), 0)
+    
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self._snapshot().items())]
+
+
+class Histogram(_ShardedMetric):
+    """Distribution of observed values in cumulative buckets"""
+    
+    kind = 'histogram'
+    
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+    
+    def observe(self, value: float, *labels):
+        """Record one observation"""
+        shard = self._shard()
+        key = self._key(labels)
+        entry = shard.get(key)
+        if entry is None:
+            # Per-bucket counts (not cumulative) plus +Inf, then sum
+            entry = shard[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+    
+    def time(self, *labels) -> '_Timer':
+        """Context manager observing the elapsed time of its block"""
+        return _Timer(self, labels)
+    
+    def _merge(self, total: Dict[tuple, Any], shard: Dict[tuple, Any]):
+        for key, (counts, value_sum) in list(shard.items()):
+            entry = total.setdefault(key, [[0] * (len(self.buckets) + 1), 0.0])
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += value_sum
+    
+    def samples(self) -> List[str]:
+        lines = []
+        for key, (counts, value_sum) in sorted(self._snapshot().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_format_value(value_sum)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class _Timer:
+    """Times a block into a histogram"""
+    
+    def __init__(self, histogram: Histogram, labels: tuple):
+        self.histogram = histogram
+        self.labels = labels
+    
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+    
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+        return False
+
+
+class CallbackMetric:
+    """Gauge or counter whose value is read from a callback at scrape time
+    
+    The callback returns a number, or a dict mapping label-value tuples to
+    numbers. Returning None omits the metric from the scrape.
+    """
+    
+    def __init__(self, name: str, help_text: str, callback: Callable, kind: str = 'gauge',
+                 labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.callback = callback
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+    
+    def samples(self) -> List[str]:
+        values = self.callback()
+        if values is None:
+            return []
+        if not isinstance(values, dict):
+            values = {(): values}
+        return [f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(values.items())]
+
+
+class Registry:
+    """Every metric served on /metrics, in registration order"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, Any] = {}
+    
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and not isinstance(metric, CallbackMetric):
+                # Module-level metrics are registered once; return the live one on re-import
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+    
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        """Register (or fetch) a counter"""
+        return self._register(Counter(name, help_text, labelnames))
+    
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Register (or fetch) a histogram"""
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+    
+    def callback(self, name: str, help_text: str, callback: Callable, kind: str = 'gauge',
+                 labelnames: Sequence[str] = ()) -> CallbackMetric:
+        """Register a scrape-time metric, replacing any earlier one of the same name"""
+        return self._register(CallbackMetric(name, help_text, callback, kind, labelnames))
+    
+    def render(self) -> bytes:
+        """Every metric in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        
+        lines = []
+        for metric in metrics:
+            try:
+                samples = metric.samples()
+            except Exception as e:
+                # One failing callback must not take down the whole scrape
+                logger.warning(f"Metric {metric.name} failed: {e}")
+                continue
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(samples)
+        return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+# Process-wide registry; components define their metrics at import time
+REGISTRY = Registry()
+
+
+def render_metrics() -> bytes:
+    """Body for GET /metrics"""
+    return REGISTRY.render()
+
+
+def merge_metrics(parts: Sequence[Tuple[str, bytes]]) -> bytes:
+    """Combine /metrics bodies rendered by several processes into one
+    
+    parts are (process name, body) pairs. Every sample gets a process label so
+    series from different processes stay distinct, and a family found in more
+    than one body is emitted once with the samples of each.
+    """
+    families: Dict[str, Tuple[List[str], List[str]]] = {}
+    for process, body in parts:
+        label = f'process="{_escape(process)}"'
+        header: List[str] = []
+        samples: List[str] = []
+        for line in body.decode('utf-8').splitlines():
+            if line.startswith('# HELP '):
+                name = line.split(' ', 3)[2]
+                header, samples = families.setdefault(name, ([], []))
+                if not header:
+                    header.append(line)
+            elif line.startswith('# TYPE '):
+                if len(header) == 1:
+                    header.append(line)
+            elif line:
+                brace, space = line.find('{'), line.find(' ')
+                if brace != -1 and brace < space:
+                    samples.append(f"{line[:brace + 1]}{label},{line[brace + 1:]}")
+                else:
+                    samples.append(f"{line[:space]}{{{label}}}{line[space:]}")
+    
+    lines = []
+    for header, samples in families.values():
+        lines.extend(header)
+        lines.extend(samples)
+    return ('\n'.join(lines) + '\n').encode('utf-8')
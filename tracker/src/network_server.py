@@ -1,22 +1,146 @@
 """
 Network Server
 Combined TCP+HTTP server that:
-- Sends FT8 decodes to Android Auto app via TCP stream
+- Sends FT8 decodes to Android Auto app via TCP stream, as text lines or
+  binary records once the client sends "FORMAT BINARY"
 - Receives GPS position updates via HTTP POST /gps endpoint
 - Receives band changes via HTTP POST /band endpoint
+
+Both share one port and one selector thread over non-blocking sockets. A new
+connection's first bytes decide what it is: an HTTP request line is served
+by the REST handlers, anything else (or nothing within SNIFF_TIMEOUT) makes
+it a decode-stream subscriber.
+
+Each subscriber has its own output buffer; decodes queued since the last
+wakeup are appended as one chunk and written with a single send(), so a
+stalled client only fills its own buffer. Past the high-water mark a client's
+decodes are dropped until it drains to the low-water mark (then reported as
+a gap), and a client stuck there for tcp_max_lag seconds is disconnected.
 """
 
 import socket
+import selectors
 import threading
 import logging
-import queue
+import time
 import json
-from http.server import HTTPServer, BaseHTTPRequestHandler
-from typing import List, Dict, Any, Optional, Callable
+from collections import deque
+from http import HTTPStatus
+from typing import List, Dict, Any, Optional, Callable, Set, Tuple
+from urllib.parse import urlsplit
 from datetime import datetime
 
+from admission import AdmissionControl
+from api_handlers import parse_json_body, handle_gps_update, handle_band_change
+from binary_stream import (FORMAT_TEXT, FORMAT_BINARY, STREAM_FORMATS, encode_decode_record,
+                           encode_gap_record, encode_event_record)
+from sse import configure_stream_socket
+
 logger = logging.getLogger(__name__)
 
+# Longest command line a TCP client may send
+MAX_COMMAND_LENGTH = 256
+
+# Default bytes buffered for one TCP client before its decodes are dropped
+DEFAULT_HIGH_WATER = 256 * 1024
+# A dropping client resumes once its buffer drains to this fraction of the high-water mark
+LOW_WATER_RATIO = 0.5
+# Default seconds a client may stay over the high-water mark before it is disconnected
+DEFAULT_MAX_LAG = 30.0
+
+# Bytes read from a client at a time (clients only send short commands and requests)
+RECV_SIZE = 4096
+# Longest the selector sleeps before checking for lagging clients and shutdown
+SELECT_TIMEOUT = 1.0
+
+# Seconds a new connection may stay silent before it is treated as a stream subscriber
+SNIFF_TIMEOUT = 0.5
+# Request lines that mark a connection as HTTP
+HTTP_METHODS = (b"GET ", b"POST ", b"PUT ", b"HEAD ", b"DELETE ", b"OPTIONS ", b"PATCH ")
+
+# HTTP request limits
+MAX_HEADER_SIZE = 8 * 1024
+MAX_BODY_SIZE = 10 * 1024
+# Seconds an HTTP client has to send its whole request
+HTTP_REQUEST_TIMEOUT = 10.0
+
+# What a connection turned out to be once sniffed
+PROTOCOL_STREAM = 'stream'
+PROTOCOL_HTTP = 'http'
+
+
+class TCPClient:
+    """One connection on the shared port: a stream subscriber or an HTTP request"""
+    
+    def __init__(self, sock: socket.socket, address, deadline: float):
+        self.sock = sock
+        self.address = address
+        # None until the first bytes (or SNIFF_TIMEOUT) tell stream from HTTP
+        self.protocol: Optional[str] = None
+        # Sniffing ends, or the HTTP request must be complete, by then
+        self.deadline: Optional[float] = deadline
+        self.stream_format = FORMAT_TEXT
+        self.output = bytearray()
+        # Bytes received and not yet handled: a partial command line or HTTP request
+        self.input = b""
+        # Decodes dropped since the buffer went over the high-water mark, sent as a gap
+        self.gap = 0
+        # When the buffer went over the high-water mark (until it drains to the low-water mark)
+        self.lagging_since: Optional[float] = None
+        # Registered for EVENT_WRITE (only while output is pending)
+        self.writing = False
+        # Close once the output is written (HTTP responses and refused streams)
+        self.close_when_flushed = False
+        # Counted by admission control until the connection closes
+        self.admitted = False
+        self.closed = False
+        
+        # Metrics
+        self.dropped = 0
+        self.sent_bytes = 0
+
+
+def sniff(data: bytes) -> Optional[str]:
+    """Classify a connection by its first bytes, or None if they could still be either"""
+    for method in HTTP_METHODS:
+        if data.startswith(method):
+            return PROTOCOL_HTTP
+        if method.startswith(data):
+            return None
+    return PROTOCOL_STREAM
+
+
+def parse_http_request(head: bytes) -> Tuple[str, str, Dict[str, str]]:
+    """Parse an HTTP request head into (method, path, lower-cased headers)
+    
+    Raises ValueError if the request line is malformed.
+    """
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, _ = lines[0].split()
+    except ValueError:
+        raise ValueError('Malformed request line')
+    
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return method.upper(), urlsplit(target).path, headers
+
+
+def http_response(response: Dict[str, Any], status: int) -> bytes:
+    """A complete JSON response that closes the connection"""
+    body = json.dumps(response).encode('utf-8')
+    head = (
+        f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Access-Control-Allow-Origin: *\r\n"
+        f"Connection: close\r\n"
+        f"\r\n"
+    )
+    return head.encode('latin-1') + body
+
 
 class NetworkServer:
     """Combined TCP+HTTP server for decodes and GPS updates"""
@@ -25,16 +149,25 @@ class NetworkServer:
         self.config = config
         self.host = config.get('server_bind', '0.0.0.0')
         self.port = int(config.get('server_port', 8080))
-        # HTTP server uses same port by default, but can be overridden
-        self.http_port = int(config.get('server_http_port', self.port))
+        self.high_water = int(config.get('tcp_high_water', DEFAULT_HIGH_WATER))
+        self.low_water = int(self.high_water * LOW_WATER_RATIO)
+        self.max_lag = float(config.get('tcp_max_lag', DEFAULT_MAX_LAG))
         self.running = False
         self.server_socket = None
-        self.clients = []
-        self.decode_queue = queue.Queue()
+        self.selector: Optional[selectors.BaseSelector] = None
+        # Connections still being sniffed or waiting for their whole HTTP request
+        self.pending: Set[TCPClient] = set()
+        # Stream clients by socket; only the selector thread touches them
+        self.clients: Dict[socket.socket, TCPClient] = {}
+        self.lagging: Set[TCPClient] = set()
+        # Budget for concurrent and reconnecting stream clients
+        self.admission = AdmissionControl(config)
+        # (decode line, binary record) pairs from send_decode, drained by the selector thread
+        self.decode_queue = deque()
+        # Socket pair send_decode and stop use to wake the selector
+        self.wake_reader = None
+        self.wake_writer = None
         self.server_thread = None
-        self.broadcast_thread = None
-        self.http_server = None
-        self.http_thread = None
         self.gps_callback: Optional[Callable] = None
         self.last_gps_update: Optional[Dict[str, Any]] = None
         self.band_callback: Optional[Callable] = None
@@ -46,30 +179,27 @@ class NetworkServer:
             self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
             self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(5)
-            self.server_socket.settimeout(1.0)
+            self.server_socket.listen(128)
+            self.server_socket.setblocking(False)
+            
+            self.wake_reader, self.wake_writer = socket.socketpair()
+            self.wake_reader.setblocking(False)
+            self.wake_writer.setblocking(False)
+            
+            self.selector = selectors.DefaultSelector()
+            self.selector.register(self.server_socket, selectors.EVENT_READ, self._accept_clients)
+            self.selector.register(self.wake_reader, selectors.EVENT_READ, self._drain_decodes)
             
             self.running = True
             
-            # Start accept thread
-            self.server_thread = threading.Thread(target=self._accept_clients)
+            # One thread accepts, reads and writes every connection
+            self.server_thread = threading.Thread(target=self._serve)
             self.server_thread.daemon = True
             self.server_thread.start()
             
-            # Start broadcast thread
-            self.broadcast_thread = threading.Thread(target=self._broadcast_loop)
-            self.broadcast_thread.daemon = True
-            self.broadcast_thread.start()
-            
-            # Start HTTP server on same port for GPS/band updates
-            self._start_http_server()
-            
             logger.info(f"Network server started on {self.host}:{self.port}")
             logger.info(f"  TCP stream for FT8 decodes on {self.host}:{self.port}")
-            if self.http_port != self.port:
-                logger.info(f"  HTTP endpoints (/gps, /band) on {self.host}:{self.http_port}")
-            else:
-                logger.info(f"  HTTP endpoints (/gps, /band) on {self.host}:{self.http_port}")
+            logger.info(f"  HTTP endpoints (/gps, /band, /health) on {self.host}:{self.port}")
             return True
             
         except Exception as e:
@@ -80,84 +210,381 @@ class NetworkServer:
         """Stop the server"""
         self.running = False
         
-        # Stop HTTP server
-        if self.http_server:
-            self.http_server.shutdown()
-            self.http_server = None
-        
-        # Close all client connections
-        for client in self.clients[:]:
-            try:
-                client.close()
-            except:
-                pass
-        self.clients.clear()
+        # The selector thread closes every connection on its way out
+        self._wake()
+        if self.server_thread:
+            self.server_thread.join(timeout=5)
+            self.server_thread = None
         
         # Close server socket
-        if self.server_socket:
+        for sock in (self.server_socket, self.wake_reader, self.wake_writer):
+            if sock:
+                try:
+                    sock.close()
+                except:
+                    pass
+        
+        logger.info("Network server stopped")
+    
+    def _serve(self):
+        """Selector loop: accept connections, sniff them, read commands and requests, write buffers"""
+        try:
+            while self.running:
+                try:
+                    timeout = SELECT_TIMEOUT
+                    if self.pending:
+                        deadline = min(client.deadline for client in self.pending)
+                        timeout = min(timeout, max(0.0, deadline - time.monotonic()))
+                    
+                    for key, mask in self.selector.select(timeout):
+                        if not isinstance(key.data, TCPClient):
+                            # Listening socket or wakeup
+                            key.data()
+                            continue
+                        
+                        client = key.data
+                        if mask & selectors.EVENT_READ:
+                            self._read(client)
+                        if mask & selectors.EVENT_WRITE and not client.closed:
+                            self._flush(client)
+                    
+                    now = time.monotonic()
+                    self._expire_pending(now)
+                    self._evict_lagging(now)
+                
+                except Exception as e:
+                    logger.error(f"Error in stream server loop: {e}")
+        finally:
+            for client in list(self.clients.values()) + list(self.pending):
+                self._drop_client(client)
+            self.selector.close()
+    
+    def _wake(self):
+        """Wake the selector thread (safe from any thread)"""
+        if self.wake_writer:
             try:
-                self.server_socket.close()
-            except:
+                self.wake_writer.send(b"\0")
+            except OSError:
+                # Already has a wakeup pending, or the server stopped
                 pass
-                
-        logger.info("Network server stopped")
-        
+    
     def _accept_clients(self):
-        """Accept incoming client connections"""
-        while self.running:
+        """Accept every pending connection and start sniffing it"""
+        while True:
             try:
                 client_socket, address = self.server_socket.accept()
-                logger.info(f"Client connected: {address}")
-                self.clients.append(client_socket)
-                
-                # Send welcome message
-                welcome = f"# FT8 Tracker - Connected at {datetime.now()}\n"
-                self._send_to_client(client_socket, welcome)
-                
-            except socket.timeout:
-                continue
-            except Exception as e:
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
                 if self.running:
                     logger.error(f"Error accepting client: {e}")
-                    
-    def _broadcast_loop(self):
-        """Broadcast decodes to all connected clients"""
-        while self.running:
+                return
+            
+            client_socket.setblocking(False)
+            # Writes are already coalesced per wakeup, so don't let Nagle hold them back
+            client_socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            
+            client = TCPClient(client_socket, address, time.monotonic() + SNIFF_TIMEOUT)
+            self.pending.add(client)
+            self.selector.register(client_socket, selectors.EVENT_READ, client)
+            
+            # Buffered until sniffing says this is a stream client
+            welcome = f"# FT8 Tracker - Connected at {datetime.now()}\n"
+            client.output += welcome.encode('utf-8')
+    
+    def _expire_pending(self, now: float):
+        """Promote silent connections to stream clients and drop stalled HTTP requests"""
+        for client in [client for client in self.pending if client.deadline <= now]:
+            if client.protocol == PROTOCOL_HTTP:
+                logger.debug(f"HTTP request from {client.address} timed out")
+                self._drop_client(client)
+            else:
+                self._start_stream(client)
+    
+    def _start_stream(self, client: TCPClient):
+        """Make a sniffed connection a decode-stream subscriber, if admission control lets it in"""
+        client.protocol = PROTOCOL_STREAM
+        client.deadline = None
+        self.pending.discard(client)
+        
+        rejection = self.admission.admit(client.address[0])
+        if rejection:
+            # Say why in place of the welcome line and hang up
+            client.output[:] = (f"# Too many streams ({rejection.reason}), "
+                                f"retry after {rejection.retry_after}s\n").encode('utf-8')
+            client.close_when_flushed = True
+            self._flush(client)
+            return
+        
+        logger.info(f"Client connected: {client.address}")
+        client.admitted = True
+        configure_stream_socket(client.sock)
+        self.clients[client.sock] = client
+        
+        # Bytes that were not an HTTP request are the client's first commands
+        data, client.input = client.input, b""
+        self._flush(client)
+        if data and not client.closed:
+            self._handle_input(client, data)
+    
+    def _start_http(self, client: TCPClient):
+        """Make a sniffed connection an HTTP request, discarding its stream output"""
+        client.protocol = PROTOCOL_HTTP
+        client.output.clear()
+        client.gap = 0
+        # Stays pending until the whole request is in
+        client.deadline = time.monotonic() + HTTP_REQUEST_TIMEOUT
+        self._handle_http(client)
+    
+    def _drain_decodes(self):
+        """Queue every decode handed over since the last wakeup on every client"""
+        try:
+            while self.wake_reader.recv(RECV_SIZE):
+                pass
+        except (BlockingIOError, InterruptedError):
+            pass
+        
+        pending = []
+        while self.decode_queue:
+            pending.append(self.decode_queue.popleft())
+        if not pending:
+            return
+        
+        # Join the burst once per format; each client gets it in one send
+        text = b"".join((decode_line + "\n").encode('utf-8') for decode_line, _ in pending)
+        binary = b"".join(record for _, record in pending)
+        now = time.monotonic()
+        for client in list(self.clients.values()):
+            data = binary if client.stream_format == FORMAT_BINARY else text
+            self._queue(client, data, len(pending), now)
+            self._flush(client)
+        
+        # Connections still being sniffed keep decodes for when they turn out to be subscribers
+        for client in self.pending:
+            if client.protocol is None:
+                self._queue(client, text, len(pending), now)
+    
+    def _queue(self, client: TCPClient, data: bytes, decodes: int = 0, now: Optional[float] = None):
+        """Append to a client's output buffer, dropping decodes while it is over the high-water mark"""
+        if decodes and (client.lagging_since is not None or len(client.output) >= self.high_water):
+            client.gap += decodes
+            client.dropped += decodes
+            if client.lagging_since is None:
+                logger.warning(f"TCP client {client.address} is over {self.high_water} buffered bytes, "
+                               f"dropping decodes")
+                client.lagging_since = now if now is not None else time.monotonic()
+                self.lagging.add(client)
+            return
+        
+        if client.gap:
+            if client.stream_format == FORMAT_BINARY:
+                client.output += encode_gap_record(client.gap)
+            else:
+                client.output += f"# skipped {client.gap} decodes\n".encode('utf-8')
+            client.gap = 0
+        client.output += data
+    
+    def _flush(self, client: TCPClient):
+        """Write as much of a client's buffer as its socket accepts without blocking"""
+        if client.output:
             try:
-                # Get decode from queue (with timeout)
-                try:
-                    decode_line = self.decode_queue.get(timeout=1.0)
-                except queue.Empty:
-                    continue
-                    
-                # Send to all clients
-                for client in self.clients[:]:
-                    if not self._send_to_client(client, decode_line + "\n"):
-                        # Remove disconnected client
-                        self.clients.remove(client)
-                        
-            except Exception as e:
-                logger.error(f"Error in broadcast loop: {e}")
-                
-    def _send_to_client(self, client_socket: socket.socket, message: str) -> bool:
-        """Send message to a client, return False if failed"""
+                sent = client.sock.send(client.output)
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError as e:
+                logger.warning(f"Failed to send to client {client.address}: {e}")
+                self._drop_client(client)
+                return
+            del client.output[:sent]
+            client.sent_bytes += sent
+        
+        if not client.output and client.close_when_flushed:
+            self._drop_client(client)
+            return
+        
+        if client.lagging_since is not None and len(client.output) <= self.low_water:
+            client.lagging_since = None
+            self.lagging.discard(client)
+        
+        # Only ask for writability while something is left to write
+        writing = bool(client.output)
+        if writing != client.writing:
+            client.writing = writing
+            events = selectors.EVENT_READ | (selectors.EVENT_WRITE if writing else 0)
+            self.selector.modify(client.sock, events, client)
+    
+    def _evict_lagging(self, now: float):
+        """Disconnect clients that have been over the high-water mark too long"""
+        for client in [client for client in self.lagging if now - client.lagging_since > self.max_lag]:
+            logger.warning(f"Disconnecting TCP client {client.address}: lagging more than {self.max_lag:.0f}s")
+            self._drop_client(client)
+    
+    def _read(self, client: TCPClient):
+        """Read from a connection and sniff, serve or apply what it sent"""
         try:
-            client_socket.sendall(message.encode('utf-8'))
-            return True
+            data = client.sock.recv(RECV_SIZE)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            data = b""
+        if not data:
+            if client.protocol == PROTOCOL_STREAM:
+                logger.info(f"Client disconnected: {client.address}")
+            self._drop_client(client)
+            return
+        
+        if client.protocol is None:
+            client.input += data
+            protocol = sniff(client.input)
+            if protocol == PROTOCOL_HTTP:
+                self._start_http(client)
+            elif protocol == PROTOCOL_STREAM:
+                self._start_stream(client)
+            else:
+                # Part of a request line over a slow link: wait as long as for a request
+                client.deadline = time.monotonic() + HTTP_REQUEST_TIMEOUT
+            return
+        
+        self._handle_input(client, data)
+    
+    def _handle_input(self, client: TCPClient, data: bytes):
+        """Handle bytes from a sniffed connection"""
+        if client.close_when_flushed:
+            return
+        if client.protocol == PROTOCOL_HTTP:
+            client.input += data
+            self._handle_http(client)
+            return
+        
+        *lines, rest = (client.input + data).split(b"\n")
+        client.input = rest[-MAX_COMMAND_LENGTH:]
+        for line in lines:
+            self._handle_command(client, line.decode('utf-8', 'replace').strip())
+            if client.closed:
+                return
+    
+    def _handle_http(self, client: TCPClient):
+        """Serve the connection's HTTP request once it has fully arrived"""
+        head, separator, body = client.input.partition(b"\r\n\r\n")
+        if not separator:
+            if len(client.input) > MAX_HEADER_SIZE:
+                self._respond(client, {'error': 'Request header too large'}, 431)
+            return
+        
+        try:
+            method, path, headers = parse_http_request(head)
+            content_length = int(headers.get('content-length', 0))
+        except ValueError as e:
+            self._respond(client, {'error': str(e) or 'Invalid Content-Length'}, 400)
+            return
+        if content_length > MAX_BODY_SIZE:
+            self._respond(client, {'error': 'Payload too large'}, 413)
+            return
+        if len(body) < content_length:
+            return
+        
+        logger.debug(f"HTTP {method} {path} from {client.address}")
+        response, status = self._dispatch(method, path, body[:content_length])
+        self._respond(client, response, status)
+    
+    def _dispatch(self, method: str, path: str, body: bytes) -> Tuple[Dict[str, Any], int]:
+        """Route an HTTP request to its handler, returning (response, status)"""
+        routes = {'/gps': 'POST', '/band': 'POST', '/health': 'GET'}
+        if path not in routes:
+            return {'error': 'Not found'}, 404
+        if method != routes[path]:
+            return {'error': 'Method not allowed'}, 405
+        
+        if path == '/health':
+            return {
+                'status': 'ok',
+                'last_gps': self.last_gps_update,
+                'current_band': self.current_band,
+                'tcp_clients': len(self.clients),
+                'admission': self.admission.stats()
+            }, 200
+        
+        try:
+            data = parse_json_body(body)
+        except ValueError:
+            return {'error': 'Invalid JSON'}, 400
+        
+        try:
+            # Handlers run their callbacks inline on the selector thread
+            if path == '/gps':
+                return handle_gps_update(self, data)
+            return handle_band_change(self, data)
         except Exception as e:
-            logger.warning(f"Failed to send to client: {e}")
-            try:
-                client_socket.close()
-            except:
-                pass
-            return False
-            
-    def send_decode(self, decode_line: str):
-        """Queue a decode to be sent to clients"""
-        self.decode_queue.put(decode_line)
+            logger.error(f"Error processing {path}: {e}")
+            return {'error': 'Internal server error'}, 500
+    
+    def _respond(self, client: TCPClient, response: Dict[str, Any], status: int):
+        """Send an HTTP response and close the connection once it is written"""
+        client.input = b""
+        client.deadline = None
+        self.pending.discard(client)
+        client.output += http_response(response, status)
+        client.close_when_flushed = True
+        self._flush(client)
+    
+    def _handle_command(self, client: TCPClient, command: str):
+        """Handle one client command: FORMAT TEXT or FORMAT BINARY"""
+        if not command:
+            return
+        
+        verb, _, argument = command.partition(' ')
+        stream_format = argument.strip().lower()
+        current = client.stream_format
+        if verb.upper() != 'FORMAT':
+            error = f"Unknown command: {verb}"
+        elif stream_format not in STREAM_FORMATS:
+            error = f"Invalid format. Must be one of: {', '.join(STREAM_FORMATS)}"
+        else:
+            error = None
+            client.stream_format = stream_format
+            logger.debug(f"TCP client {client.address} switched to {stream_format} decodes")
         
+        # Acknowledge in the format the client was reading until now
+        if current == FORMAT_BINARY:
+            reply = {'error': error} if error else {'format': stream_format}
+            data = encode_event_record('error' if error else 'format', json.dumps(reply).encode('utf-8'))
+        else:
+            data = f"# {error or 'FORMAT ' + stream_format}\n".encode('utf-8')
+        self._queue(client, data)
+        self._flush(client)
+    
+    def _drop_client(self, client: TCPClient):
+        """Forget a connection and close its socket"""
+        if client.closed:
+            return
+        client.closed = True
+        self.clients.pop(client.sock, None)
+        self.pending.discard(client)
+        self.lagging.discard(client)
+        if client.admitted:
+            self.admission.release(client.address[0])
+        try:
+            self.selector.unregister(client.sock)
+        except (KeyError, ValueError):
+            pass
+        try:
+            client.sock.close()
+        except OSError:
+            pass
+    
+    def send_decode(self, decode_line: str, event_id: Optional[int] = None,
+                    decode: Optional[Dict[str, Any]] = None):
+        """Queue a decode to be sent to clients (safe from any thread)
+        
+        decode is the structured decode for binary clients; without it the
+        fields are parsed from the line.
+        """
+        # Encode the binary record once for every binary client
+        self.decode_queue.append((decode_line, encode_decode_record(event_id, decode_line, decode, self.current_band)))
+        self._wake()
+    
     def get_client_count(self) -> int:
-        """Get number of connected clients"""
+        """Get number of connected stream clients"""
         return len(self.clients)
     
     def set_gps_callback(self, callback: Callable):
@@ -175,158 +602,10 @@ class NetworkServer:
     def get_last_gps_update(self) -> Optional[Dict[str, Any]]:
         """Get the last GPS position received from Android app"""
         return self.last_gps_update
-    
-    def _start_http_server(self):
-        """Start HTTP server on same port as TCP for GPS/band updates"""
-        parent = self
-        
-        class GPSRequestHandler(BaseHTTPRequestHandler):
-            """Handle HTTP requests for GPS updates and band changes"""
-            
-            def log_message(self, format, *args):
-                """Override to use our logger"""
-                logger.debug(format % args)
-            
-            def do_POST(self):
-                """Handle POST request for GPS update or band change"""
-                if self.path == '/gps':
-                    try:
-                        content_length = int(self.headers.get('Content-Length', 0))
-                        if content_length > 10000:  # 10KB max
-                            self.send_error(413, "Payload too large")
-                            return
-                        
-                        body = self.rfile.read(content_length)
-                        gps_data = json.loads(body.decode('utf-8'))
-                        
-                        # Validate required fields
-                        if 'latitude' not in gps_data or 'longitude' not in gps_data:
-                            self.send_error(400, "Missing latitude or longitude")
-                            return
-                        
-                        # Add timestamp if not present
-                        if 'timestamp' not in gps_data:
-                            gps_data['timestamp'] = int(datetime.now().timestamp())
-                        
-                        # Store GPS update
-                        parent.last_gps_update = gps_data
-                        
-                        # Call callback if registered
-                        if parent.gps_callback:
-                            try:
-                                parent.gps_callback(gps_data)
-                            except Exception as e:
-                                logger.error(f"GPS callback error: {e}")
-                        
-                        # Send success response
-                        self.send_response(200)
-                        self.send_header('Content-type', 'application/json')
-                        self.end_headers()
-                        response = {'status': 'ok', 'message': 'GPS position received'}
-                        self.wfile.write(json.dumps(response).encode('utf-8'))
-                        
-                        logger.info(f"Received GPS: {gps_data.get('latitude')}, {gps_data.get('longitude')}")
-                        
-                    except json.JSONDecodeError:
-                        self.send_error(400, "Invalid JSON")
-                    except Exception as e:
-                        logger.error(f"Error processing GPS update: {e}")
-                        self.send_error(500, "Internal server error")
-                
-                elif self.path == '/band':
-                    try:
-                        content_length = int(self.headers.get('Content-Length', 0))
-                        if content_length > 1000:  # 1KB max
-                            self.send_error(413, "Payload too large")
-                            return
-                        
-                        body = self.rfile.read(content_length)
-                        band_data = json.loads(body.decode('utf-8'))
-                        
-                        # Validate required fields
-                        if 'band' not in band_data:
-                            self.send_error(400, "Missing band field")
-                            return
-                        
-                        band = band_data['band']
-                        
-                        logger.debug(f"Received band change request: {band}")
-                        
-                        # Validate band format (e.g., "40m", "20m", "15m")
-                        valid_bands = ['80m', '60m', '40m', '30m', '20m', '17m', '15m', '12m', '10m', '6m']
-                        if band not in valid_bands:
-                            self.send_error(400, f"Invalid band. Must be one of: {', '.join(valid_bands)}")
-                            return
-                        
-                        # Store current band
-                        parent.current_band = band
-                        logger.debug(f"Band stored in network server: {band}")
-                        
-                        # Call callback if registered
-                        if parent.band_callback:
-                            logger.debug(f"Calling band callback for: {band}")
-                            try:
-                                parent.band_callback(band)
-                            except Exception as e:
-                                logger.error(f"Band callback error: {e}")
-                        
-                        # Send success response
-                        self.send_response(200)
-                        self.send_header('Content-type', 'application/json')
-                        self.end_headers()
-                        response = {'status': 'ok', 'message': f'Band set to {band}'}
-                        self.wfile.write(json.dumps(response).encode('utf-8'))
-                        
-                        logger.info(f"Band changed to: {band}")
-                        
-                    except json.JSONDecodeError:
-                        self.send_error(400, "Invalid JSON")
-                    except Exception as e:
-                        logger.error(f"Error processing band update: {e}")
-                        self.send_error(500, "Internal server error")
-                
-                else:
-                    self.send_error(404, "Not found")
-            
-            def do_GET(self):
-                """Handle GET request - health check"""
-                if self.path == '/health':
-                    self.send_response(200)
-                    self.send_header('Content-type', 'application/json')
-                    self.end_headers()
-                    response = {
-                        'status': 'ok',
-                        'last_gps': parent.last_gps_update,
-                        'current_band': parent.current_band
-                    }
-                    self.wfile.write(json.dumps(response).encode('utf-8'))
-                else:
-                    self.send_error(404, "Not found")
-        
-        try:
-            # Create HTTP server with REUSEADDR to allow binding to same port
-            logger.debug(f"Attempting to start HTTP server on {self.host}:{self.http_port}")
-            self.http_server = HTTPServer((self.host, self.http_port), GPSRequestHandler)
-            # Allow reuse of the address
-            self.http_server.allow_reuse_address = True
-            logger.debug(f"Starting HTTP server on {self.host}:{self.http_port}")
-            self.http_thread = threading.Thread(target=self.http_server.serve_forever)
-            self.http_thread.daemon = True
-            self.http_thread.start()
-            logger.info(f"HTTP server started successfully on {self.host}:{self.http_port}")
-        except OSError as e:
-            if "Address already in use" in str(e):
-                logger.error(f"Failed to start HTTP server on {self.http_port}: Port already in use.")
-                logger.warning("HTTP endpoints (/gps, /band) will not be available")
-            else:
-                logger.error(f"Failed to start HTTP server: {e}")
-        except Exception as e:
-            logger.error(f"Failed to start HTTP server: {e}")
 
 
 if __name__ == '__main__':
     # Test network server
-    import time
     import sys
     
     logging.basicConfig(
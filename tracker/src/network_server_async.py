@@ -0,0 +1,638 @@
+"""
+Network Server - asyncio-based REST API with Server-Sent Events (SSE)
+Same routes as the Flask server, served from a single event loop thread:
+- FT8 decode stream via HTTP Server-Sent Events (/decodes)
+- REST endpoints for GPS updates (/gps, /gps/batch)
+- REST endpoints for band changes (/band)
+- Health check endpoint (/health)
+- Decode message search (/decodes/search)
+- History queries with ETag caching (/decodes/history, /gps/track, /stats)
+- WebSocket channel: decodes down, GPS and band updates up (/ws)
+- Prometheus metrics (/metrics)
+Each idle SSE subscriber costs a socket, a coroutine and its queue rather than
+an OS thread, so an SBC can hold thousands of dashboard connections. Keepalives
+come from one timer on the loop rather than a timeout per connection.
+"""
+
+import asyncio
+import logging
+import json
+import threading
+import time
+from http import HTTPStatus
+from typing import Dict, Any, Optional, Callable, Tuple
+from urllib.parse import urlsplit, parse_qsl
+from datetime import datetime
+
+from api_handlers import (
+    parse_json_body, handle_gps_update, handle_band_change, health_status, handle_search,
+    parse_gps_batch, handle_gps_batch,
+    QueryCache, QUERY_ROUTES, DEFAULT_QUERY_CACHE_SIZE, cached_query, register_metrics
+)
+from admission import AdmissionControl, rejection_response
+from metrics import METRICS_CONTENT_TYPE, render_metrics
+from decode_filter import decode_fields
+from sse import (
+    KEEPALIVE_TICK, SSEClient, SSEHub, decode_payload, parse_last_event_id, configure_stream_socket
+)
+from websocket_channel import (
+    websocket_framing, OP_TEXT, OP_BINARY, CLOSE_GOING_AWAY, ProtocolError, FrameParser,
+    upgrade_error, handshake_response, encode_close, respond
+)
+
+logger = logging.getLogger(__name__)
+
+# Request limits
+MAX_HEADER_COUNT = 100
+MAX_BODY_SIZE = 64 * 1024
+# Buffered GPS fixes uploaded after the phone was offline
+MAX_BATCH_BODY_SIZE = 4 * 1024 * 1024
+# Close idle keep-alive connections after this many seconds
+KEEPALIVE_TIMEOUT = 60.0
+
+
+class HTTPRequest:
+    """A parsed HTTP request"""
+    
+    def __init__(self, method: str, target: str, version: str, headers: Dict[str, str], body: bytes):
+        self.method = method
+        self.version = version
+        self.headers = headers
+        self.body = body
+        
+        url = urlsplit(target)
+        self.path = url.path
+        self.args = dict(parse_qsl(url.query))
+    
+    @property
+    def keep_alive(self) -> bool:
+        """Whether the client wants the connection kept open after the response"""
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.0':
+            return connection == 'keep-alive'
+        return connection != 'close'
+
+
+class AsyncSSEClient(SSEClient):
+    """SSE client whose writer is a coroutine on the server's event loop
+    
+    Frames are pushed from the loop thread, so an asyncio.Event is enough to
+    wake the writer.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ready = asyncio.Event()
+    
+    def _wake(self):
+        self.ready.set()
+
+
+class AsyncNetworkServer:
+    """asyncio-based network server for FT8 tracker with SSE support"""
+    
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.host = config.get('server_bind', '0.0.0.0')
+        self.port = int(config.get('server_port', 8080))
+        # Lets several worker processes bind the same port (see worker_pool)
+        self.reuse_port = config.get('server_reuse_port', 'false').lower() == 'true'
+        self.running = False
+        
+        # Decode streaming via SSE, one bounded frame queue per subscriber
+        self.sse_hub = SSEHub(config)
+        # Budget for concurrent and reconnecting streams
+        self.admission = AdmissionControl(config)
+        
+        # State
+        self.current_band: Optional[str] = None
+        self.last_gps_update: Optional[Dict[str, Any]] = None
+        
+        # Callbacks
+        self.gps_callback: Optional[Callable] = None
+        self.gps_batch_callback: Optional[Callable] = None
+        self.band_callback: Optional[Callable] = None
+        
+        # Database for search queries (set by tracker)
+        self.database = None
+        
+        # Body for GET /metrics (server workers add the tracker's metrics)
+        self.render_metrics: Callable[[], bytes] = render_metrics
+        self.query_cache = QueryCache(int(config.get('query_cache_size', DEFAULT_QUERY_CACHE_SIZE)))
+        register_metrics(self)
+        
+        # Event loop thread
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.server_thread = None
+    
+    def start(self):
+        """Start the asyncio server in its own thread"""
+        started = threading.Event()
+        errors = []
+        
+        def run():
+            self.loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(self.loop)
+            try:
+                self.server = self.loop.run_until_complete(
+                    asyncio.start_server(self._handle_connection, self.host, self.port,
+                                         reuse_port=self.reuse_port)
+                )
+            except Exception as e:
+                errors.append(e)
+                started.set()
+                self.loop.close()
+                return
+            
+            started.set()
+            self.loop.call_later(KEEPALIVE_TICK, self._keepalive_tick)
+            try:
+                self.loop.run_forever()
+            finally:
+                # Cancel connection handlers still running
+                tasks = asyncio.all_tasks(self.loop)
+                for task in tasks:
+                    task.cancel()
+                self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+                self.loop.run_until_complete(self.loop.shutdown_asyncgens())
+                self.loop.close()
+        
+        try:
+            self.running = True
+            
+            logger.info(f"Starting asyncio network server on {self.host}:{self.port}")
+            
+            self.server_thread = threading.Thread(target=run)
+            self.server_thread.daemon = True
+            self.server_thread.start()
+            started.wait()
+            
+            if errors:
+                raise errors[0]
+            
+            logger.info(f"Asyncio server started on {self.host}:{self.port}")
+            logger.info("  REST API endpoints:")
+            logger.info("    GET  /decodes  - Server-Sent Events stream for FT8 decodes")
+            logger.info("    GET  /decodes/search - Search stored decode messages")
+            logger.info("    GET  /decodes/history, /gps/track, /stats - History queries")
+            logger.info("    GET  /ws       - WebSocket: decodes down, GPS/band up")
+            logger.info("    POST /gps      - GPS position update")
+            logger.info("    POST /gps/batch - Buffered GPS positions (JSON array or NDJSON)")
+            logger.info("    POST /band     - Band change notification")
+            logger.info("    GET  /health   - Health check")
+            logger.info("    GET  /metrics  - Prometheus metrics")
+            
+            return True
+        
+        except Exception as e:
+            self.running = False
+            logger.error(f"Failed to start network server: {e}")
+            return False
+    
+    def stop(self):
+        """Stop the asyncio server"""
+        self.running = False
+        logger.info("Network server stopping...")
+        
+        if self.loop and self.loop.is_running():
+            async def shutdown():
+                self.server.close()
+                # Wake every SSE stream so its handler sees running == False
+                self.sse_hub.close_all("server stopping")
+            
+            asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(timeout=5)
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.server_thread.join(timeout=5)
+    
+    def _keepalive_tick(self):
+        """Drive the hub's keepalive wheel from the event loop"""
+        if not self.running:
+            return
+        try:
+            self.sse_hub.keepalive_tick()
+        except Exception as e:
+            logger.error(f"SSE keepalive tick failed: {e}")
+        self.loop.call_later(KEEPALIVE_TICK, self._keepalive_tick)
+    
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        """Serve HTTP requests on one connection until it closes"""
+        peer = writer.get_extra_info('peername')
+        try:
+            while self.running:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), KEEPALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                except ValueError as e:
+                    logger.debug(f"Bad request from {peer}: {e}")
+                    await self._send_json(writer, {'error': str(e)}, 400, keep_alive=False)
+                    break
+                
+                if request is None:
+                    break
+                
+                if request.path == '/ws' or (request.method == 'GET' and request.path == '/decodes'):
+                    await self._serve_stream(request, reader, writer, peer[0] if peer else None)
+                    break
+                
+                if request.method == 'GET' and request.path == '/metrics':
+                    # Some collectors query SQLite, so render off the event loop
+                    body = await asyncio.get_running_loop().run_in_executor(None, self.render_metrics)
+                    await self._send_body(writer, body, METRICS_CONTENT_TYPE, 200, request.keep_alive)
+                    if not request.keep_alive:
+                        break
+                    continue
+                
+                response, status, headers = await self._dispatch(request)
+                await self._send_json(writer, response, status, keep_alive=request.keep_alive,
+                                      headers=headers)
+                if not request.keep_alive:
+                    break
+        
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except asyncio.CancelledError:
+            # Server shutting down with the connection still open
+            pass
+        except Exception as e:
+            logger.error(f"Error handling connection from {peer}: {e}")
+        finally:
+            writer.close()
+    
+    async def _read_request(self, reader: asyncio.StreamReader) -> Optional[HTTPRequest]:
+        """Read one HTTP request, returning None if the client closed the connection"""
+        request_line = await reader.readline()
+        if not request_line:
+            return None
+        
+        try:
+            method, target, version = request_line.decode('latin-1').split()
+        except ValueError:
+            raise ValueError('Malformed request line')
+        
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            if len(headers) >= MAX_HEADER_COUNT:
+                raise ValueError('Too many headers')
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        
+        try:
+            content_length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise ValueError('Invalid Content-Length')
+        max_body = MAX_BATCH_BODY_SIZE if urlsplit(target).path == '/gps/batch' else MAX_BODY_SIZE
+        if content_length > max_body:
+            raise ValueError('Payload too large')
+        
+        body = await reader.readexactly(content_length) if content_length else b''
+        return HTTPRequest(method.upper(), target, version, headers, body)
+    
+    async def _dispatch(self, request: HTTPRequest) -> Tuple[Optional[Dict[str, Any]], int, Dict[str, str]]:
+        """Route a request to its handler, returning (response, status, extra headers)"""
+        loop = asyncio.get_running_loop()
+        routes = {
+            '/decodes/search': 'GET',
+            '/gps': 'POST',
+            '/gps/batch': 'POST',
+            '/band': 'POST',
+            '/health': 'GET',
+        }
+        routes.update((path, 'GET') for path in QUERY_ROUTES)
+        
+        if request.path not in routes:
+            return {'error': 'Not found'}, 404, {}
+        if request.method != routes[request.path]:
+            return {'error': 'Method not allowed'}, 405, {}
+        
+        try:
+            # Handlers may run callbacks and queries that block on SQLite,
+            # so keep them off the event loop
+            if request.path in QUERY_ROUTES:
+                return await loop.run_in_executor(
+                    None, cached_query, self.query_cache, self.database, request.path,
+                    QUERY_ROUTES[request.path], request.args, request.headers.get('if-none-match')
+                )
+            if request.path == '/decodes/search':
+                response, status = await loop.run_in_executor(None, handle_search, self.database, request.args)
+            elif request.path == '/health':
+                response, status = health_status(self)
+            elif request.path == '/gps/batch':
+                try:
+                    fixes = parse_gps_batch(request.body, request.headers.get('content-type'))
+                except ValueError:
+                    return {'error': 'Invalid JSON'}, 400, {}
+                response, status = await loop.run_in_executor(None, handle_gps_batch, self, fixes)
+            else:
+                try:
+                    data = parse_json_body(request.body)
+                except ValueError:
+                    return {'error': 'Invalid JSON'}, 400, {}
+                
+                if request.path == '/gps':
+                    response, status = await loop.run_in_executor(None, handle_gps_update, self, data)
+                else:
+                    response, status = await loop.run_in_executor(None, handle_band_change, self, data)
+            
+            return response, status, {}
+        
+        except Exception as e:
+            logger.error(f"Error processing {request.path}: {e}")
+            return {'error': 'Internal server error'}, 500, {}
+    
+    async def _send_json(self, writer: asyncio.StreamWriter, response: Optional[Dict[str, Any]], status: int,
+                         keep_alive: bool = True, headers: Optional[Dict[str, str]] = None):
+        """Write a JSON response (no body for 304 Not Modified)"""
+        body = json.dumps(response).encode('utf-8') if response is not None else b''
+        await self._send_body(writer, body, 'application/json', status, keep_alive, headers)
+    
+    async def _send_body(self, writer: asyncio.StreamWriter, body: bytes, content_type: str, status: int,
+                         keep_alive: bool = True, headers: Optional[Dict[str, str]] = None):
+        """Write a response with a complete body"""
+        extra = ''.join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+        head = (
+            f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Access-Control-Allow-Origin: *\r\n"
+            f"{extra}"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            f"\r\n"
+        )
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+    
+    async def _subscribe(self, client: SSEClient, request: HTTPRequest):
+        """Register a subscriber, replaying events missed since its Last-Event-ID"""
+        last_event_id = parse_last_event_id(
+            request.headers.get('last-event-id', request.args.get('last_event_id'))
+        )
+        gap = self.sse_hub.add(client, last_event_id)
+        if gap and self.database:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.sse_hub.replay_from_database, client, self.database, gap
+            )
+    
+    async def _write_events(self, client: SSEClient, writer: asyncio.StreamWriter):
+        """Write a subscriber's queued events and keepalives until it closes
+        
+        The hub's keepalive wheel wakes idle subscribers, so there is no
+        per-connection timer here.
+        """
+        configure_stream_socket(writer.get_extra_info('socket'))
+        while self.running and not client.closed:
+            await client.ready.wait()
+            client.ready.clear()
+            
+            # Batching clients hold their events until the batch is due
+            delay = client.batch_remaining(time.monotonic())
+            while delay > 0 and self.running and not client.closed:
+                await asyncio.sleep(delay)
+                delay = client.batch_remaining(time.monotonic())
+            
+            # Frames were encoded once by the hub and are shared by all clients
+            frames = client.take()
+            if frames:
+                writer.write(client.encode(frames))
+                await writer.drain()
+    
+    async def _serve_stream(self, request: HTTPRequest, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter, remote: Optional[str]):
+        """Run a /decodes or /ws stream if admission control lets it in"""
+        rejection = self.admission.admit(remote)
+        if rejection:
+            response, status, headers = rejection_response(rejection)
+            await self._send_json(writer, response, status, keep_alive=False, headers=headers)
+            return
+        
+        try:
+            if request.path == '/ws':
+                await self._websocket(request, reader, writer)
+            else:
+                await self._stream_decodes(request, reader, writer)
+        finally:
+            self.admission.release(remote)
+    
+    async def _stream_decodes(self, request: HTTPRequest, reader: asyncio.StreamReader,
+                              writer: asyncio.StreamWriter):
+        """Server-Sent Events stream for FT8 decodes"""
+        logger.debug("New SSE client connected")
+        
+        peer = writer.get_extra_info('peername')
+        try:
+            client = self.sse_hub.new_client(AsyncSSEClient, request.args, peer[0] if peer else None,
+                                             request.headers.get('accept-encoding'))
+        except ValueError as e:
+            await self._send_json(writer, {'error': str(e)}, 400, keep_alive=False)
+            return
+        
+        async def watch_disconnect():
+            # SSE clients never send after the request, so EOF or a reset means they hung up
+            try:
+                await reader.read()
+            except ConnectionError:
+                pass
+            finally:
+                client.close("disconnected")
+        
+        content_encoding = b""
+        if client.compressor:
+            content_encoding = b"Content-Encoding: " + client.compressor.encoding.encode('ascii') + b"\r\n"
+        
+        watcher = None
+        try:
+            # Replay events missed since the client's last connection
+            await self._subscribe(client, request)
+            watcher = asyncio.ensure_future(watch_disconnect())
+            
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: " + client.content_type.encode('ascii') + b"\r\n"
+                b"Cache-Control: no-cache\r\n"
+                b"X-Accel-Buffering: no\r\n"
+                b"Access-Control-Allow-Origin: *\r\n"
+                b"Vary: Accept-Encoding\r\n" +
+                content_encoding +
+                b"Connection: close\r\n"
+                b"\r\n"
+            )
+            await writer.drain()
+            
+            await self._write_events(client, writer)
+            
+            # Server-side close (eviction or shutdown): end the compressed stream cleanly
+            if client.compressor and client.close_reason != "disconnected":
+                writer.write(client.compressor.finish())
+                await writer.drain()
+        
+        except (ConnectionError, asyncio.CancelledError) as e:
+            logger.debug(f"SSE client error: {e}")
+        finally:
+            if watcher:
+                watcher.cancel()
+            
+            # Remove client when the stream ends
+            logger.debug(f"SSE client disconnecting: {client.close_reason or 'stream ended'}")
+            self.sse_hub.remove(client)
+    
+    async def _websocket(self, request: HTTPRequest, reader: asyncio.StreamReader,
+                         writer: asyncio.StreamWriter):
+        """WebSocket channel: decodes downstream, GPS and band updates upstream"""
+        error = upgrade_error(request.method, request.headers)
+        if error:
+            await self._send_json(writer, {'error': error}, 400, keep_alive=False)
+            return
+        
+        peer = writer.get_extra_info('peername')
+        try:
+            client = self.sse_hub.new_client(AsyncSSEClient, request.args, peer[0] if peer else None)
+        except ValueError as e:
+            await self._send_json(writer, {'error': str(e)}, 400, keep_alive=False)
+            return
+        client.framing = websocket_framing(client.stream_format)
+        
+        logger.debug(f"WebSocket client {client.id} connected")
+        
+        async def receive():
+            # Upstream messages run through the REST handlers off the event loop;
+            # replies are small, so write them without waiting on drain
+            loop = asyncio.get_running_loop()
+            parser = FrameParser()
+            try:
+                while not client.closed:
+                    data = await reader.read(65536)
+                    if not data:
+                        break
+                    for opcode, payload in parser.feed(data):
+                        if opcode in (OP_TEXT, OP_BINARY):
+                            reply, closed = await loop.run_in_executor(None, respond, self, opcode, payload)
+                        else:
+                            reply, closed = respond(self, opcode, payload)
+                        writer.write(reply)
+                        if closed:
+                            return
+            except ProtocolError as e:
+                logger.debug(f"WebSocket client {client.id} protocol error: {e}")
+                writer.write(encode_close(e.code, str(e)))
+            except ConnectionError:
+                pass
+            finally:
+                client.close("disconnected")
+        
+        receiver = None
+        try:
+            writer.write(handshake_response(request.headers['sec-websocket-key']))
+            await self._subscribe(client, request)
+            receiver = asyncio.ensure_future(receive())
+            
+            await self._write_events(client, writer)
+            
+            # Server-side close (eviction or shutdown)
+            if client.close_reason != "disconnected":
+                writer.write(encode_close(CLOSE_GOING_AWAY, client.close_reason or ""))
+                await writer.drain()
+        
+        except (ConnectionError, asyncio.CancelledError) as e:
+            logger.debug(f"WebSocket client error: {e}")
+        finally:
+            if receiver:
+                receiver.cancel()
+            logger.debug(f"WebSocket client disconnecting: {client.close_reason or 'stream ended'}")
+            self.sse_hub.remove(client)
+    
+    def send_decode(self, decode_line: str, event_id: Optional[int] = None,
+                    decode: Optional[Dict[str, Any]] = None):
+        """Queue a decode to be sent to all SSE clients (safe from any thread)
+        
+        event_id should be the decode's database id so reconnecting clients can
+        be replayed from the database once the in-memory ring has moved on.
+        decode is the structured decode that subscriber filters match against;
+        without it the fields are parsed from the line.
+        """
+        if self.loop and self.running:
+            fields = decode_fields(decode_line, decode, self.current_band)
+            # Encode once; every client queue shares the same immutable frame
+            self.loop.call_soon_threadsafe(self.sse_hub.publish, decode_payload(decode_line), event_id, fields,
+                                           decode)
+    
+    def has_clients(self) -> bool:
+        """Check if there are any connected SSE clients"""
+        return self.sse_hub.count() > 0
+    
+    def get_client_count(self) -> int:
+        """Get number of connected SSE clients"""
+        return self.sse_hub.count()
+    
+    def get_sse_stats(self) -> Dict[str, Any]:
+        """Get SSE drop, eviction and per-client lag metrics"""
+        return self.sse_hub.stats()
+    
+    def set_gps_callback(self, callback: Callable):
+        """Set callback for GPS updates"""
+        self.gps_callback = callback
+    
+    def set_gps_batch_callback(self, callback: Callable):
+        """Set callback for batches of buffered GPS fixes (called once per batch)"""
+        self.gps_batch_callback = callback
+    
+    def set_band_callback(self, callback: Callable):
+        """Set callback for band changes"""
+        self.band_callback = callback
+    
+    def set_database(self, database):
+        """Set database used to answer search queries and replay missed decodes"""
+        self.database = database
+        # Event ids are decode ids, so continue after the newest stored decode
+        self.sse_hub.resume_event_ids(database.get_last_decode_id())
+    
+    def get_current_band(self) -> Optional[str]:
+        """Get the current operating band"""
+        return self.current_band
+    
+    def get_last_gps_update(self) -> Optional[Dict[str, Any]]:
+        """Get the last GPS position received"""
+        return self.last_gps_update
+
+
+if __name__ == '__main__':
+    # Test asyncio server
+    
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    
+    config = {
+        'server_bind': '0.0.0.0',
+        'server_port': 8080
+    }
+    
+    server = AsyncNetworkServer(config)
+    
+    if server.start():
+        try:
+            print(f"Server running on port {config['server_port']}")
+            print("Connect to /decodes endpoint with SSE client")
+            print("Press Ctrl+C to stop")
+            
+            # Send test decodes
+            counter = 0
+            while True:
+                time.sleep(5)
+                counter += 1
+                
+                # Generate test decode
+                now = datetime.now()
+                time_str = now.strftime("%H%M%S")
+                test_decode = f"{time_str} -12  0.3 1234 ~ CQ TEST{counter} FN42"
+                
+                server.send_decode(test_decode)
+                print(f"Sent: {test_decode} (clients: {server.get_client_count()})")
+        
+        except KeyboardInterrupt:
+            print("\nStopping server...")
+            server.stop()
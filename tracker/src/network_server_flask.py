@@ -2,23 +2,53 @@
 Network Server - Flask-based REST API with Server-Sent Events (SSE)
 Provides:
 - FT8 decode stream via HTTP Server-Sent Events (SSE)
-- REST endpoints for GPS updates (/gps)
+- REST endpoints for GPS updates (/gps, /gps/batch)
 - REST endpoints for band changes (/band)
 - Health check endpoint (/health)
+- Decode message search (/decodes/search)
+- History queries with ETag caching (/decodes/history, /gps/track, /stats)
+- WebSocket channel: decodes down, GPS and band updates up (/ws)
+- Prometheus metrics (/metrics)
 All on a single port and elegant REST architecture
 """
 
 import logging
-import json
 import threading
+import time
 from typing import Dict, Any, Optional, Callable, List
 from datetime import datetime
 from flask import Flask, request, Response, jsonify
-import queue
+
+from api_handlers import (
+    parse_json_body, handle_gps_update, handle_band_change, health_status, handle_search,
+    parse_gps_batch, handle_gps_batch,
+    QueryCache, QUERY_ROUTES, DEFAULT_QUERY_CACHE_SIZE, cached_query, register_metrics
+)
+from admission import AdmissionControl, Rejection, rejection_response
+from metrics import METRICS_CONTENT_TYPE, render_metrics
+from decode_filter import decode_fields
+from sse import (
+    KEEPALIVE_TICK, SSEHub, ThreadedSSEClient, decode_payload, parse_last_event_id, configure_stream_socket
+)
+from websocket_channel import (
+    websocket_framing, CLOSE_GOING_AWAY, ProtocolError, FrameParser,
+    upgrade_error, handshake_response, encode_close, respond
+)
 
 logger = logging.getLogger(__name__)
 
 
+class UpgradedResponse(Response):
+    """Response for a connection taken over by the WebSocket channel
+    
+    Werkzeug treats a ConnectionError from the response as the client having
+    gone away, so nothing more is written to the socket.
+    """
+    
+    def __call__(self, environ, start_response):
+        raise ConnectionError("WebSocket connection closed")
+
+
 class FlaskNetworkServer:
     """Flask-based network server for FT8 tracker with SSE support"""
     
@@ -32,10 +62,9 @@ class FlaskNetworkServer:
         self.app = Flask('FT8Tracker')
         self._setup_routes()
         
-        # Decode streaming via SSE
-        self.decode_queue = queue.Queue()
-        self.sse_clients: List[queue.Queue] = []
-        self.sse_lock = threading.Lock()
+        # Decode streaming via SSE, with a budget for concurrent and reconnecting streams
+        self.sse_hub = SSEHub(config)
+        self.admission = AdmissionControl(config)
         
         # State
         self.current_band: Optional[str] = None
@@ -43,11 +72,18 @@ class FlaskNetworkServer:
         
         # Callbacks
         self.gps_callback: Optional[Callable] = None
+        self.gps_batch_callback: Optional[Callable] = None
         self.band_callback: Optional[Callable] = None
         
-        # Flask thread
-        self.flask_thread = None
+        # Database for search queries (set by tracker)
+        self.database = None
+        self.query_cache = QueryCache(int(config.get('query_cache_size', DEFAULT_QUERY_CACHE_SIZE)))
+        register_metrics(self)
         
+        # Flask thread, and the one thread that sends keepalives for every stream
+        self.flask_thread = None
+        self.keepalive_thread = None
+    
     def _setup_routes(self):
         """Setup Flask routes"""
         
@@ -56,132 +92,190 @@ class FlaskNetworkServer:
             """Server-Sent Events stream for FT8 decodes"""
             logger.debug("New SSE client connected")
             
-            # Create a queue for this client
-            client_queue = queue.Queue()
+            remote = request.remote_addr
+            rejection = self.admission.admit(remote)
+            if rejection:
+                return self._reject(rejection)
+            
+            try:
+                client = self.sse_hub.new_client(ThreadedSSEClient, request.args, remote,
+                                                 request.headers.get('Accept-Encoding'))
+            except ValueError as e:
+                self.admission.release(remote)
+                return jsonify({'error': str(e)}), 400
             
-            with self.sse_lock:
-                self.sse_clients.append(client_queue)
-                logger.debug(f"Added SSE client, total clients: {len(self.sse_clients)}")
+            # Replay events missed since the client's last connection
+            try:
+                self._subscribe(client)
+            except BaseException:
+                self.sse_hub.remove(client)
+                self.admission.release(remote)
+                raise
+            configure_stream_socket(request.environ.get('werkzeug.socket'))
             
             def generate():
                 """Generate SSE messages for this client"""
                 try:
-                    while self.running:
-                        try:
-                            # Get decode from client's queue (timeout to check if connection alive)
-                            decode_line = client_queue.get(timeout=5.0)
-                            # Format as SSE
-                            yield f"data: {json.dumps({'decode': decode_line})}\n\n"
-                        except queue.Empty:
-                            # Send keepalive
-                            yield f": keepalive\n\n"
-                        except Exception as e:
-                            logger.debug(f"SSE client error: {e}")
+                    while self.running and not client.closed:
+                        # Pre-encoded frames, or a keepalive requested by the hub's wheel
+                        frames = client.wait()
+                        if frames:
+                            yield client.encode(frames)
+                    
+                    # Server-side close (eviction or shutdown): end the compressed stream cleanly
+                    if client.compressor:
+                        yield client.compressor.finish()
+                finally:
+                    # Remove client when generator is done
+                    logger.debug(f"SSE client disconnecting: {client.close_reason or 'stream ended'}")
+                    self.sse_hub.remove(client)
+            
+            headers = {
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no',
+                'Access-Control-Allow-Origin': '*',
+                'Vary': 'Accept-Encoding'
+            }
+            if client.compressor:
+                headers['Content-Encoding'] = client.compressor.encoding
+            
+            response = Response(generate(), mimetype=client.content_type, headers=headers)
+            # Runs even if the client goes away before the generator starts
+            response.call_on_close(lambda: self.sse_hub.remove(client))
+            response.call_on_close(lambda: self.admission.release(remote))
+            return response
+        
+        @self.app.route('/ws', methods=['GET'], websocket=True)
+        def websocket():
+            """WebSocket channel: decodes downstream, GPS and band updates upstream"""
+            error = upgrade_error(request.method, request.headers)
+            if error:
+                return jsonify({'error': error}), 400
+            
+            sock = request.environ.get('werkzeug.socket')
+            if sock is None:
+                return jsonify({'error': 'WebSocket not supported by this WSGI server'}), 501
+            
+            remote = request.remote_addr
+            rejection = self.admission.admit(remote)
+            if rejection:
+                return self._reject(rejection)
+            
+            try:
+                client = self.sse_hub.new_client(ThreadedSSEClient, request.args, remote)
+            except ValueError as e:
+                self.admission.release(remote)
+                return jsonify({'error': str(e)}), 400
+            client.framing = websocket_framing(client.stream_format)
+            
+            logger.debug(f"WebSocket client {client.id} connected")
+            configure_stream_socket(sock)
+            send_lock = threading.Lock()
+            
+            def send(data: bytes):
+                with send_lock:
+                    sock.sendall(data)
+            
+            def receive():
+                parser = FrameParser()
+                try:
+                    while not client.closed:
+                        data = sock.recv(65536)
+                        if not data:
                             break
+                        for opcode, payload in parser.feed(data):
+                            reply, closed = respond(self, opcode, payload)
+                            send(reply)
+                            if closed:
+                                return
+                except ProtocolError as e:
+                    logger.debug(f"WebSocket client {client.id} protocol error: {e}")
+                    send(encode_close(e.code, str(e)))
+                except OSError:
+                    pass
                 finally:
-                    # Remove client queue when generator is done
-                    logger.debug("SSE client disconnecting")
-                    with self.sse_lock:
-                        if client_queue in self.sse_clients:
-                            self.sse_clients.remove(client_queue)
-                            logger.debug(f"Removed SSE client, total clients: {len(self.sse_clients)}")
+                    client.close("disconnected")
+            
+            # From the handshake on, the hub subscriber and admission slot are released on every path
+            try:
+                sock.sendall(handshake_response(request.headers['Sec-WebSocket-Key']))
+                self._subscribe(client)
+                
+                receiver = threading.Thread(target=receive, daemon=True)
+                receiver.start()
+                
+                while self.running and not client.closed:
+                    # Pings come from the hub's keepalive wheel as frames
+                    frames = client.wait()
+                    if frames:
+                        send(client.encode(frames))
+                
+                # Server-side close (eviction or shutdown)
+                if client.close_reason != "disconnected":
+                    send(encode_close(CLOSE_GOING_AWAY, client.close_reason or ""))
+            except OSError as e:
+                logger.debug(f"WebSocket client error: {e}")
+            finally:
+                logger.debug(f"WebSocket client disconnecting: {client.close_reason or 'stream ended'}")
+                self.sse_hub.remove(client)
+                self.admission.release(remote)
             
-            return Response(generate(), mimetype='text/event-stream', 
-                           headers={
-                               'Cache-Control': 'no-cache',
-                               'X-Accel-Buffering': 'no',
-                               'Access-Control-Allow-Origin': '*'
-                           })
+            return UpgradedResponse()
+        
+        @self.app.route('/decodes/search', methods=['GET'])
+        def search_decodes():
+            """Full-text search over stored decode messages"""
+            response, status = handle_search(self.database, request.args)
+            return jsonify(response), status
+        
+        def history_query(path: str):
+            """ETag-validated, cached history query"""
+            response, status, headers = cached_query(
+                self.query_cache, self.database, path, QUERY_ROUTES[path],
+                request.args, request.headers.get('If-None-Match')
+            )
+            if status == 304:
+                return Response(status=304, headers=headers)
+            return jsonify(response), status, headers
+        
+        for path in QUERY_ROUTES:
+            self.app.add_url_rule(path, f"query_{path}", lambda path=path: history_query(path),
+                                  methods=['GET'])
         
         @self.app.route('/gps', methods=['POST'])
         def handle_gps():
             """Handle GPS position update"""
             try:
-                gps_data = request.get_json()
-                
-                if not gps_data:
-                    return jsonify({'error': 'Empty JSON'}), 400
-                
-                logger.debug(f"Received GPS update: {gps_data}")
-                
-                # Validate required fields
-                if 'latitude' not in gps_data or 'longitude' not in gps_data:
-                    return jsonify({'error': 'Missing latitude or longitude'}), 400
-                
-                # Add timestamp if not present
-                if 'timestamp' not in gps_data:
-                    gps_data['timestamp'] = int(datetime.now().timestamp())
-                
-                # Store GPS update
-                self.last_gps_update = gps_data
-                
-                # Call callback if registered
-                if self.gps_callback:
-                    logger.debug("Calling GPS callback")
-                    try:
-                        self.gps_callback(gps_data)
-                    except Exception as e:
-                        logger.error(f"GPS callback error: {e}")
-                
-                logger.info(f"GPS position received: {gps_data.get('latitude')}, {gps_data.get('longitude')}")
-                
-                return jsonify({
-                    'status': 'ok',
-                    'message': 'GPS position received'
-                }), 200
-                
-            except json.JSONDecodeError:
+                response, status = handle_gps_update(self, parse_json_body(request.get_data()))
+                return jsonify(response), status
+            except ValueError:
                 return jsonify({'error': 'Invalid JSON'}), 400
             except Exception as e:
                 logger.error(f"Error processing GPS update: {e}")
                 return jsonify({'error': 'Internal server error'}), 500
         
+        @self.app.route('/gps/batch', methods=['POST'])
+        def handle_gps_batch_upload():
+            """Handle a batch of buffered GPS positions"""
+            try:
+                fixes = parse_gps_batch(request.get_data(), request.content_type)
+            except ValueError:
+                return jsonify({'error': 'Invalid JSON'}), 400
+            
+            try:
+                response, status = handle_gps_batch(self, fixes)
+                return jsonify(response), status
+            except Exception as e:
+                logger.error(f"Error processing GPS batch: {e}")
+                return jsonify({'error': 'Internal server error'}), 500
+        
         @self.app.route('/band', methods=['POST'])
         def handle_band():
             """Handle band change notification"""
             try:
-                band_data = request.get_json()
-                
-                if not band_data:
-                    return jsonify({'error': 'Empty JSON'}), 400
-                
-                logger.debug(f"Received band change request: {band_data}")
-                
-                # Validate required fields
-                if 'band' not in band_data:
-                    return jsonify({'error': 'Missing band field'}), 400
-                
-                band = band_data['band']
-                
-                # Validate band format
-                valid_bands = ['80m', '60m', '40m', '30m', '20m', '17m', '15m', '12m', '10m', '6m']
-                if band not in valid_bands:
-                    return jsonify({
-                        'error': f'Invalid band. Must be one of: {", ".join(valid_bands)}'
-                    }), 400
-                
-                logger.debug(f"Band validated: {band}")
-                
-                # Store current band
-                self.current_band = band
-                logger.debug(f"Band stored in server: {band}")
-                
-                # Call callback if registered
-                if self.band_callback:
-                    logger.debug(f"Calling band callback for: {band}")
-                    try:
-                        self.band_callback(band)
-                    except Exception as e:
-                        logger.error(f"Band callback error: {e}")
-                
-                logger.info(f"Band changed to: {band}")
-                
-                return jsonify({
-                    'status': 'ok',
-                    'message': f'Band set to {band}'
-                }), 200
-                
-            except json.JSONDecodeError:
+                response, status = handle_band_change(self, parse_json_body(request.get_data()))
+                return jsonify(response), status
+            except ValueError:
                 return jsonify({'error': 'Invalid JSON'}), 400
             except Exception as e:
                 logger.error(f"Error processing band update: {e}")
@@ -190,12 +284,13 @@ class FlaskNetworkServer:
         @self.app.route('/health', methods=['GET'])
         def health_check():
             """Health check endpoint"""
-            return jsonify({
-                'status': 'ok',
-                'current_band': self.current_band,
-                'last_gps': self.last_gps_update,
-                'sse_clients': len(self.sse_clients)
-            }), 200
+            response, status = health_status(self)
+            return jsonify(response), status
+        
+        @self.app.route('/metrics', methods=['GET'])
+        def get_metrics():
+            """Prometheus metrics for every tracker component"""
+            return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
         
         @self.app.errorhandler(404)
         def not_found(error):
@@ -229,12 +324,20 @@ class FlaskNetworkServer:
             self.flask_thread.daemon = True
             self.flask_thread.start()
             
+            self.keepalive_thread = threading.Thread(target=self._keepalive_loop, daemon=True)
+            self.keepalive_thread.start()
+            
             logger.info(f"Flask server started on {self.host}:{self.port}")
             logger.info(f"  REST API endpoints:")
             logger.info(f"    GET  /decodes  - Server-Sent Events stream for FT8 decodes")
+            logger.info(f"    GET  /decodes/search - Search stored decode messages")
+            logger.info(f"    GET  /decodes/history, /gps/track, /stats - History queries")
+            logger.info(f"    GET  /ws       - WebSocket: decodes down, GPS/band up")
             logger.info(f"    POST /gps      - GPS position update")
+            logger.info(f"    POST /gps/batch - Buffered GPS positions (JSON array or NDJSON)")
             logger.info(f"    POST /band     - Band change notification")
             logger.info(f"    GET  /health   - Health check")
+            logger.info(f"    GET  /metrics  - Prometheus metrics")
             
             return True
             
@@ -246,35 +349,77 @@ class FlaskNetworkServer:
         """Stop the Flask server"""
         self.running = False
         logger.info("Network server stopping...")
+        # Wake every SSE generator so it sees running == False
+        self.sse_hub.close_all("server stopping")
         # Flask shutdown is tricky, but daemon thread will die with main process
     
-    def send_decode(self, decode_line: str):
-        """Queue a decode to be sent to all SSE clients"""
-        with self.sse_lock:
-            for client_queue in self.sse_clients[:]:
-                try:
-                    client_queue.put_nowait(decode_line)
-                except queue.Full:
-                    logger.warning("Client queue full, dropping decode")
+    def _keepalive_loop(self):
+        """Drive the hub's keepalive wheel for every SSE and WebSocket stream"""
+        while self.running:
+            time.sleep(KEEPALIVE_TICK)
+            try:
+                self.sse_hub.keepalive_tick()
+            except Exception as e:
+                logger.error(f"SSE keepalive tick failed: {e}")
+    
+    def _reject(self, rejection: Rejection):
+        """Cheap 503 for a stream refused by admission control"""
+        response, status, headers = rejection_response(rejection)
+        return jsonify(response), status, headers
+    
+    def _subscribe(self, client: ThreadedSSEClient):
+        """Register a subscriber, replaying events missed since its Last-Event-ID"""
+        last_event_id = parse_last_event_id(
+            request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+        )
+        gap = self.sse_hub.add(client, last_event_id)
+        if gap and self.database:
+            self.sse_hub.replay_from_database(client, self.database, gap)
+    
+    def send_decode(self, decode_line: str, event_id: Optional[int] = None,
+                    decode: Optional[Dict[str, Any]] = None):
+        """Queue a decode to be sent to all SSE clients
+        
+        event_id should be the decode's database id so reconnecting clients can
+        be replayed from the database once the in-memory ring has moved on.
+        decode is the structured decode that subscriber filters match against;
+        without it the fields are parsed from the line.
+        """
+        fields = decode_fields(decode_line, decode, self.current_band)
+        
+        # Encode once; every client queue shares the same immutable frame
+        self.sse_hub.publish(decode_payload(decode_line), event_id, fields, decode)
     
     def has_clients(self) -> bool:
         """Check if there are any connected SSE clients"""
-        with self.sse_lock:
-            return len(self.sse_clients) > 0
+        return self.sse_hub.count() > 0
     
     def get_client_count(self) -> int:
         """Get number of connected SSE clients"""
-        with self.sse_lock:
-            return len(self.sse_clients)
+        return self.sse_hub.count()
+    
+    def get_sse_stats(self) -> Dict[str, Any]:
+        """Get SSE drop, eviction and per-client lag metrics"""
+        return self.sse_hub.stats()
     
     def set_gps_callback(self, callback: Callable):
         """Set callback for GPS updates"""
         self.gps_callback = callback
     
+    def set_gps_batch_callback(self, callback: Callable):
+        """Set callback for batches of buffered GPS fixes (called once per batch)"""
+        self.gps_batch_callback = callback
+    
     def set_band_callback(self, callback: Callable):
         """Set callback for band changes"""
         self.band_callback = callback
     
+    def set_database(self, database):
+        """Set database used to answer search queries and replay missed decodes"""
+        self.database = database
+        # Event ids are decode ids, so continue after the newest stored decode
+        self.sse_hub.resume_event_ids(database.get_last_decode_id())
+    
     def get_current_band(self) -> Optional[str]:
         """Get the current operating band"""
         return self.current_band
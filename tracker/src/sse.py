@@ -0,0 +1,797 @@
+"""
+Server-Sent Events framing and subscriber management
+Builds the wire bytes for SSE frames once so a decode can be fanned out to
+every subscriber without re-encoding it per client, and keeps each
+subscriber's backlog bounded so a stalled phone cannot grow it without limit.
+Every decode event carries an id, and a ring of recent frames lets a client
+that reconnects with Last-Event-ID replay exactly what it missed. Filtered
+subscribers are indexed so a broadcast only visits clients that can match,
+and batching clients get each FT8 slot's burst of decodes as one event.
+Streams can be gzip/deflate compressed, flushed at every event boundary.
+A single timer wheel sends keepalives to idle subscribers and reaps dead ones,
+instead of every connection waking on its own timer.
+Subscribers can ask for ?format=binary to get fixed-struct decode records
+(see binary_stream) instead of JSON text.
+"""
+
+import json
+import math
+import time
+import zlib
+import socket
+import logging
+import itertools
+import threading
+from collections import deque
+from typing import Dict, Any, Optional, List, Tuple, NamedTuple, Callable
+
+from ft8_decoder import format_android_line
+from binary_stream import (FORMAT_TEXT, FORMAT_BINARY, STREAM_FORMATS, BINARY_CONTENT_TYPE,
+                           KEEPALIVE_RECORD, encode_decode_record, encode_gap_record, encode_event_record)
+from decode_filter import DecodeFilter, FilterIndex, decode_fields
+
+logger = logging.getLogger(__name__)
+
+# Comment frame sent to idle subscribers so proxies keep the connection open
+KEEPALIVE_FRAME = b": keepalive\n\n"
+
+SSE_CONTENT_TYPE = 'text/event-stream'
+
+# Seconds between keepalive frames on an idle stream
+SSE_KEEPALIVE_INTERVAL = 5.0
+
+# Resolution of the keepalive timer wheel (servers call keepalive_tick this often)
+KEEPALIVE_TICK = 0.5
+
+# TCP keepalive on stream sockets: probe after 30 s idle, every 10 s, give up after 3
+TCP_KEEPALIVE_IDLE = 30
+TCP_KEEPALIVE_INTERVAL = 10
+TCP_KEEPALIVE_COUNT = 3
+# Drop a peer that leaves written data unacknowledged this long (ms, Linux only)
+TCP_USER_TIMEOUT_MS = 60000
+
+# What to do with a new frame when a client's queue is full
+DROP_OLDEST = 'drop-oldest'    # discard the oldest queued frame
+COALESCE = 'coalesce'          # replace the backlog with a single gap event
+DISCONNECT = 'disconnect'      # close the stream; the client reconnects
+DROP_POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+
+# Default frames buffered per client
+DEFAULT_QUEUE_SIZE = 256
+# Default seconds a client may stay with a full queue before it is evicted
+DEFAULT_MAX_LAG = 30.0
+
+# Default recent frames kept in memory for Last-Event-ID replay
+DEFAULT_REPLAY_BUFFER = 1024
+# Default maximum decodes replayed from the database when the ring is not enough
+DEFAULT_REPLAY_LIMIT = 1000
+
+# Batching modes (/decodes?batch=slot or ?max_delay_ms=N)
+BATCH_SLOT = 'slot'        # one event per FT8 slot burst
+BATCH_WINDOW = 'window'    # one event per max_delay_ms window
+# A slot burst is over once no decode has arrived for this many seconds
+SLOT_QUIET_SECONDS = 1.0
+# Never hold a slot batch longer than one FT8 slot
+SLOT_SECONDS = 15.0
+# Longest accepted max_delay_ms
+MAX_BATCH_DELAY_MS = 60000
+
+# Content-Encodings offered for /decodes, in order of preference, with zlib wbits
+SSE_ENCODINGS = {'gzip': 16 + zlib.MAX_WBITS, 'deflate': zlib.MAX_WBITS}
+DEFAULT_COMPRESSION_LEVEL = 6
+
+
+class SSEEvent(NamedTuple):
+    """An encoded SSE event: its id, name, JSON data, complete wire frame and binary record"""
+    event_id: Optional[int]
+    name: Optional[str]
+    data: bytes
+    frame: bytes
+    record: Optional[bytes] = None
+
+
+def encode_event(payload: dict, event_id: Optional[int] = None, name: Optional[str] = None,
+                 record: Optional[bytes] = None) -> SSEEvent:
+    """Encode a JSON payload once as an SSE event"""
+    data = json.dumps(payload).encode('utf-8')
+    frame = b"data: " + data + b"\n\n"
+    if name:
+        frame = b"event: " + name.encode('utf-8') + b"\n" + frame
+    if event_id is not None:
+        frame = b"id: " + str(event_id).encode('ascii') + b"\n" + frame
+    return SSEEvent(event_id, name, data, frame, record)
+
+
+def encode_sse_frame(payload: dict, event: Optional[str] = None, event_id: Optional[int] = None) -> bytes:
+    """Encode a JSON payload as a complete SSE data frame"""
+    return encode_event(payload, event_id, event).frame
+
+
+class Framing(NamedTuple):
+    """How a transport turns hub events into wire bytes: one event, a batch of decodes, a keepalive"""
+    event: Callable[[SSEEvent], bytes]
+    batch: Callable[[List[SSEEvent]], bytes]
+    keepalive: bytes
+
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick a Content-Encoding for /decodes from an Accept-Encoding header, or None"""
+    if not accept_encoding:
+        return None
+    
+    accepted = {}
+    for entry in accept_encoding.split(','):
+        coding, _, params = entry.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    
+    for encoding in SSE_ENCODINGS:
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+class SSECompressor:
+    """Streaming compressor for one SSE connection
+    
+    Every write is sync-flushed so the client can decompress each event as
+    soon as it arrives, while the shared dictionary keeps compressing
+    repeated callsigns and grids across events.
+    """
+    
+    def __init__(self, encoding: str, level: int = DEFAULT_COMPRESSION_LEVEL):
+        self.encoding = encoding
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, SSE_ENCODINGS[encoding])
+    
+    def compress(self, data: bytes) -> bytes:
+        """Compress data and flush it to a byte boundary"""
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+    
+    def finish(self) -> bytes:
+        """End the compressed stream"""
+        return self.compressor.flush(zlib.Z_FINISH)
+
+
+def encode_batch_frame(events: List[SSEEvent]) -> bytes:
+    """Join decode events into one {"decodes": [...]} frame from their encoded data"""
+    frame = b'data: {"decodes": [' + b", ".join(event.data for event in events) + b"]}\n\n"
+    if events[-1].event_id is not None:
+        frame = b"id: " + str(events[-1].event_id).encode('ascii') + b"\n" + frame
+    return frame
+
+
+def decode_payload(decode_line: str) -> Dict[str, Any]:
+    """Build the /decodes event payload for an FT8 decode line"""
+    return {'decode': decode_line}
+
+
+def encode_decode_event(decode_line: str, event_id: Optional[int] = None,
+                        decode: Optional[Dict[str, Any]] = None, band: Optional[str] = None) -> SSEEvent:
+    """Encode a decode once as both its JSON event and its binary record"""
+    return encode_event(decode_payload(decode_line), event_id,
+                        record=encode_decode_record(event_id, decode_line, decode, band))
+
+
+def row_decode_line(row: Dict[str, Any]) -> str:
+    """Rebuild the Android decode line from a stored decodes row"""
+    return format_android_line(row['time_str'] or '', row['snr'] or 0, row['dt'] or 0.0,
+                               row['frequency'] or 0, row['message'] or '')
+
+
+def parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    """Parse a Last-Event-ID value, returning None if it is missing or not an id"""
+    if value is None:
+        return None
+    try:
+        return int(value.strip())
+    except ValueError:
+        return None
+
+
+def encode_gap_event(skipped: int) -> SSEEvent:
+    """Encode the event sent in place of decodes that were skipped for a client"""
+    return encode_event({'skipped': skipped}, name='gap', record=encode_gap_record(skipped))
+
+
+def event_record(event: SSEEvent) -> bytes:
+    """Binary record for a hub event, reusing the one encoded at publish"""
+    if event.record is not None:
+        return event.record
+    return encode_event_record(event.name, event.data)
+
+
+def encode_record_batch(events: List[SSEEvent]) -> bytes:
+    """Concatenate the binary records of a batch of decodes"""
+    return b"".join(event_record(event) for event in events)
+
+
+SSE_FRAMING = Framing(lambda event: event.frame, encode_batch_frame, KEEPALIVE_FRAME)
+# /decodes?format=binary: length-prefixed records back to back, batches need no wrapper
+BINARY_FRAMING = Framing(event_record, encode_record_batch, KEEPALIVE_RECORD)
+
+
+def configure_stream_socket(sock):
+    """Enable TCP keepalive (and a send timeout where supported) so dead peers error out"""
+    options = (
+        ('TCP_KEEPIDLE', TCP_KEEPALIVE_IDLE),
+        ('TCP_KEEPINTVL', TCP_KEEPALIVE_INTERVAL),
+        ('TCP_KEEPCNT', TCP_KEEPALIVE_COUNT),
+        ('TCP_USER_TIMEOUT', TCP_USER_TIMEOUT_MS),
+    )
+    if sock is None:
+        return
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        for name, value in options:
+            if hasattr(socket, name):
+                sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, name), value)
+    except OSError as e:
+        logger.debug(f"Could not set TCP keepalive on stream socket: {e}")
+
+
+class TimerWheel:
+    """Hashed timer wheel: O(1) schedule and cancel, one slot visited per tick
+    
+    Delays are rounded up to whole ticks; delays longer than the wheel's span
+    are clamped to it.
+    """
+    
+    def __init__(self, tick: float, span: float, now: float):
+        self.tick = tick
+        self.slots: List[Dict[Any, None]] = [{} for _ in range(int(math.ceil(span / tick)) + 1)]
+        self.slot_of: Dict[Any, int] = {}
+        self.current = 0
+        self.next_tick = now + tick
+    
+    def schedule(self, item, delay: float):
+        """Schedule (or reschedule) an item to come due after delay seconds"""
+        self.cancel(item)
+        ticks = min(max(1, int(math.ceil(delay / self.tick))), len(self.slots) - 1)
+        slot = (self.current + ticks) % len(self.slots)
+        self.slots[slot][item] = None
+        self.slot_of[item] = slot
+    
+    def cancel(self, item):
+        """Unschedule an item if it is scheduled"""
+        slot = self.slot_of.pop(item, None)
+        if slot is not None:
+            del self.slots[slot][item]
+    
+    def advance(self, now: float) -> List:
+        """Move the wheel up to now, returning the items that came due"""
+        due = []
+        for _ in range(len(self.slots)):
+            if now < self.next_tick:
+                break
+            self.current = (self.current + 1) % len(self.slots)
+            bucket = self.slots[self.current]
+            if bucket:
+                due.extend(bucket)
+                for item in bucket:
+                    del self.slot_of[item]
+                self.slots[self.current] = {}
+            self.next_tick += self.tick
+        
+        # More than a full turn behind (e.g. the host was suspended): resynchronise
+        if now >= self.next_tick:
+            self.next_tick = now + self.tick
+        return due
+    
+    def __len__(self) -> int:
+        return len(self.slot_of)
+
+
+class SSEClient:
+    """Bounded outgoing event queue for one SSE subscriber
+    
+    push() runs on the broadcasting thread and take() on the connection's
+    writer. Subclasses override _wake() to signal the writer.
+    """
+    
+    _ids = itertools.count(1)
+    
+    def __init__(self, max_queue: int = DEFAULT_QUEUE_SIZE, drop_policy: str = DROP_OLDEST,
+                 max_lag: float = DEFAULT_MAX_LAG, remote: Optional[str] = None,
+                 decode_filter: Optional[DecodeFilter] = None, batch: Optional[str] = None,
+                 batch_delay: float = 0.0, stream_format: str = FORMAT_TEXT):
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f"Invalid drop policy. Must be one of: {', '.join(DROP_POLICIES)}")
+        if stream_format not in STREAM_FORMATS:
+            raise ValueError(f"Invalid format. Must be one of: {', '.join(STREAM_FORMATS)}")
+        
+        self.id = next(SSEClient._ids)
+        self.remote = remote
+        self.decode_filter = decode_filter
+        self.max_queue = max(1, max_queue)
+        self.drop_policy = drop_policy
+        self.max_lag = max_lag
+        self.batch = batch
+        self.batch_delay = batch_delay
+        self.lock = threading.Lock()
+        # Set by the hub when the connection negotiated a Content-Encoding
+        self.compressor: Optional[SSECompressor] = None
+        # Replaced by transports other than SSE (WebSocket)
+        self.stream_format = stream_format
+        if stream_format == FORMAT_BINARY:
+            self.framing = BINARY_FRAMING
+            self.content_type = BINARY_CONTENT_TYPE
+        else:
+            self.framing = SSE_FRAMING
+            self.content_type = SSE_CONTENT_TYPE
+        
+        # (queued_at, event) pairs waiting to be written
+        self.frames = deque()
+        # Frames coalesced away since the last take, reported as one gap event
+        self.gap = 0
+        # When the queue last became full without being drained
+        self.lagging_since: Optional[float] = None
+        
+        self.connected_at = time.monotonic()
+        # When the writer last sent anything; the hub only keepalives idle clients
+        self.last_write = self.connected_at
+        self.keepalive_due = False
+        self.closed = False
+        self.close_reason: Optional[str] = None
+        # Closed by the server for falling behind rather than by the peer
+        self.evicted = False
+        
+        # Metrics
+        self.delivered = 0
+        self.delivered_bytes = 0
+        self.sent_bytes = 0
+        self.dropped = 0
+    
+    def encode(self, frames: List[bytes]) -> bytes:
+        """Join frames into the bytes to write, compressed if negotiated"""
+        data = b"".join(frames)
+        if self.compressor:
+            data = self.compressor.compress(data)
+        self.sent_bytes += len(data)
+        self.last_write = time.monotonic()
+        return data
+    
+    def push(self, event: SSEEvent, now: float) -> bool:
+        """Queue an event, applying the drop policy; returns False if the client was closed"""
+        with self.lock:
+            if self.closed:
+                return False
+            
+            if len(self.frames) >= self.max_queue:
+                if self.lagging_since is None:
+                    self.lagging_since = now
+                elif now - self.lagging_since > self.max_lag:
+                    self._evict(f"lagging more than {self.max_lag:.0f}s")
+                    return False
+                
+                if self.drop_policy == DISCONNECT:
+                    self._evict("queue full")
+                    return False
+                
+                if self.drop_policy == DROP_OLDEST:
+                    self.frames.popleft()
+                    self.dropped += 1
+                else:
+                    self.gap += len(self.frames)
+                    self.dropped += len(self.frames)
+                    self.frames.clear()
+            
+            self.frames.append((now, event))
+            self._wake()
+            return True
+    
+    def replay(self, events: List[SSEEvent], front: bool = False):
+        """Queue replayed events regardless of the queue limit
+        
+        front=True puts them ahead of events already queued (database replay of
+        events older than the ring).
+        """
+        if not events:
+            return
+        
+        with self.lock:
+            now = time.monotonic()
+            if front:
+                self.frames.extendleft((now, event) for event in reversed(events))
+            else:
+                self.frames.extend((now, event) for event in events)
+            self._wake()
+    
+    def batch_remaining(self, now: float) -> float:
+        """Seconds until the queued events should be sent (0 when not batching)"""
+        if not self.batch or not self.frames or self.closed:
+            return 0.0
+        
+        first = self.frames[0][0]
+        if self.batch == BATCH_SLOT:
+            # Wait for the slot's burst to go quiet, but no longer than a slot
+            due = min(self.frames[-1][0] + SLOT_QUIET_SECONDS, first + SLOT_SECONDS)
+        else:
+            due = first + self.batch_delay
+        return max(0.0, due - now)
+    
+    def take(self) -> List[bytes]:
+        """Remove every queued event and return the frames to write"""
+        with self.lock:
+            return self._take()
+    
+    def keepalive(self):
+        """Ask the writer to send a keepalive if nothing else is queued"""
+        with self.lock:
+            if not self.closed and not self.frames:
+                self.keepalive_due = True
+                self._wake()
+    
+    def _take(self) -> List[bytes]:
+        """Remove every queued event and return the frames to write (lock held)"""
+        keepalive = self.keepalive_due
+        self.keepalive_due = False
+        events = [event for _, event in self.frames]
+        self.frames.clear()
+        self.delivered += len(events)
+        
+        if self.gap:
+            events.insert(0, encode_gap_event(self.gap))
+            self.gap = 0
+        
+        framing = self.framing
+        frames = []
+        if self.batch:
+            # Consecutive decodes go out as one frame; named events stay separate
+            batch = []
+            for event in events:
+                if event.name is None:
+                    batch.append(event)
+                    continue
+                if batch:
+                    frames.append(framing.batch(batch))
+                    batch = []
+                frames.append(framing.event(event))
+            if batch:
+                frames.append(framing.batch(batch))
+        else:
+            frames.extend(framing.event(event) for event in events)
+        
+        if keepalive and not frames:
+            frames.append(framing.keepalive)
+        
+        self.lagging_since = None
+        self.delivered_bytes += sum(len(frame) for frame in frames)
+        return frames
+    
+    def close(self, reason: str):
+        """Close the stream and wake its writer"""
+        with self.lock:
+            self._close(reason)
+    
+    def _close(self, reason: str):
+        """Close the stream (lock held)"""
+        if not self.closed:
+            self.closed = True
+            self.close_reason = reason
+            self._wake()
+    
+    def _evict(self, reason: str):
+        """Close a client that fell too far behind (lock held)"""
+        self.evicted = True
+        self._close(reason)
+    
+    def _wake(self):
+        """Signal the writer that frames are queued or the stream closed (lock held)"""
+        pass
+    
+    def stats(self, now: float) -> Dict[str, Any]:
+        """Per-client lag and drop metrics"""
+        with self.lock:
+            oldest = self.frames[0][0] if self.frames else now
+            return {
+                'id': self.id,
+                'remote': self.remote,
+                'drop_policy': self.drop_policy,
+                'filter': self.decode_filter.describe() if self.decode_filter else None,
+                'batch': self.batch,
+                'format': self.stream_format,
+                'connected_seconds': round(now - self.connected_at, 1),
+                'queued': len(self.frames),
+                'lag_seconds': round(now - oldest, 3),
+                'lagging_seconds': round(now - self.lagging_since, 1) if self.lagging_since else 0,
+                'delivered': self.delivered,
+                'delivered_bytes': self.delivered_bytes,
+                'encoding': self.compressor.encoding if self.compressor else None,
+                'sent_bytes': self.sent_bytes,
+                'dropped': self.dropped
+            }
+
+
+class ThreadedSSEClient(SSEClient):
+    """SSE client whose writer is a thread blocking in wait()"""
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Condition()
+    
+    def _wake(self):
+        self.lock.notify()
+    
+    def wait(self, timeout: Optional[float] = None) -> List[bytes]:
+        """Block until events or a keepalive are due or the stream closes, then take them
+        
+        Returns an empty list if nothing became due within timeout seconds.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.lock:
+            while not self.closed:
+                now = time.monotonic()
+                if self.frames or self.gap:
+                    # Batching clients hold queued events until the batch is due
+                    due_in = self.batch_remaining(now)
+                    if due_in <= 0:
+                        break
+                elif self.keepalive_due:
+                    break
+                elif deadline is None:
+                    due_in = None
+                elif now >= deadline:
+                    break
+                else:
+                    due_in = deadline - now
+                self.lock.wait(due_in)
+            return self._take()
+
+
+class SSEHub:
+    """Registry of SSE subscribers and broadcast fan-out"""
+    
+    def __init__(self, config: Optional[Dict[str, Any]] = None):
+        config = config or {}
+        self.queue_size = int(config.get('sse_queue_size', DEFAULT_QUEUE_SIZE))
+        self.drop_policy = str(config.get('sse_drop_policy', DROP_OLDEST)).lower()
+        self.max_lag = float(config.get('sse_max_lag', DEFAULT_MAX_LAG))
+        self.replay_limit = int(config.get('sse_replay_limit', DEFAULT_REPLAY_LIMIT))
+        self.compression = str(config.get('sse_compression', 'true')).lower() == 'true'
+        self.compression_level = int(config.get('sse_compression_level', DEFAULT_COMPRESSION_LEVEL))
+        self.keepalive_interval = float(config.get('sse_keepalive_interval', SSE_KEEPALIVE_INTERVAL))
+        
+        self.clients: List[SSEClient] = []
+        self.index = FilterIndex()
+        self.lock = threading.Lock()
+        
+        # Recent (event, fields) entries for Last-Event-ID replay
+        self.ring = deque(maxlen=max(1, int(config.get('sse_replay_buffer', DEFAULT_REPLAY_BUFFER))))
+        self.last_event_id = 0
+        
+        # Keepalive deadlines for every subscriber, driven by keepalive_tick
+        self.wheel = TimerWheel(KEEPALIVE_TICK, self.keepalive_interval, time.monotonic())
+        
+        # Totals across clients that have already gone
+        self.evicted = 0
+        self.retired_dropped = 0
+        self.reaped = 0
+        self.keepalives = 0
+    
+    def new_client(self, client_class, args: Dict[str, str], remote: Optional[str] = None,
+                   accept_encoding: Optional[str] = None) -> SSEClient:
+        """Create a subscriber from the server defaults, /decodes query parameters and Accept-Encoding
+        
+        Raises ValueError if a parameter is invalid.
+        """
+        drop_policy = (args.get('policy') or self.drop_policy).lower()
+        batch, batch_delay = self._batch_options(args)
+        client = client_class(max_queue=self.queue_size, drop_policy=drop_policy,
+                              max_lag=self.max_lag, remote=remote,
+                              decode_filter=DecodeFilter.from_args(args),
+                              batch=batch, batch_delay=batch_delay,
+                              stream_format=(args.get('format') or FORMAT_TEXT).lower())
+        
+        encoding = negotiate_encoding(accept_encoding) if self.compression else None
+        if encoding:
+            client.compressor = SSECompressor(encoding, self.compression_level)
+        return client
+    
+    def _batch_options(self, args: Dict[str, str]) -> Tuple[Optional[str], float]:
+        """Parse batch=slot / max_delay_ms=N into (mode, delay seconds)"""
+        batch = (args.get('batch') or '').lower()
+        if batch == BATCH_SLOT:
+            return BATCH_SLOT, 0.0
+        if batch:
+            raise ValueError(f"Invalid batch. Must be: {BATCH_SLOT}")
+        
+        max_delay_ms = args.get('max_delay_ms')
+        if not max_delay_ms:
+            return None, 0.0
+        try:
+            max_delay_ms = int(max_delay_ms)
+        except ValueError:
+            raise ValueError("Invalid max_delay_ms")
+        if not 0 < max_delay_ms <= MAX_BATCH_DELAY_MS:
+            raise ValueError(f"max_delay_ms must be between 1 and {MAX_BATCH_DELAY_MS}")
+        return BATCH_WINDOW, max_delay_ms / 1000.0
+    
+    def resume_event_ids(self, last_event_id: int):
+        """Continue event ids after last_event_id (the newest stored decode id)"""
+        with self.lock:
+            self.last_event_id = max(self.last_event_id, last_event_id)
+    
+    def add(self, client: SSEClient, last_event_id: Optional[int] = None) -> Optional[Tuple[int, int]]:
+        """Register a subscriber, queueing any ring frames newer than last_event_id
+        
+        Returns the (after_id, before_id) range that is older than the ring and
+        must be replayed from the database, or None if the ring covered the gap.
+        """
+        with self.lock:
+            self.clients.append(client)
+            self.index.add(client)
+            self.wheel.schedule(client, self.keepalive_interval)
+            logger.debug(f"Added SSE client {client.id}, total clients: {len(self.clients)}")
+            
+            if last_event_id is None or last_event_id >= self.last_event_id:
+                return None
+            
+            # Walk back from the newest frame to the first one the client missed
+            decode_filter = client.decode_filter
+            missed = []
+            for event, fields in reversed(self.ring):
+                if event.event_id <= last_event_id:
+                    break
+                if decode_filter is None or (fields is not None and decode_filter.matches(fields)):
+                    missed.append(event)
+            missed.reverse()
+            client.replay(missed)
+            
+            oldest = self.ring[0][0].event_id if self.ring else self.last_event_id + 1
+            if last_event_id < oldest - 1:
+                return last_event_id, oldest
+            return None
+    
+    def replay_from_database(self, client: SSEClient, database, gap: Tuple[int, int]):
+        """Queue decodes older than the ring ahead of the client's replayed frames"""
+        after_id, before_id = gap
+        try:
+            rows = database.get_decodes_between_ids(after_id, before_id, limit=self.replay_limit)
+        except Exception as e:
+            logger.error(f"Error replaying decodes from database: {e}")
+            rows = []
+        
+        decode_filter = client.decode_filter
+        events = []
+        for row in rows:
+            decode_line = row_decode_line(row)
+            if decode_filter is None or decode_filter.matches(decode_fields(decode_line, row)):
+                events.append(encode_decode_event(decode_line, row['id'], row))
+        
+        # More missed decodes than the replay limit: report the rest as a gap
+        first_replayed = rows[0]['id'] if rows else before_id
+        if first_replayed - after_id > 1 and len(rows) >= self.replay_limit:
+            events.insert(0, encode_gap_event(first_replayed - after_id - 1))
+        
+        client.replay(events, front=True)
+        logger.debug(f"Replayed {len(events)} decodes from database to SSE client {client.id}")
+    
+    def remove(self, client: SSEClient):
+        """Unregister a subscriber"""
+        with self.lock:
+            self._remove(client)
+    
+    def _remove(self, client: SSEClient):
+        """Unregister a subscriber (lock held)"""
+        if client in self.clients:
+            self.clients.remove(client)
+            self.index.remove(client)
+            self.wheel.cancel(client)
+            self.retired_dropped += client.dropped
+            logger.debug(f"Removed SSE client {client.id}, total clients: {len(self.clients)}")
+    
+    def publish(self, payload: Dict[str, Any], event_id: Optional[int] = None,
+                fields: Optional[Dict[str, Any]] = None, decode: Optional[Dict[str, Any]] = None) -> int:
+        """Encode an event once, keep it for replay and queue it on matching subscribers
+        
+        event_id should be the stored decode id so replay can fall back to the
+        database; without one the next id in sequence is used. fields (from
+        decode_fields) are what subscriber filters match against; without them
+        only unfiltered subscribers get the event. Decode payloads are also
+        encoded as a binary record, from decode when given. Returns the id.
+        """
+        now = time.monotonic()
+        
+        with self.lock:
+            if event_id is None or event_id <= self.last_event_id:
+                event_id = self.last_event_id + 1
+            self.last_event_id = event_id
+            
+            if 'decode' in payload:
+                band = fields.get('band') if fields else None
+                event = encode_decode_event(payload['decode'], event_id, decode, band)
+            else:
+                event = encode_event(payload, event_id)
+            self.ring.append((event, fields))
+            self._broadcast(event, fields, now)
+        
+        return event_id
+    
+    def _broadcast(self, event: SSEEvent, fields: Optional[Dict[str, Any]], now: float):
+        """Queue an event on matching subscribers, evicting those that fall too far behind (lock held)"""
+        closed = [client for client in self.index.matching(fields) if not client.push(event, now)]
+        
+        for client in closed:
+            if client.evicted:
+                self.evicted += 1
+                logger.warning(f"Evicting SSE client {client.id} ({client.remote}): {client.close_reason}")
+            self._remove(client)
+    
+    def keepalive_tick(self, now: Optional[float] = None) -> int:
+        """Keepalive subscribers idle for a full interval and reap closed ones
+        
+        Servers call this every KEEPALIVE_TICK seconds from one thread or task.
+        A keepalive to a dead peer makes its writer fail, so dead connections
+        are found within an interval even when no decodes are flowing.
+        Returns the number of keepalives requested.
+        """
+        now = time.monotonic() if now is None else now
+        pinged = 0
+        
+        with self.lock:
+            for client in self.wheel.advance(now):
+                if client.closed:
+                    # Its writer has gone without unregistering it
+                    self._remove(client)
+                    self.reaped += 1
+                    continue
+                
+                idle = now - client.last_write
+                if idle >= self.keepalive_interval:
+                    client.keepalive()
+                    pinged += 1
+                    self.wheel.schedule(client, self.keepalive_interval)
+                else:
+                    self.wheel.schedule(client, self.keepalive_interval - idle)
+            
+            self.keepalives += pinged
+        return pinged
+    
+    def close_all(self, reason: str):
+        """Close every subscriber stream"""
+        with self.lock:
+            for client in self.clients:
+                client.close(reason)
+    
+    def count(self) -> int:
+        """Number of live subscribers (closed ones awaiting removal are not counted)"""
+        with self.lock:
+            return sum(1 for client in self.clients if not client.closed)
+    
+    def totals(self) -> Dict[str, int]:
+        """Hub-wide counts for /metrics, without building per-client stats"""
+        with self.lock:
+            live = [client for client in self.clients if not client.closed]
+            return {
+                'clients': len(live),
+                'queued': sum(len(client.frames) for client in live),
+                'dropped': self.retired_dropped + sum(client.dropped for client in self.clients),
+                'evicted': self.evicted,
+                'reaped': self.reaped,
+                'keepalives': self.keepalives
+            }
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hub totals and per-client metrics for /health"""
+        now = time.monotonic()
+        with self.lock:
+            clients = list(self.clients)
+            dropped = self.retired_dropped
+            evicted = self.evicted
+            reaped = self.reaped
+            keepalives = self.keepalives
+        
+        client_stats = [client.stats(now) for client in clients]
+        return {
+            'dropped_total': dropped + sum(stats['dropped'] for stats in client_stats),
+            'evicted_total': evicted,
+            'reaped_total': reaped,
+            'keepalives_total': keepalives,
+            'clients': client_stats
+        }
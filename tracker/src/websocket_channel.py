@@ -0,0 +1,308 @@
+"""
+WebSocket channel (RFC 6455)
+One persistent connection that carries decodes downstream and GPS and band
+updates upstream, so the Android app does not pay an HTTP round trip for
+every /gps post. This module holds the transport-neutral parts: the upgrade
+handshake, frame encoding and parsing, downstream framing of hub events and
+dispatch of upstream messages to the existing REST handlers.
+"""
+
+import json
+import base64
+import struct
+import hashlib
+import logging
+from typing import Dict, Any, Optional, List, Tuple, Mapping
+
+from api_handlers import handle_gps_update, handle_gps_batch, handle_band_change
+from sse import Framing, SSEEvent, event_record, encode_record_batch
+from binary_stream import FORMAT_BINARY
+
+logger = logging.getLogger(__name__)
+
+# Key suffix from RFC 6455 section 1.3
+WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# Opcodes
+OP_CONTINUATION = 0x0
+OP_TEXT = 0x1
+OP_BINARY = 0x2
+OP_CLOSE = 0x8
+OP_PING = 0x9
+OP_PONG = 0xA
+
+# Close codes
+CLOSE_NORMAL = 1000
+CLOSE_GOING_AWAY = 1001
+CLOSE_PROTOCOL_ERROR = 1002
+CLOSE_TOO_BIG = 1009
+
+# Largest upstream message accepted (GPS and band updates are tiny)
+MAX_MESSAGE_SIZE = 64 * 1024
+
+
+class ProtocolError(ValueError):
+    """Client broke the WebSocket protocol; close with the given code"""
+    
+    def __init__(self, message: str, code: int = CLOSE_PROTOCOL_ERROR):
+        super().__init__(message)
+        self.code = code
+
+
+def upgrade_error(method: str, headers: Mapping[str, str]) -> Optional[str]:
+    """Check a request is a valid WebSocket upgrade, returning the problem or None
+    
+    headers must be looked up case-insensitively (lower-case keys or a
+    framework header map).
+    """
+    if method != 'GET':
+        return 'WebSocket upgrade requires GET'
+    if (headers.get('upgrade') or '').lower() != 'websocket':
+        return 'Missing Upgrade: websocket'
+    if 'upgrade' not in (headers.get('connection') or '').lower():
+        return 'Missing Connection: Upgrade'
+    if headers.get('sec-websocket-version') != '13':
+        return 'Unsupported Sec-WebSocket-Version (13 required)'
+    if not headers.get('sec-websocket-key'):
+        return 'Missing Sec-WebSocket-Key'
+    return None
+
+
+def accept_key(key: str) -> str:
+    """Sec-WebSocket-Accept value for a client's Sec-WebSocket-Key"""
+    digest = hashlib.sha1(key.strip().encode('ascii') + WS_GUID).digest()
+    return base64.b64encode(digest).decode('ascii')
+
+
+def handshake_response(key: str) -> bytes:
+    """101 Switching Protocols response completing the upgrade"""
+    return (
+        b"HTTP/1.1 101 Switching Protocols\r\n"
+        b"Upgrade: websocket\r\n"
+        b"Connection: Upgrade\r\n"
+        b"Sec-WebSocket-Accept: " + accept_key(key).encode('ascii') + b"\r\n"
+        b"\r\n"
+    )
+
+
+def encode_frame(opcode: int, payload: bytes = b"") -> bytes:
+    """Encode one unfragmented, unmasked server frame"""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 65536:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+
+def encode_close(code: int = CLOSE_NORMAL, reason: str = "") -> bytes:
+    """Encode a close frame"""
+    return encode_frame(OP_CLOSE, struct.pack('!H', code) + reason.encode('utf-8')[:123])
+
+
+def encode_json(message: Dict[str, Any]) -> bytes:
+    """Encode a JSON text frame"""
+    return encode_frame(OP_TEXT, json.dumps(message).encode('utf-8'))
+
+
+def _unmask(payload: bytes, mask: bytes) -> bytes:
+    """XOR a client payload with its 4-byte mask"""
+    length = len(payload)
+    if not length:
+        return payload
+    key = (mask * (length // 4 + 1))[:length]
+    return (int.from_bytes(payload, 'big') ^ int.from_bytes(key, 'big')).to_bytes(length, 'big')
+
+
+class FrameParser:
+    """Incremental parser for client frames
+    
+    feed() takes bytes as they arrive and returns complete messages as
+    (opcode, payload) pairs, with fragmented data messages reassembled.
+    Raises ProtocolError on anything RFC 6455 forbids from a client.
+    """
+    
+    def __init__(self, max_message_size: int = MAX_MESSAGE_SIZE):
+        self.max_message_size = max_message_size
+        self.buffer = bytearray()
+        # Opcode and data of a fragmented message in progress
+        self.fragment_opcode: Optional[int] = None
+        self.fragments = bytearray()
+    
+    def feed(self, data: bytes) -> List[Tuple[int, bytes]]:
+        """Add received bytes, returning the messages they complete"""
+        self.buffer += data
+        messages = []
+        while True:
+            frame = self._next_frame()
+            if frame is None:
+                return messages
+            message = self._assemble(*frame)
+            if message is not None:
+                messages.append(message)
+    
+    def _next_frame(self) -> Optional[Tuple[bool, int, bytes]]:
+        """Remove one complete frame from the buffer as (fin, opcode, payload)"""
+        buffer = self.buffer
+        if len(buffer) < 2:
+            return None
+        
+        first, second = buffer[0], buffer[1]
+        if first & 0x70:
+            raise ProtocolError("Reserved bits set without a negotiated extension")
+        if not second & 0x80:
+            raise ProtocolError("Client frames must be masked")
+        
+        fin = bool(first & 0x80)
+        opcode = first & 0x0F
+        length = second & 0x7F
+        offset = 2
+        if length == 126:
+            if len(buffer) < 4:
+                return None
+            length = struct.unpack_from('!H', buffer, 2)[0]
+            offset = 4
+        elif length == 127:
+            if len(buffer) < 10:
+                return None
+            length = struct.unpack_from('!Q', buffer, 2)[0]
+            offset = 10
+        
+        if opcode >= OP_CLOSE and (length > 125 or not fin):
+            raise ProtocolError("Control frames must be short and unfragmented")
+        if length + len(self.fragments) > self.max_message_size:
+            raise ProtocolError("Message too big", CLOSE_TOO_BIG)
+        
+        end = offset + 4 + length
+        if len(buffer) < end:
+            return None
+        
+        mask = bytes(buffer[offset:offset + 4])
+        payload = _unmask(bytes(buffer[offset + 4:end]), mask)
+        del buffer[:end]
+        return fin, opcode, payload
+    
+    def _assemble(self, fin: bool, opcode: int, payload: bytes) -> Optional[Tuple[int, bytes]]:
+        """Reassemble fragmented data messages; control frames pass straight through"""
+        if opcode >= OP_CLOSE:
+            if opcode not in (OP_CLOSE, OP_PING, OP_PONG):
+                raise ProtocolError(f"Unknown control opcode {opcode}")
+            return opcode, payload
+        
+        if opcode == OP_CONTINUATION:
+            if self.fragment_opcode is None:
+                raise ProtocolError("Continuation without a message")
+            self.fragments += payload
+            if not fin:
+                return None
+            message = (self.fragment_opcode, bytes(self.fragments))
+            self.fragment_opcode = None
+            self.fragments.clear()
+            return message
+        
+        if opcode not in (OP_TEXT, OP_BINARY):
+            raise ProtocolError(f"Unknown data opcode {opcode}")
+        if self.fragment_opcode is not None:
+            raise ProtocolError("New message before the previous one finished")
+        if fin:
+            return opcode, payload
+        
+        self.fragment_opcode = opcode
+        self.fragments += payload
+        return None
+
+
+def _typed(kind: bytes, event: SSEEvent) -> bytes:
+    """Prefix an event's JSON object with its message type and id"""
+    head = b'{"type": "' + kind + b'"'
+    if event.event_id is not None:
+        head += b', "id": ' + str(event.event_id).encode('ascii')
+    if event.data == b"{}":
+        return head + b"}"
+    return head + b", " + event.data[1:]
+
+
+def event_message(event: SSEEvent) -> bytes:
+    """Text frame for one hub event, reusing its encoded JSON"""
+    kind = event.name.encode('utf-8') if event.name else b"decode"
+    return encode_frame(OP_TEXT, _typed(kind, event))
+
+
+def batch_message(events: List[SSEEvent]) -> bytes:
+    """Text frame carrying a batch of decodes, reusing their encoded JSON"""
+    payload = (b'{"type": "decodes", "id": ' + str(events[-1].event_id).encode('ascii') +
+               b', "decodes": [' + b", ".join(event.data for event in events) + b"]}")
+    return encode_frame(OP_TEXT, payload)
+
+
+def binary_event_message(event: SSEEvent) -> bytes:
+    """Binary frame carrying one hub event's record"""
+    return encode_frame(OP_BINARY, event_record(event))
+
+
+def binary_batch_message(events: List[SSEEvent]) -> bytes:
+    """Binary frame carrying a batch of decode records back to back"""
+    return encode_frame(OP_BINARY, encode_record_batch(events))
+
+
+WEBSOCKET_FRAMING = Framing(event_message, batch_message, encode_frame(OP_PING))
+WEBSOCKET_BINARY_FRAMING = Framing(binary_event_message, binary_batch_message, encode_frame(OP_PING))
+
+
+def websocket_framing(stream_format: str) -> Framing:
+    """Framing for a /ws client's ?format="""
+    return WEBSOCKET_BINARY_FRAMING if stream_format == FORMAT_BINARY else WEBSOCKET_FRAMING
+
+
+def handle_message(server, payload: bytes) -> Optional[Dict[str, Any]]:
+    """Dispatch one upstream message to the REST handlers
+    
+    Messages are JSON objects with a type ('gps', 'gps_batch' or 'band') and
+    the same fields as the /gps and /band bodies; a gps_batch carries its
+    fixes in positions. Returns the reply to send: errors
+    always, acknowledgements only for messages that carry a seq.
+    """
+    try:
+        message = json.loads(payload.decode('utf-8'))
+    except (UnicodeDecodeError, ValueError):
+        message = None
+    if not isinstance(message, dict):
+        return {'type': 'error', 'status': 400, 'error': 'Invalid JSON'}
+    
+    kind = message.pop('type', None)
+    seq = message.pop('seq', None)
+    
+    if kind == 'gps':
+        response, status = handle_gps_update(server, message)
+    elif kind == 'gps_batch':
+        response, status = handle_gps_batch(server, message.get('positions'))
+    elif kind == 'band':
+        response, status = handle_band_change(server, message)
+    else:
+        response, status = {'error': f'Unknown message type: {kind}'}, 400
+    
+    if status == 200:
+        if seq is None:
+            return None
+        reply = {'type': 'ack', 'status': status}
+    else:
+        reply = {'type': 'error', 'status': status, 'error': response.get('error')}
+    
+    if seq is not None:
+        reply['seq'] = seq
+    return reply
+
+
+def respond(server, opcode: int, payload: bytes) -> Tuple[bytes, bool]:
+    """Handle one client message, returning (bytes to send back, whether the peer closed)"""
+    if opcode == OP_CLOSE:
+        # Echo the status code to complete the closing handshake
+        return encode_frame(OP_CLOSE, payload[:2]), True
+    if opcode == OP_PING:
+        return encode_frame(OP_PONG, payload), False
+    if opcode in (OP_TEXT, OP_BINARY):
+        reply = handle_message(server, payload)
+        return (encode_json(reply) if reply else b""), False
+    return b"", False
@@ -0,0 +1,481 @@
+"""
+Server Worker Pool
+Runs the network server as N worker processes sharing one port through
+SO_REUSEPORT, so SSE fan-out scales with cores instead of one GIL.
+The tracker process is a broker on a Unix socket: each decode is serialized
+once and the same bytes go to every worker, which publishes it to its own
+subscribers. GPS and band updates received by any worker are forwarded to the
+tracker, which applies them and shares the new state with every worker.
+Decodes and state also carry the database write version, so every worker
+tags history queries with the same ETags. A worker answering /metrics asks
+the tracker for its metrics (decoder, database, GPS, uploader) and serves
+them together with its own.
+"""
+
+import os
+import json
+import itertools
+import time
+import signal
+import socket
+import struct
+import logging
+import tempfile
+import threading
+import multiprocessing
+from typing import Dict, Any, Optional, Callable, List
+
+from metrics import render_metrics, merge_metrics
+from api_handlers import fix_timestamp
+
+logger = logging.getLogger(__name__)
+
+# Broker messages are a 4-byte big-endian length followed by a JSON object
+HEADER = struct.Struct('!I')
+# Large enough for a full /gps/batch upload
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+# Seconds between subscriber count reports from each worker
+REPORT_INTERVAL = 1.0
+# A worker that stops reading for this long is dropped rather than stalling the decoder
+SEND_TIMEOUT = 5.0
+# Seconds between checks for workers that have died (and for database writes to publish)
+SUPERVISE_INTERVAL = 1.0
+# Seconds a worker's /metrics waits for the tracker's metrics
+METRICS_TIMEOUT = 2.0
+
+
+def encode_message(message: Dict[str, Any]) -> bytes:
+    """Frame a broker message"""
+    body = json.dumps(message).encode('utf-8')
+    return HEADER.pack(len(body)) + body
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    """Read exactly size bytes, or None if the peer closed first"""
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def read_message(sock: socket.socket) -> Optional[Dict[str, Any]]:
+    """Read one broker message, returning None when the peer closes
+    
+    Raises ValueError for an oversized or malformed message.
+    """
+    header = _recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    size, = HEADER.unpack(header)
+    if size > MAX_MESSAGE_SIZE:
+        raise ValueError(f"Broker message too large: {size} bytes")
+    body = _recv_exact(sock, size)
+    if body is None:
+        return None
+    return json.loads(body)
+
+
+class WorkerLink:
+    """The broker's connection to one worker"""
+    
+    def __init__(self, sock: socket.socket):
+        self.sock = sock
+        self.lock = threading.Lock()
+        self.clients = 0
+        
+        # Bound sends only, so the reader thread can still block on recv
+        seconds = int(SEND_TIMEOUT)
+        timeval = struct.pack('ll', seconds, int((SEND_TIMEOUT - seconds) * 1e6))
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDTIMEO, timeval)
+    
+    def send(self, data: bytes):
+        """Send pre-framed bytes (safe from any thread)"""
+        with self.lock:
+            self.sock.sendall(data)
+    
+    def close(self):
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class WorkerPool:
+    """Network server made of worker processes, driven from the tracker process
+    
+    Offers the same interface the tracker uses on the single-process servers.
+    Workers always run the asyncio server, which is the one built for many
+    idle streams.
+    """
+    
+    def __init__(self, config: Dict[str, Any]):
+        self.config = config
+        self.host = config.get('server_bind', '0.0.0.0')
+        self.port = int(config.get('server_port', 8080))
+        self.worker_count = max(1, int(config.get('server_workers', 2)))
+        self.broker_path = config.get('server_broker_socket') or os.path.join(
+            tempfile.mkdtemp(prefix='ft8-tracker-'), 'broker.sock'
+        )
+        self.running = False
+        
+        # State shared with every worker
+        self.current_band: Optional[str] = None
+        self.last_gps_update: Optional[Dict[str, Any]] = None
+        
+        # Callbacks
+        self.gps_callback: Optional[Callable] = None
+        self.gps_batch_callback: Optional[Callable] = None
+        self.band_callback: Optional[Callable] = None
+        
+        # Workers open the same database read-only for queries and replay
+        self.database = None
+        # Database version workers last heard about
+        self.published_version: Optional[str] = None
+        
+        self.listener: Optional[socket.socket] = None
+        self.links: List[WorkerLink] = []
+        self.links_lock = threading.Lock()
+        self.processes: List[multiprocessing.Process] = []
+        self.broker_thread = None
+    
+    def start(self):
+        """Open the broker socket and start the worker processes"""
+        try:
+            if os.path.exists(self.broker_path):
+                os.unlink(self.broker_path)
+            self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.listener.bind(self.broker_path)
+            self.listener.listen(self.worker_count)
+            self.listener.settimeout(SUPERVISE_INTERVAL)
+            
+            self.running = True
+            self.processes = [self._spawn(index) for index in range(self.worker_count)]
+            
+            self.broker_thread = threading.Thread(target=self._broker_loop, daemon=True)
+            self.broker_thread.start()
+            
+            logger.info(f"Started {self.worker_count} server workers on {self.host}:{self.port} "
+                        f"(broker: {self.broker_path})")
+            return True
+        
+        except Exception as e:
+            self.running = False
+            logger.error(f"Failed to start server workers: {e}")
+            return False
+    
+    def stop(self):
+        """Stop every worker and close the broker"""
+        self.running = False
+        logger.info("Server workers stopping...")
+        
+        # Workers shut down when the broker connection closes
+        with self.links_lock:
+            links, self.links = self.links, []
+        for link in links:
+            link.close()
+        if self.listener:
+            self.listener.close()
+        
+        for process in self.processes:
+            process.join(timeout=5)
+            if process.is_alive():
+                process.terminate()
+        
+        try:
+            os.unlink(self.broker_path)
+        except OSError:
+            pass
+    
+    def _spawn(self, index: int) -> multiprocessing.Process:
+        """Start one worker process"""
+        config = dict(self.config, server_reuse_port='true')
+        db_path = str(self.database.db_path) if self.database else None
+        read_pool_size = self.database.read_pool_size if self.database else 1
+        
+        # Spawn rather than fork: the tracker already runs GPS and decoder threads
+        context = multiprocessing.get_context('spawn')
+        process = context.Process(
+            target=run_worker, name=f"server-worker-{index}",
+            args=(config, index, self.broker_path, db_path, read_pool_size, logging.getLogger().level),
+            daemon=True
+        )
+        process.start()
+        return process
+    
+    def _broker_loop(self):
+        """Accept worker connections and restart workers that die"""
+        while self.running:
+            try:
+                sock, _ = self.listener.accept()
+            except socket.timeout:
+                self._supervise()
+                continue
+            except OSError:
+                break
+            
+            sock.settimeout(None)
+            link = WorkerLink(sock)
+            try:
+                link.send(self._state_message())
+            except OSError:
+                link.close()
+                continue
+            with self.links_lock:
+                self.links.append(link)
+            threading.Thread(target=self._serve_worker, args=(link,), daemon=True).start()
+    
+    def _supervise(self):
+        """Replace worker processes that have exited, and publish writes no message carried"""
+        for index, process in enumerate(self.processes):
+            if self.running and not process.is_alive():
+                logger.warning(f"Server worker {index} exited ({process.exitcode}), restarting")
+                self.processes[index] = self._spawn(index)
+        
+        # Uploads and cleanups also change the version
+        if self.database and self.database.get_data_version() != self.published_version:
+            self._publish_state()
+    
+    def _serve_worker(self, link: WorkerLink):
+        """Apply updates forwarded by one worker until it disconnects"""
+        try:
+            while self.running:
+                message = read_message(link.sock)
+                if message is None:
+                    break
+                self._handle(link, message)
+        except (OSError, ValueError) as e:
+            if self.running:
+                logger.warning(f"Server worker connection failed: {e}")
+        finally:
+            self._drop(link)
+    
+    def _handle(self, link: WorkerLink, message: Dict[str, Any]):
+        """Apply one message from a worker"""
+        kind = message.get('type')
+        
+        if kind == 'clients':
+            link.clients = message['count']
+            return
+        if kind == 'metrics':
+            link.send(encode_message({'type': 'metrics', 'id': message['id'],
+                                      'text': render_metrics().decode('utf-8')}))
+            return
+        
+        try:
+            if kind == 'gps':
+                self.last_gps_update = message['data']
+                if self.gps_callback:
+                    self.gps_callback(message['data'])
+            elif kind == 'gps_batch':
+                positions = message['positions']
+                latest = positions[-1]
+                if self.last_gps_update is None or latest['timestamp'] >= fix_timestamp(self.last_gps_update):
+                    self.last_gps_update = latest
+                if self.gps_batch_callback:
+                    self.gps_batch_callback(positions)
+                elif self.gps_callback:
+                    self.gps_callback(latest)
+            elif kind == 'band':
+                self.current_band = message['band']
+                if self.band_callback:
+                    self.band_callback(message['band'])
+            else:
+                logger.warning(f"Unknown message from server worker: {kind}")
+                return
+        except Exception as e:
+            logger.error(f"Error applying {kind} from server worker: {e}")
+        
+        # Every worker reports the same band and position
+        self._publish_state()
+    
+    def _version(self) -> Optional[str]:
+        """Current database version, remembered as the one workers have"""
+        if self.database:
+            self.published_version = self.database.get_data_version()
+        return self.published_version
+    
+    def _state_message(self) -> bytes:
+        return encode_message({
+            'type': 'state',
+            'band': self.current_band,
+            'gps': self.last_gps_update,
+            'version': self._version()
+        })
+    
+    def _publish_state(self):
+        """Send the current band, position and database version to every worker"""
+        if self.running:
+            self._broadcast(self._state_message())
+    
+    def _broadcast(self, data: bytes):
+        """Send the same bytes to every worker"""
+        with self.links_lock:
+            links = list(self.links)
+        for link in links:
+            try:
+                link.send(data)
+            except OSError as e:
+                logger.warning(f"Dropping unresponsive server worker: {e}")
+                self._drop(link)
+    
+    def _drop(self, link: WorkerLink):
+        with self.links_lock:
+            if link in self.links:
+                self.links.remove(link)
+        link.close()
+    
+    def send_decode(self, decode_line: str, event_id: Optional[int] = None,
+                    decode: Optional[Dict[str, Any]] = None):
+        """Publish a decode to every worker, serialized once"""
+        if self.running:
+            self._broadcast(encode_message({'type': 'decode', 'line': decode_line, 'id': event_id,
+                                            'decode': decode, 'version': self._version()}))
+    
+    def has_clients(self) -> bool:
+        """Check if any worker has connected subscribers"""
+        return self.get_client_count() > 0
+    
+    def get_client_count(self) -> int:
+        """Subscribers across all workers, as last reported"""
+        with self.links_lock:
+            return sum(link.clients for link in self.links)
+    
+    def set_gps_callback(self, callback: Callable):
+        """Set callback for GPS updates"""
+        self.gps_callback = callback
+    
+    def set_gps_batch_callback(self, callback: Callable):
+        """Set callback for batches of buffered GPS fixes (called once per batch)"""
+        self.gps_batch_callback = callback
+    
+    def set_band_callback(self, callback: Callable):
+        """Set callback for band changes"""
+        self.band_callback = callback
+    
+    def set_database(self, database):
+        """Set the database workers open for queries and replay (before start)"""
+        self.database = database
+    
+    def get_current_band(self) -> Optional[str]:
+        """Get the current operating band"""
+        return self.current_band
+    
+    def get_last_gps_update(self) -> Optional[Dict[str, Any]]:
+        """Get the last GPS position received"""
+        return self.last_gps_update
+
+
+def run_worker(config: Dict[str, Any], index: int, broker_path: str, db_path: Optional[str],
+               read_pool_size: int, log_level: int):
+    """Worker process: serve HTTP on the shared port and relay through the broker"""
+    from network_server_async import AsyncNetworkServer
+    from database import Database
+    
+    logging.basicConfig(
+        level=log_level,
+        format=f'%(asctime)s - worker{index} - %(name)s - %(levelname)s - %(message)s'
+    )
+    # The tracker handles Ctrl+C and stops workers by closing the broker
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    
+    broker = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    broker.connect(broker_path)
+    send_lock = threading.Lock()
+    
+    def send(message: Dict[str, Any]):
+        with send_lock:
+            broker.sendall(encode_message(message))
+    
+    server = AsyncNetworkServer(config)
+    
+    # /metrics requests waiting for the tracker's metrics: id -> [event, text]
+    metrics_waiters: Dict[int, list] = {}
+    metrics_ids = itertools.count(1)
+    
+    def render_all() -> bytes:
+        """The tracker's metrics and this worker's"""
+        request_id = next(metrics_ids)
+        waiter = metrics_waiters[request_id] = [threading.Event(), None]
+        try:
+            send({'type': 'metrics', 'id': request_id})
+            waiter[0].wait(METRICS_TIMEOUT)
+        except OSError:
+            pass
+        finally:
+            metrics_waiters.pop(request_id, None)
+        parts = [(f'worker{index}', render_metrics())]
+        if waiter[1] is not None:
+            parts.insert(0, ('tracker', waiter[1].encode('utf-8')))
+        else:
+            logger.warning("Tracker metrics unavailable, serving this worker's only")
+        return merge_metrics(parts)
+    
+    server.render_metrics = render_all
+    server.set_gps_callback(lambda data: send({'type': 'gps', 'data': data}))
+    server.set_gps_batch_callback(lambda positions: send({'type': 'gps_batch', 'positions': positions}))
+    server.set_band_callback(lambda band: send({'type': 'band', 'band': band}))
+    
+    def apply_state(message: Dict[str, Any]):
+        server.current_band = message['band']
+        server.last_gps_update = message['gps']
+        if database:
+            database.writer_version = message['version']
+    
+    database = None
+    if db_path:
+        # The broker owns the schema and all writes; workers only query
+        database = Database(db_path, read_pool_size=read_pool_size, read_only=True)
+        server.set_database(database)
+    
+    # The broker sends its state first; apply it before serving any request
+    message = read_message(broker)
+    if message is None:
+        return
+    apply_state(message)
+    
+    if not server.start():
+        return
+    
+    def report_clients():
+        reported = None
+        while server.running:
+            count = server.get_client_count()
+            if count != reported:
+                try:
+                    send({'type': 'clients', 'count': count})
+                except OSError:
+                    break
+                reported = count
+            time.sleep(REPORT_INTERVAL)
+    
+    threading.Thread(target=report_clients, daemon=True).start()
+    
+    try:
+        while True:
+            message = read_message(broker)
+            if message is None:
+                break
+            if message['type'] == 'decode':
+                if database:
+                    database.writer_version = message['version']
+                server.send_decode(message['line'], message['id'], message['decode'])
+            elif message['type'] == 'state':
+                apply_state(message)
+            elif message['type'] == 'metrics':
+                waiter = metrics_waiters.get(message['id'])
+                if waiter:
+                    waiter[1] = message['text']
+                    waiter[0].set()
+    except (OSError, ValueError) as e:
+        logger.error(f"Broker connection failed: {e}")
+    finally:
+        server.stop()
+        broker.close()
+        if database:
+            database.close()
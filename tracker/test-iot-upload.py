@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+IoT uploader test against a local stand-in server
+Runs a small HTTP server that speaks the dx.jxqz.org upload API like
+beacon-server (gzip bodies decoded, other encodings answered with 415) and
+counts connections, fills a temporary database with
+decodes and drains it through IoTUploader. Each run reports batches, new
+connections, bytes on the wire and handshake time, first the old way (no
+compression, a new connection per batch) and then with the keep-alive
+session, uncompressed (the default) and with compression opted in.
+
+A second table drains a day-offline backlog behind a slow link (--latency
+seconds per request), once with fixed batches uploaded one at a time and
+once with adaptive batches and several in flight, while new decodes keep
+arriving (--arrival per second), and reports drain time. Draining stops with
+at most one batch left for the next interval.
+
+Usage:
+    python3 test-iot-upload.py                        # 1000 decodes, batches of 100
+    python3 test-iot-upload.py --decodes 5000 --batch-size 250
+    python3 test-iot-upload.py --accept gzip,zstd     # server also decodes zstd
+    python3 test-iot-upload.py --legacy               # server before gzip support: 400 for compressed bodies
+    python3 test-iot-upload.py --backlog 50000 --latency 0.5
+"""
+
+import sys
+import os
+import gzip
+import json
+import random
+import time
+import argparse
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+from database import Database
+from iot_uploader import IoTUploader, ZSTD_AVAILABLE
+
+API_KEY = 'test-key'
+# The real server's request body limit
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class StandInServer(ThreadingHTTPServer):
+    """Upload endpoint that checks each batch and counts what it received"""
+    daemon_threads = True
+
+    def __init__(self, accept=('gzip',), legacy=False, latency=0.0):
+        super().__init__(('127.0.0.1', 0), UploadHandler)
+        # Encodings decoded; legacy ignores Content-Encoding and parses every body as JSON
+        self.accept = set(accept)
+        self.legacy = legacy
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.decodes = 0
+        self.largest_batch = 0
+        self.errors = []
+
+
+class UploadHandler(BaseHTTPRequestHandler):
+    # Keep-alive, like the real server
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        encoding = self.headers.get('Content-Encoding')
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        # Round trip of a slow uplink
+        time.sleep(self.server.latency)
+        if encoding and not self.server.legacy and encoding not in self.server.accept:
+            return self._reply(415, {'error': f'Unsupported Content-Encoding: {encoding}'})
+
+        if self.path != '/api/ft8/upload' or self.headers.get('Authorization') != f'Bearer {API_KEY}':
+            self.server.errors.append(f"bad request {self.path}")
+            return self._reply(401, {'error': 'Unauthorized'})
+
+        if len(body) > MAX_BODY_SIZE:
+            self.server.errors.append(f"body of {len(body)} bytes")
+            return self._reply(413, {'error': 'Request too large'})
+        if self.server.legacy:
+            encoding = None
+        if encoding == 'gzip':
+            body = gzip.decompress(body)
+        elif encoding == 'zstd':
+            import zstandard
+            body = zstandard.ZstdDecompressor().decompress(body)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            # What Flask's get_json() does with a body it cannot parse
+            return self._reply(400, {'error': 'Bad Request'})
+        with self.server.lock:
+            self.server.decodes += len(payload['decodes'])
+            self.server.largest_batch = max(self.server.largest_batch, len(payload['decodes']))
+        self._reply(200, {'status': 'ok', 'received': len(payload['decodes'])})
+
+    def _reply(self, status, response):
+        body = json.dumps(response).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def fill_database(path: str, count: int) -> Database:
+    """A database holding count realistic decodes with GPS positions"""
+    rng = random.Random(1)
+    database = Database(path)
+    calls = [f"{rng.choice(['K', 'W', 'N', 'VE', 'DL', 'JA'])}{rng.randint(0, 9)}"
+             f"{''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(3))}" for _ in range(200)]
+    items = []
+    for n in range(count):
+        call = rng.choice(calls)
+        grid = f"{rng.choice('CDEFJ')}{rng.choice('MNO')}{rng.randint(10, 99)}"
+        items.append(({
+            'timestamp': 1700000000 + n * 2, 'time_str': '120000', 'callsign': call, 'grid': grid,
+            'snr': rng.randint(-24, 10), 'dt': 0.1, 'frequency': rng.randint(200, 3000), 'band': '20m',
+            'message': f"CQ {call} {grid}"
+        }, {
+            'latitude': 47.6 + n * 1e-4, 'longitude': -122.3 - n * 1e-4, 'altitude': 150.0,
+            'speed': 55.0, 'heading': 90.0
+        }))
+    database.insert_decodes_bulk(items)
+    return database
+
+
+def run(label: str, compression: str, reuse: bool, args) -> dict:
+    """Drain a fresh database through the uploader and report what went over the wire"""
+    server = StandInServer(args.accept.split(',') if args.accept else (), args.legacy)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    directory = tempfile.mkdtemp(prefix='test-iot-upload-')
+    database = fill_database(os.path.join(directory, 'tracker.db'), args.decodes)
+    uploader = IoTUploader({
+        'server': f"http://127.0.0.1:{server.server_address[1]}", 'api_key': API_KEY,
+        'station': 'N7MKO-M', 'batch_size': str(args.batch_size), 'compression': compression,
+        # Fixed batches one at a time, so only the connection and encoding differ
+        'max_batch_size': str(args.batch_size), 'max_in_flight': '1'
+    }, database)
+
+    while database.count_unuploaded():
+        if not reuse:
+            # What a bare requests.post did: a new connection for every batch
+            uploader.session.close()
+        if not uploader.force_upload():
+            break
+
+    server.shutdown()
+    uploader.stop()
+    database.close()
+    stats = uploader.get_stats()
+    return {
+        'label': label,
+        'batches': stats['batches_uploaded'],
+        'uploaded': server.decodes,
+        'connections': server.connections,
+        'encoding': stats['encoding'] or 'none',
+        'bytes_sent': stats['bytes_sent'],
+        'bytes_per_decode': stats['bytes_sent'] / max(1, server.decodes),
+        'handshake_ms': stats['handshake_seconds'] * 1000,
+        'errors': server.errors
+    }
+
+
+def arrive(database: Database, rate: float, stop: threading.Event) -> list:
+    """Insert rate new decodes per second until stop is set, like a busy band"""
+    arrived = []
+
+    def loop():
+        while not stop.wait(1 / rate):
+            arrived.append(database.insert_decode({
+                'timestamp': int(time.time()), 'time_str': '120000', 'callsign': 'K1ABC', 'grid': 'FN42',
+                'snr': -10, 'dt': 0.1, 'frequency': 1500, 'band': '20m', 'message': 'CQ K1ABC FN42'
+            }))
+
+    threading.Thread(target=loop, daemon=True).start()
+    return arrived
+
+
+def drain(label: str, adaptive: bool, args) -> dict:
+    """Drain a backlog behind a slow link while decodes keep arriving, and time it"""
+    server = StandInServer(latency=args.latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    directory = tempfile.mkdtemp(prefix='test-iot-upload-')
+    database = fill_database(os.path.join(directory, 'tracker.db'), args.backlog)
+    config = {
+        'server': f"http://127.0.0.1:{server.server_address[1]}", 'api_key': API_KEY,
+        'station': 'N7MKO-M', 'batch_size': str(args.batch_size)
+    }
+    if not adaptive:
+        # The old cadence without the waits: batch_size decodes, one request at a time
+        config.update({'max_batch_size': str(args.batch_size), 'max_in_flight': '1'})
+    uploader = IoTUploader(config, database)
+
+    stop = threading.Event()
+    arrived = arrive(database, args.arrival, stop) if args.arrival else []
+    started = time.monotonic()
+    ok = uploader.drain_backlog()
+    seconds = time.monotonic() - started
+    stop.set()
+
+    # Caught up means at most one batch left for the next interval, which takes the rest
+    left = database.count_unuploaded()
+    ok = ok and left <= args.batch_size and uploader.drain_backlog()
+
+    server.shutdown()
+    uploader.stop()
+    remaining = database.count_unuploaded()
+    database.close()
+    stats = uploader.get_stats()
+    return {
+        'label': label,
+        'ok': ok and remaining == 0,
+        'uploaded': server.decodes,
+        'expected': args.backlog + len(arrived),
+        'left': left,
+        'batches': stats['batches_uploaded'],
+        'largest_batch': server.largest_batch,
+        'seconds': seconds,
+        'last_drain': stats['last_drain'],
+        'errors': server.errors
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='IoT uploader test against a local stand-in server')
+    parser.add_argument('--decodes', type=int, default=1000, help='Decodes to upload')
+    parser.add_argument('--batch-size', type=int, default=100, help='Decodes per batch')
+    parser.add_argument('--accept', default='gzip', help='Comma-separated encodings the server decodes (others get 415)')
+    parser.add_argument('--legacy', action='store_true', help='Server ignores Content-Encoding, like beacon-server before gzip support')
+    parser.add_argument('--backlog', type=int, default=20000, help='Decodes pending for the drain runs (0 skips them)')
+    parser.add_argument('--latency', type=float, default=0.2, help='Seconds the server takes per request in drain runs')
+    parser.add_argument('--arrival', type=float, default=20, help='New decodes per second during drain runs (0 for none)')
+    args = parser.parse_args()
+
+    print(f"Uploading {args.decodes} decodes in batches of {args.batch_size} "
+          f"(zstandard {'available' if ZSTD_AVAILABLE else 'not installed'})\n")
+    print(f"  {'run':22s} {'batches':>7s} {'conns':>5s} {'encoding':>8s} {'bytes sent':>10s} "
+          f"{'B/decode':>8s} {'handshake ms':>12s}")
+
+    failed = False
+    for label, compression, reuse in (('per-batch connection', 'none', False),
+                                      ('session', 'none', True),
+                                      ('session, gzip', 'gzip', True),
+                                      ('session, auto', 'auto', True)):
+        result = run(label, compression, reuse, args)
+        print(f"  {result['label']:22s} {result['batches']:>7d} {result['connections']:>5d} "
+              f"{result['encoding']:>8s} {result['bytes_sent']:>10d} {result['bytes_per_decode']:>8.1f} "
+              f"{result['handshake_ms']:>12.2f}")
+        if result['uploaded'] != args.decodes or result['errors']:
+            print(f"    FAILED: server received {result['uploaded']} decodes, errors: {result['errors']}")
+            failed = True
+
+    if args.backlog:
+        print(f"\nDraining a backlog of {args.backlog} decodes at {args.latency * 1000:.0f} ms per request, "
+              f"{args.arrival:g} new decodes/s\n")
+        print(f"  {'run':22s} {'batches':>7s} {'largest':>7s} {'seconds':>8s} {'decodes/s':>9s} {'left':>5s}")
+        for label, adaptive in (('fixed, one at a time', False), ('adaptive, in flight', True)):
+            result = drain(label, adaptive, args)
+            print(f"  {result['label']:22s} {result['batches']:>7d} {result['largest_batch']:>7d} "
+                  f"{result['seconds']:>8.2f} {result['uploaded'] / result['seconds']:>9.0f} {result['left']:>5d}")
+            if not result['ok'] or result['uploaded'] != result['expected'] or result['errors']:
+                print(f"    FAILED: server received {result['uploaded']} decodes, errors: {result['errors']}")
+                failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,292 @@
+#!/usr/bin/env python3
+"""
+SSE load test: threaded (Flask/Werkzeug), async (asyncio) and SO_REUSEPORT
+worker server modes, plus the raw TCP stream server (tcp mode)
+
+For each mode a server is started in a child process, N idle SSE clients are
+connected to /decodes (or to the raw TCP stream), and the script reports the
+server's memory and thread count (summed over worker processes) plus the
+latency of delivering decodes to every client. --stalled adds clients that
+connect and never read, to show they do not hold up everyone else.
+
+Usage:
+    python3 test-sse-load.py                         # 200 clients, threaded and async
+    python3 test-sse-load.py --clients 1000 --modes async
+    python3 test-sse-load.py --clients 4000 --modes async,workers --workers 4
+    python3 test-sse-load.py --clients 500 --modes tcp --stalled 20
+"""
+
+import sys
+import os
+import json
+import time
+import socket
+import resource
+import logging
+import argparse
+import selectors
+import statistics
+import subprocess
+
+# Add src to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+
+
+def serve(mode: str, port: int, interval: float, workers: int):
+    """Child process: run one server mode and send a timestamped decode every interval"""
+    config = {'server_bind': '127.0.0.1', 'server_port': port, 'server_workers': str(workers),
+              # Every load client comes from 127.0.0.1, so lift the stream budget
+              'server_max_streams': '0', 'server_max_streams_per_ip': '0', 'server_reconnect_rate': '0'}
+    # Per-request access logs would swamp the report
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    
+    if mode == 'workers':
+        from worker_pool import WorkerPool
+        server = WorkerPool(config)
+    elif mode == 'tcp':
+        from network_server import NetworkServer
+        server = NetworkServer(config)
+    elif mode == 'async':
+        from network_server_async import AsyncNetworkServer
+        server = AsyncNetworkServer(config)
+    else:
+        from network_server_flask import FlaskNetworkServer
+        server = FlaskNetworkServer(config)
+    
+    if not server.start():
+        sys.exit(1)
+    
+    if mode == 'workers':
+        # Wait for every worker to connect to the broker
+        while len(server.links) < workers:
+            time.sleep(0.1)
+    
+    print("ready", flush=True)
+    
+    try:
+        while True:
+            time.sleep(interval)
+            now = time.strftime("%H%M%S")
+            server.send_decode(f"{now} -12  0.3 1234 ~ CQ LOAD FN42 {time.time():.6f}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+
+
+def proc_status(pid: int) -> dict:
+    """Read VmRSS (KB) and thread count for a process and its children from /proc"""
+    status = {'rss_kb': 0, 'threads': 0}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key == 'VmRSS':
+                status['rss_kb'] += int(value.split()[0])
+            elif key == 'Threads':
+                status['threads'] += int(value)
+    
+    # Worker processes (and the spawn helper) are children of the server
+    with open(f'/proc/{pid}/task/{pid}/children') as f:
+        for child in f.read().split():
+            child_status = proc_status(int(child))
+            status['rss_kb'] += child_status['rss_kb']
+            status['threads'] += child_status['threads']
+    return status
+
+
+def open_sse_client(port: int, mode: str) -> socket.socket:
+    """Open a raw SSE connection to /decodes, or a plain stream connection in tcp mode"""
+    sock = socket.create_connection(('127.0.0.1', port), timeout=10)
+    if mode != 'tcp':
+        sock.sendall(b"GET /decodes HTTP/1.1\r\nHost: 127.0.0.1\r\nAccept: text/event-stream\r\n\r\n")
+    return sock
+
+
+def received_lines(buffer: bytes, mode: str):
+    """Split complete decode lines off a stream buffer, returning (lines, rest)"""
+    if mode == 'tcp':
+        *lines, rest = buffer.split(b"\n")
+        return [line for line in lines if line and not line.startswith(b"#")], rest
+    
+    lines = []
+    while b"\n\n" in buffer:
+        frame, buffer = buffer.split(b"\n\n", 1)
+        for line in frame.split(b"\n"):
+            if line.startswith(b"data: "):
+                lines.append(json.loads(line[6:])['decode'])
+    return lines, buffer
+
+
+def collect_latencies(clients, decodes: int, timeout: float, mode: str):
+    """Read decodes from every client, returning per-delivery latencies in ms"""
+    selector = selectors.DefaultSelector()
+    buffers = {}
+    remaining = {}
+    for sock in clients:
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ)
+        buffers[sock] = b''
+        remaining[sock] = decodes
+    
+    latencies = []
+    started = time.time()
+    deadline = started + timeout
+    
+    while remaining and time.time() < deadline:
+        for key, _ in selector.select(timeout=0.5):
+            sock = key.fileobj
+            try:
+                data = sock.recv(65536)
+            except BlockingIOError:
+                continue
+            received = time.time()
+            if not data:
+                selector.unregister(sock)
+                remaining.pop(sock, None)
+                continue
+            
+            lines, buffers[sock] = received_lines(buffers[sock] + data, mode)
+            for decode_line in lines:
+                sent = float(decode_line.split()[-1])
+                # Skip decodes buffered in the socket while clients were connecting
+                if sent < started:
+                    continue
+                latencies.append((received - sent) * 1000)
+                if sock in remaining:
+                    remaining[sock] -= 1
+                    if remaining[sock] <= 0:
+                        selector.unregister(sock)
+                        del remaining[sock]
+    
+    selector.close()
+    return latencies, len(remaining)
+
+
+def run_mode(mode: str, args) -> dict:
+    """Start a server in one mode, load it and return its measurements"""
+    print(f"\n=== {mode} mode: {args.clients} clients ===")
+    
+    proc = subprocess.Popen(
+        [sys.executable, __file__, '--serve', mode, '--port', str(args.port),
+         '--interval', str(args.interval), '--workers', str(args.workers)],
+        stdout=subprocess.PIPE,
+        text=True
+    )
+    clients = []
+    stalled = []
+    
+    try:
+        for line in proc.stdout:
+            if line.strip() == 'ready':
+                break
+        else:
+            print("  ✗ Server failed to start")
+            return {}
+        time.sleep(0.5)
+        
+        idle = proc_status(proc.pid)
+        
+        start = time.time()
+        failed = 0
+        for i in range(args.clients):
+            try:
+                clients.append(open_sse_client(args.port, mode))
+            except OSError:
+                failed += 1
+        connect_time = time.time() - start
+        
+        # Clients that never read: the server must keep serving everyone else
+        for i in range(args.stalled):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+            sock.connect(('127.0.0.1', args.port))
+            if mode != 'tcp':
+                sock.sendall(b"GET /decodes HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n")
+            stalled.append(sock)
+        
+        # Let the server settle with all streams open
+        time.sleep(args.settle)
+        loaded = proc_status(proc.pid)
+        
+        latencies, missed = collect_latencies(clients, args.decodes, args.interval * (args.decodes + 4), mode)
+        
+        result = {
+            'clients': len(clients),
+            'stalled_clients': len(stalled),
+            'connect_failures': failed,
+            'connect_time_s': round(connect_time, 3),
+            'idle_rss_kb': idle['rss_kb'],
+            'loaded_rss_kb': loaded['rss_kb'],
+            'rss_per_client_kb': round((loaded['rss_kb'] - idle['rss_kb']) / max(len(clients), 1), 1),
+            'idle_threads': idle['threads'],
+            'loaded_threads': loaded['threads'],
+            'deliveries': len(latencies),
+            'clients_missing_decodes': missed,
+        }
+        if latencies:
+            latencies.sort()
+            result['latency_p50_ms'] = round(statistics.median(latencies), 2)
+            result['latency_p95_ms'] = round(latencies[int(len(latencies) * 0.95) - 1], 2)
+            result['latency_max_ms'] = round(latencies[-1], 2)
+        
+        for key, value in result.items():
+            print(f"  {key:26s} {value}")
+        return result
+    
+    finally:
+        for sock in clients + stalled:
+            sock.close()
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='SSE load test for the threaded, async, worker and TCP server modes')
+    parser.add_argument('--clients', type=int, default=200, help='Idle SSE clients to connect')
+    parser.add_argument('--modes', default='threaded,async', help='Comma-separated server modes to test')
+    parser.add_argument('--decodes', type=int, default=5, help='Decodes each client must receive')
+    parser.add_argument('--interval', type=float, default=1.0, help='Seconds between decodes')
+    parser.add_argument('--settle', type=float, default=2.0, help='Seconds to wait after connecting')
+    parser.add_argument('--port', type=int, default=18080, help='Server port')
+    parser.add_argument('--stalled', type=int, default=0, help='Extra clients that connect and never read')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2,
+                        help='Worker processes in workers mode')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.serve:
+        serve(args.serve, args.port, args.interval, args.workers)
+        return
+    
+    # Each client is a file descriptor on both ends
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = min(hard, (args.clients + args.stalled) * 2 + 256)
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+    
+    results = {}
+    for mode in args.modes.split(','):
+        results[mode] = run_mode(mode.strip(), args)
+    
+    if len(results) > 1:
+        print("\n=== Comparison ===")
+        print(f"  {'mode':10s} {'rss KB':>10s} {'KB/client':>10s} {'threads':>8s} {'p50 ms':>8s} {'p95 ms':>8s}")
+        for mode, result in results.items():
+            if not result:
+                continue
+            print(f"  {mode:10s} {result['loaded_rss_kb']:>10d} {result['rss_per_client_kb']:>10.1f} "
+                  f"{result['loaded_threads']:>8d} {result.get('latency_p50_ms', 0):>8.2f} "
+                  f"{result.get('latency_p95_ms', 0):>8.2f}")
+    
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()